@@ -6,10 +6,11 @@ from aiohttp import web
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from dotenv import load_dotenv
 
-from bot_init import bot, dp, make_i18n_middleware
+from bot_init import bot, dp, make_i18n_middleware, storage
 from config_data.config import Config, load_config
 from config_data.logger_config import logger
 from db import init_db
+from dialogs.bulk_import_dialog import bulk_import_dialog
 from dialogs.edit_phrase_dialog import edit_phrase_dialog
 from dialogs.select_language_dialog import select_language_dialog
 from dialogs.smart_phrase_addition_dialog import smart_phrase_addition_dialog
@@ -27,9 +28,18 @@ from handlers.training.training_handlers import user_training_dialog
 from handlers.training.translation_handlers import translation_training_dialog
 from handlers.user_handlers import router as user_router, start_dialog
 from handlers.user_management import user_management_dialog
+from external_services.voice_recognizer import speech_recognizer
+from external_services.yookassa_gateway import yookassa_gateway
 from keyboards.set_menu import set_default_commands
+from services.charts import chart_renderer
+from services.delivery import delivery
+from services.i18n import precompile_translations
+from services.image_jobs import image_jobs
+from services.payment_events import payment_events
 from services.services import check_subscriptions, auto_renewal_subscriptions, interval_notifications, \
-    auto_reset_daily_counter
+    auto_reset_daily_counter, flush_day_counters
+from services.tts_store import evict_tts_audio
+from services.uploads import purge_stale_uploads
 from services.yookassa import process_yookassa_webhook
 
 load_dotenv()
@@ -57,6 +67,7 @@ config: Config = load_config()
 
 
 async def on_startup(app):
+    chart_renderer.start()
     await init_db()
     await set_default_commands(bot)
     await bot.set_webhook(webhook_url, secret_token=webhook_secret)
@@ -67,18 +78,30 @@ async def on_startup(app):
     scheduler.add_job(auto_renewal_subscriptions, 'cron', hour=12, minute=0, misfire_grace_time=3600)
     scheduler.add_job(interval_notifications, "interval", minutes=5, misfire_grace_time=3600)
     scheduler.add_job(auto_reset_daily_counter, 'cron', hour=22, minute=0, misfire_grace_time=3600)
+    scheduler.add_job(flush_day_counters, "interval", minutes=1, misfire_grace_time=60)
+    scheduler.add_job(evict_tts_audio, 'cron', hour=4, minute=0, misfire_grace_time=3600)
+    scheduler.add_job(purge_stale_uploads, 'cron', hour=4, minute=30, misfire_grace_time=3600)
+    scheduler.add_job(storage.sweep_orphaned_stacks, 'interval', hours=1, misfire_grace_time=3600)
     # scheduler.add_job(auto_reset_daily_counter, "interval", minutes=1, misfire_grace_time=3600)
     # scheduler.add_job(check_subscriptions, "interval", minutes=1, misfire_grace_time=3600)
     scheduler.start()
 
     # Сохраните планировщик в app для последующего доступа
     app['scheduler'] = scheduler
+    # Уведомления о платежах, принятые вебхуком, применяются в фоне
+    payment_events.start()
 
 
 async def on_shutdown(app):
     await bot.delete_webhook()
     # Остановка планировщика при завершении работы приложения
     app['scheduler'].shutdown()
+    await delivery.stop()
+    speech_recognizer.shutdown()
+    chart_renderer.shutdown()
+    await payment_events.stop()
+    await image_jobs.stop()
+    await yookassa_gateway.close()
 
 
 async def handle(request):
@@ -98,6 +121,7 @@ def main() -> None:
         subscribe_dialog,
         subscribe_management_dialog,
         smart_phrase_addition_dialog,
+        bulk_import_dialog,
         add_original_phrase_dialog,
         edit_phrase_dialog,
         admin_dialog,
@@ -124,7 +148,8 @@ def main() -> None:
     # Register startup hook to initialize webhook
     dp.startup.register(on_startup)
 
-    # Регистрируем миддлварь для i18n
+    # Собираем переводы заранее и регистрируем миддлварь для i18n
+    precompile_translations()
     i18n_middleware = make_i18n_middleware()
     dp.message.middleware(i18n_middleware)
     dp.callback_query.middleware(i18n_middleware)
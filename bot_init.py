@@ -3,12 +3,20 @@ import os
 from aiogram import Bot, Dispatcher
 from aiogram.client.default import DefaultBotProperties
 from aiogram.enums import ParseMode
-from aiogram.fsm.storage.redis import RedisStorage, Redis, DefaultKeyBuilder
+from aiogram.fsm.storage.redis import Redis, DefaultKeyBuilder
 from aiogram_dialog import setup_dialogs
 from dotenv import load_dotenv
-from fluent.runtime import FluentResourceLoader, FluentLocalization
 
 from middlewares.i18n_middleware import I18nMiddleware, update_middleware_manager
+from services.dialog_storage import IndexedRedisStorage
+from services.entitlements import entitlements
+from services.i18n import get_l10ns
+from services.image_cache import image_cache
+from services.llm_cache import llm_cache
+from services.locale_cache import locale_cache
+from services.progress_histograms import progress_histograms
+from services.review_queue import review_queue
+from services.tts_cache import tts_cache
 
 load_dotenv()
 
@@ -18,18 +26,8 @@ locales = os.getenv('LOCALES').split(',')
 
 
 def make_i18n_middleware():
-    loader = FluentResourceLoader(os.path.join(
-        os.path.dirname(__file__),
-        "translations",
-        "{locale}",
-    ))
-    l10ns = {
-        locale: FluentLocalization(
-            [locale, default_locale], ["main.ftl"], loader,
-        )
-        for locale in locales
-    }
-    return I18nMiddleware(l10ns, default_locale)
+    # Переводы собираются один раз на процесс и общие для всех экземпляров миддлвари
+    return I18nMiddleware(get_l10ns(), default_locale)
 
 
 async def update_global_middleware(new_middleware):
@@ -42,7 +40,14 @@ async def update_global_middleware(new_middleware):
 
 
 redis = Redis(host=os.getenv('REDIS_DSN'))
-storage = RedisStorage(redis=redis, key_builder=DefaultKeyBuilder(with_destiny=True, with_bot_id=True))
+locale_cache.redis = redis
+entitlements.redis = redis
+review_queue.redis = redis
+progress_histograms.redis = redis
+tts_cache.redis = redis
+llm_cache.redis = redis
+image_cache.redis = redis
+storage = IndexedRedisStorage(redis=redis, key_builder=DefaultKeyBuilder(with_destiny=True, with_bot_id=True))
 
 # Инициализируем бот и диспетчер
 bot = Bot(token=os.getenv('BOT_TOKEN'), default=DefaultBotProperties(parse_mode=ParseMode.HTML))
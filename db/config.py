@@ -18,7 +18,7 @@ TORTOISE_ORM = {
     "apps": {
         "models": {
             "models": ['models.user', 'models.phrase', 'models.tts', 'aerich.models', 'models.payments',
-                       'models.subscription', 'models.main'],
+                       'models.subscription', 'models.main', 'models.llm'],
             "default_connection": "default",
         },
     },
@@ -31,3 +31,17 @@ async def init_db():
 
     # Генерируем схемы базы данных на основе моделей
     await Tortoise.generate_schemas()
+
+
+async def init_benchmark_db():
+    """
+    Инициализирует отдельную базу для бенчмарков (переменная окружения BENCHMARK_DB_URL).
+    Таблицы в ней очищаются, поэтому рабочую базу указывать нельзя.
+    """
+    benchmark_db_url = os.getenv('BENCHMARK_DB_URL')
+    if not benchmark_db_url or benchmark_db_url == db_url:
+        raise RuntimeError('Укажите в BENCHMARK_DB_URL отдельную базу для бенчмарка')
+
+    models = [module for module in TORTOISE_ORM['apps']['models']['models'] if module != 'aerich.models']
+    await Tortoise.init(db_url=benchmark_db_url, modules={'models': models})
+    await Tortoise.generate_schemas()
@@ -0,0 +1,49 @@
+-- Перенос двоичных данных в services.blob_store, шаг 1 из 3.
+-- Выполнить на существующей базе до запуска версии с blob_store:
+--     psql "$DB_URL" -f db/migrations/001_blob_store_prepare.sql
+-- Затем перенести данные: python -m services.blob_store
+-- И удалить старые колонки: db/migrations/002_blob_store_cleanup.sql
+--
+-- Новые модели уже не пишут в старые колонки, поэтому они становятся необязательными.
+
+BEGIN;
+
+-- AudioFile.audio -> audio_digest
+ALTER TABLE audiofile ADD COLUMN IF NOT EXISTS audio_digest VARCHAR(64);
+ALTER TABLE audiofile ALTER COLUMN audio DROP NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_audiofile_audio_digest ON audiofile (audio_digest);
+
+-- Phrase.plot_image -> plot_image_digest (plot_image и так необязательна)
+ALTER TABLE phrase ADD COLUMN IF NOT EXISTS plot_image_digest VARCHAR(64);
+CREATE INDEX IF NOT EXISTS idx_phrase_plot_image_digest ON phrase (plot_image_digest);
+
+-- TextToSpeech ищется по digest, а запись лежит в TextToSpeechAudio.
+-- Старым строкам digest не вычислить (в них только очищенный текст), они удаляются
+-- и будут озвучены заново при следующем обращении.
+ALTER TABLE texttospeech ADD COLUMN IF NOT EXISTS digest VARCHAR(64);
+ALTER TABLE texttospeech ADD COLUMN IF NOT EXISTS last_used_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP;
+DELETE FROM texttospeech WHERE digest IS NULL;
+ALTER TABLE texttospeech ALTER COLUMN digest SET NOT NULL;
+ALTER TABLE texttospeech DROP CONSTRAINT IF EXISTS texttospeech_text_key;
+ALTER TABLE texttospeech DROP COLUMN IF EXISTS voice;
+CREATE UNIQUE INDEX IF NOT EXISTS uid_texttospeech_digest ON texttospeech (digest);
+CREATE INDEX IF NOT EXISTS idx_texttospeech_last_used_at ON texttospeech (last_used_at);
+
+CREATE TABLE IF NOT EXISTS texttospeechaudio (
+    id SERIAL PRIMARY KEY,
+    voice_digest VARCHAR(64),
+    tts_id INT NOT NULL UNIQUE REFERENCES texttospeech (id) ON DELETE CASCADE
+);
+-- Таблица могла быть создана раньше с колонкой voice
+ALTER TABLE texttospeechaudio ADD COLUMN IF NOT EXISTS voice_digest VARCHAR(64);
+ALTER TABLE texttospeechaudio ALTER COLUMN voice_digest DROP NOT NULL;
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM information_schema.columns
+               WHERE table_name = 'texttospeechaudio' AND column_name = 'voice') THEN
+        ALTER TABLE texttospeechaudio ALTER COLUMN voice DROP NOT NULL;
+    END IF;
+END $$;
+CREATE INDEX IF NOT EXISTS idx_texttospeec_voice_digest ON texttospeechaudio (voice_digest);
+
+COMMIT;
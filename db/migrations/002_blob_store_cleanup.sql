@@ -0,0 +1,38 @@
+-- Перенос двоичных данных в services.blob_store, шаг 3 из 3.
+-- Выполнить после python -m services.blob_store:
+--     psql "$DB_URL" -f db/migrations/002_blob_store_cleanup.sql
+-- Если какая-то строка еще не перенесена, скрипт остановится, ничего не удалив.
+
+BEGIN;
+
+-- Запрос к старой колонке планируется, только если она еще есть, поэтому проверки вложенные
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM information_schema.columns
+               WHERE table_name = 'audiofile' AND column_name = 'audio') THEN
+        IF EXISTS (SELECT 1 FROM audiofile WHERE audio IS NOT NULL AND audio_digest IS NULL) THEN
+            RAISE EXCEPTION 'audiofile: не все записи перенесены, запустите python -m services.blob_store';
+        END IF;
+    END IF;
+    IF EXISTS (SELECT 1 FROM information_schema.columns
+               WHERE table_name = 'phrase' AND column_name = 'plot_image') THEN
+        IF EXISTS (SELECT 1 FROM phrase WHERE plot_image IS NOT NULL AND plot_image_digest IS NULL) THEN
+            RAISE EXCEPTION 'phrase: не все графики перенесены, запустите python -m services.blob_store';
+        END IF;
+    END IF;
+    IF EXISTS (SELECT 1 FROM information_schema.columns
+               WHERE table_name = 'texttospeechaudio' AND column_name = 'voice') THEN
+        IF EXISTS (SELECT 1 FROM texttospeechaudio WHERE voice IS NOT NULL AND voice_digest IS NULL) THEN
+            RAISE EXCEPTION 'texttospeechaudio: не все записи перенесены, запустите python -m services.blob_store';
+        END IF;
+    END IF;
+END $$;
+
+ALTER TABLE audiofile DROP COLUMN IF EXISTS audio;
+ALTER TABLE phrase DROP COLUMN IF EXISTS plot_image;
+ALTER TABLE texttospeechaudio DROP COLUMN IF EXISTS voice;
+-- Строки без записи (voice была пустой) ссылаться не на что
+DELETE FROM texttospeechaudio WHERE voice_digest IS NULL;
+ALTER TABLE texttospeechaudio ALTER COLUMN voice_digest SET NOT NULL;
+
+COMMIT;
@@ -0,0 +1,8 @@
+-- Индексы для выбора фразы интервальной тренировки в базе (DUE_PHRASE_SQL, RANDOM_PHRASE_SQL).
+-- generate_schemas не добавляет индексы в существующие таблицы, поэтому их создает этот скрипт:
+--     psql "$DB_URL" -f db/migrations/003_interval_training_indexes.sql
+-- CONCURRENTLY не блокирует запись в таблицы, поэтому скрипт выполняется без транзакции.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_reviewstatus_user_next_review ON reviewstatus (user_id, next_review);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_reviewstatus_user_phrase ON reviewstatus (user_id, phrase_id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_phrase_user_category ON phrase (user_id, category_id);
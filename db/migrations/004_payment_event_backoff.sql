@@ -0,0 +1,5 @@
+-- Задержка повторной обработки уведомлений о платежах (PaymentEvent.next_attempt_at).
+-- generate_schemas не добавляет колонки в существующую таблицу payment_events:
+--     psql "$DB_URL" -f db/migrations/004_payment_event_backoff.sql
+
+ALTER TABLE payment_events ADD COLUMN IF NOT EXISTS next_attempt_at TIMESTAMPTZ;
@@ -0,0 +1,129 @@
+import io
+import logging
+
+from aiogram.enums import ContentType
+from aiogram.types import Message, BufferedInputFile
+from aiogram_dialog import Dialog, Window, DialogManager, ShowMode
+from aiogram_dialog.widgets.input import TextInput, ManagedTextInput, MessageInput
+from aiogram_dialog.widgets.kbd import Group, Cancel, Button
+from aiogram_dialog.widgets.text import Multi
+
+from bot_init import bot
+from models import Category
+from services.i18n_format import I18NFormat, I18N_FORMAT_KEY
+from services.phrase_service import prepare_bulk_import, save_bulk_phrases
+from services.tts_cache import tts_cache
+from states import BulkImportSG
+
+logger = logging.getLogger('default')
+
+# Файл со списком фраз читаем целиком, поэтому ограничиваем размер
+MAX_IMPORT_FILE_SIZE = 64 * 1024
+
+
+async def get_data(dialog_manager: DialogManager, **kwargs):
+    category = await Category.get_or_none(id=dialog_manager.start_data.get("category_id"))
+    dialog_manager.dialog_data['category'] = category.name
+    return dialog_manager.dialog_data
+
+
+async def get_result_data(dialog_manager: DialogManager, **kwargs):
+    return dialog_manager.dialog_data
+
+
+async def import_phrases(message: Message, dialog_manager: DialogManager, text: str) -> None:
+    i18n_format = dialog_manager.middleware_data.get(I18N_FORMAT_KEY)
+    user_id = message.from_user.id
+    category_id = dialog_manager.start_data["category_id"]
+
+    await bot.send_chat_action(chat_id=message.chat.id, action="typing")
+    result = await prepare_bulk_import(user_id, category_id, text)
+
+    # file_id озвучки Telegram выдает только после отправки, поэтому отправляем по одной
+    for phrase in result.phrases:
+        if not phrase.voice:
+            continue
+        try:
+            msg = await message.answer_voice(voice=phrase.voice, caption=phrase.text_phrase)
+        except Exception as e:
+            logger.error('Ошибка при отправке озвучки фразы %s: %s', phrase.text_phrase, e)
+            continue
+        phrase.audio_id = msg.voice.file_id
+        if isinstance(phrase.voice, BufferedInputFile):
+            await tts_cache.remember_file_id(phrase.text_phrase, phrase.audio_id)
+
+    saved = 0
+    if result.phrases:
+        try:
+            saved = len(await save_bulk_phrases(user_id, category_id, result.phrases))
+            # Остальные успели появиться у пользователя, пока фразы готовились
+            result.duplicates += len(result.phrases) - saved
+        except Exception as e:
+            logger.error('Ошибка при сохранении фраз: %s', e)
+            await message.answer(text=i18n_format("failed-save-phrase"))
+
+    dialog_manager.dialog_data.update(
+        saved=saved,
+        duplicates=result.duplicates,
+        too_long=result.too_long,
+        over_limit=result.over_limit,
+    )
+    await dialog_manager.switch_to(state=BulkImportSG.result, show_mode=ShowMode.SEND)
+
+
+async def phrase_list_input(message: Message, widget: ManagedTextInput, dialog_manager: DialogManager,
+                            text: str) -> None:
+    await import_phrases(message, dialog_manager, text)
+
+
+async def phrase_file_input(message: Message, widget: MessageInput, dialog_manager: DialogManager) -> None:
+    i18n_format = dialog_manager.middleware_data.get(I18N_FORMAT_KEY)
+    if message.document.file_size and message.document.file_size > MAX_IMPORT_FILE_SIZE:
+        await message.answer(i18n_format("bulk-import-file-too-large"))
+        return
+    buffer = io.BytesIO()
+    await bot.download(message.document, destination=buffer)
+    try:
+        text = buffer.getvalue().decode('utf-8-sig')
+    except UnicodeDecodeError:
+        await message.answer(i18n_format("bulk-import-wrong-file"))
+        return
+    await import_phrases(message, dialog_manager, text)
+
+
+async def done_button_clicked(callback, button: Button, dialog_manager: DialogManager):
+    await dialog_manager.done(result={"imported": dialog_manager.dialog_data.get("saved", 0)})
+
+
+bulk_import_dialog = Dialog(
+    Window(
+        Multi(
+            I18NFormat("selected-category"),
+            I18NFormat("bulk-import-input"),
+        ),
+        TextInput(
+            id="phrase_list_input",
+            on_success=phrase_list_input,
+        ),
+        MessageInput(
+            func=phrase_file_input,
+            content_types=ContentType.DOCUMENT,
+        ),
+        Group(
+            Cancel(I18NFormat("cancel"), id="button_cancel"),
+            width=3
+        ),
+        getter=get_data,
+        state=BulkImportSG.start
+    ),
+    Window(
+        I18NFormat("bulk-import-result"),
+        Button(
+            text=I18NFormat("back"),
+            id="done",
+            on_click=done_button_clicked,
+        ),
+        getter=get_result_data,
+        state=BulkImportSG.result
+    ),
+)
@@ -1,4 +1,3 @@
-import base64
 import logging
 
 from aiogram.enums import ContentType
@@ -11,11 +10,12 @@ from dotenv import load_dotenv
 
 from bot_init import bot
 from dialogs.getters.get_edit_phrase_data import get_data
-from external_services.google_cloud_services import google_text_to_speech
-from external_services.kandinsky import generate_image
-from external_services.openai_services import openai_gpt_add_space
 from models import Phrase, AudioFile
 from services.i18n_format import I18NFormat, I18N_FORMAT_KEY
+from services.image_jobs import PENDING_KEY, image_jobs, image_pending, mark_image_pending
+from services.llm_cache import cached_add_space
+from services.reference_audio import reference_audio
+from services.tts_cache import tts_cache
 from states import EditPhraseSG, ManagementSG
 
 load_dotenv()
@@ -30,7 +30,7 @@ async def input_text_phrase(message: Message, widget: ManagedTextInput, dialog_m
     dialog_manager.dialog_data["text_phrase"] = text_phrase
     await bot.send_chat_action(chat_id=message.chat.id, action="typing")
     try:
-        spaced_phrase = await openai_gpt_add_space(text_phrase)
+        spaced_phrase = await cached_add_space(text_phrase)
     except Exception as e:
         logger.error('Ошибка при попытке добавления пробелов: %s', e)
         spaced_phrase = text_phrase
@@ -63,9 +63,10 @@ async def ai_voice_message(callback: CallbackQuery, button: Button, dialog_manag
 
     await bot.send_chat_action(chat_id=callback.message.chat.id, action="upload_voice")
     try:
-        text_to_speech = await google_text_to_speech(text_phrase)
-        voice = BufferedInputFile(text_to_speech.audio_content, filename="voice_tts.ogg")
+        voice = await tts_cache.voice(text_phrase)
         msg = await callback.message.answer_voice(voice=voice, caption=i18n_format("new-voice-acting"))
+        if isinstance(voice, BufferedInputFile):
+            await tts_cache.remember_file_id(text_phrase, msg.voice.file_id)
 
         dialog_manager.dialog_data["audio_id"] = msg.voice.file_id
     except Exception as e:
@@ -98,32 +99,34 @@ async def ai_image(callback: CallbackQuery, button: Button, dialog_manager: Dial
     prompt = dialog_manager.dialog_data["prompt"]
     i18n_format = dialog_manager.middleware_data.get(I18N_FORMAT_KEY)
     await callback.message.answer(i18n_format("starting-generate-image"))
-    await bot.send_chat_action(chat_id=callback.message.chat.id, action="upload_photo")
-    # Функция для генерации изображения автоматически
-    try:
-        images = await generate_image(prompt=prompt)
-        if images and len(images) > 0:
-            msg_photo_id = dialog_manager.dialog_data["msg_photo_id"]
+    user_id = dialog_manager.event.from_user.id
+    msg_photo_id = dialog_manager.dialog_data.get("msg_photo_id")
+    # Пока изображение не готово, фраза не сохраняется (см. save_phrase_button_clicked)
+    mark_image_pending(dialog_manager.dialog_data)
+    bg_manager = dialog_manager.bg()
+
+    async def on_sent(msg: Message):
+        if msg_photo_id:
             # Удаляем предыдущее изображение
-            await bot.delete_message(chat_id=dialog_manager.event.from_user.id,
-                                     message_id=msg_photo_id)
-            # Декодируем изображение из Base64
-            image_data = base64.b64decode(images[0])
-            image = BufferedInputFile(image_data, filename="image.png")
-            # Отправляем изображение
-            msg = await callback.message.answer_photo(photo=image, caption=i18n_format("generated-image"))
-            image_id = msg.photo[-1].file_id
-            dialog_manager.dialog_data["image_id"] = image_id
-            dialog_manager.dialog_data["msg_photo_id"] = msg.message_id
-
-        else:
-            await callback.message.answer(i18n_format("failed-generate-image"))
-        dialog_manager.show_mode = ShowMode.SEND
-        await dialog_manager.switch_to(EditPhraseSG.start)
-    except Exception as e:
-        await callback.message.answer(text=i18n_format("failed-generate-image"))
-        dialog_manager.show_mode = ShowMode.SEND
-        logger.error('Ошибка при генерации изображения: %s', e)
+            await bot.delete_message(chat_id=user_id, message_id=msg_photo_id)
+        await bg_manager.update({"image_id": msg.photo[-1].file_id, "msg_photo_id": msg.message_id,
+                                 PENDING_KEY: None},
+                                show_mode=ShowMode.SEND)
+
+    async def on_failed():
+        await bg_manager.update({PENDING_KEY: None})
+
+    # Генерация идет в фоне, окно диалога обновится, когда изображение будет готово
+    image_jobs.submit(
+        prompt=prompt,
+        chat_id=callback.message.chat.id,
+        caption=i18n_format("generated-image"),
+        error_text=i18n_format("failed-generate-image"),
+        on_sent=on_sent,
+        on_failed=on_failed,
+    )
+    dialog_manager.show_mode = ShowMode.SEND
+    await dialog_manager.switch_to(EditPhraseSG.start)
 
 
 async def delite_image_button_clicked(callback: CallbackQuery, button: Button, dialog_manager: DialogManager):
@@ -147,6 +150,10 @@ async def input_comment(message: Message, widget: ManagedTextInput, dialog_manag
 
 
 async def save_phrase_button_clicked(callback: CallbackQuery, button: Button, dialog_manager: DialogManager):
+    if image_pending(dialog_manager.dialog_data):
+        i18n_format = dialog_manager.middleware_data.get(I18N_FORMAT_KEY)
+        await callback.answer(i18n_format("image-still-generating"), show_alert=True)
+        return
     text_phrase = dialog_manager.dialog_data.get("text_phrase")
     spaced_phrase = dialog_manager.dialog_data.get("spaced_phrase")
     translation = dialog_manager.dialog_data.get("translation")
@@ -185,6 +192,7 @@ async def save_phrase_button_clicked(callback: CallbackQuery, button: Button, di
     if comment:
         phrase.comment = comment
     await phrase.save()
+    reference_audio.warm(phrase.audio_id)
     # await dialog_manager.done()
     await dialog_manager.start(state=ManagementSG.select_phrase, data=dialog_manager.dialog_data)
 
@@ -3,12 +3,14 @@ from aiogram.types import CallbackQuery
 from aiogram_dialog import Dialog, Window, DialogManager, ShowMode
 from aiogram_dialog.widgets.kbd import Select
 
-from bot_init import bot, make_i18n_middleware, update_global_middleware
+from bot_init import bot
 from dialogs.getters import get_languages
 from keyboards.reply_kb import get_keyboard
 from keyboards.set_menu import get_localized_menu
 from models import User
+from services.i18n import get_l10ns
 from services.i18n_format import I18NFormat, I18N_FORMAT_KEY
+from services.locale_cache import locale_cache
 from services.services import is_admin
 from states import SelectLanguageSG
 
@@ -17,12 +19,10 @@ async def select_language_button_clicked(callback: CallbackQuery, widget: Select
     user = await User.get(id=callback.from_user.id)
     user.language = item
     await user.save()
-
-    # Recreate the i18n middleware with the new language
-    i18n_middleware = make_i18n_middleware()
+    await locale_cache.invalidate(user.id)
 
     # Update the middleware in the dialog manager
-    dialog_manager.middleware_data[I18N_FORMAT_KEY] = i18n_middleware.l10ns[item].format_value
+    dialog_manager.middleware_data[I18N_FORMAT_KEY] = get_l10ns()[item].format_value
 
     i18n_format = dialog_manager.middleware_data.get(I18N_FORMAT_KEY)
 
@@ -34,8 +34,6 @@ async def select_language_button_clicked(callback: CallbackQuery, widget: Select
     msg = i18n_format('language-changed') + ' ' + i18n_format(item)
     await callback.message.answer(text=msg, reply_markup=keyboard)
 
-    await update_global_middleware(i18n_middleware)
-
     await dialog_manager.done(show_mode=ShowMode.EDIT)
 
 
@@ -10,10 +10,11 @@ from aiogram_dialog.widgets.text import Multi
 from dotenv import load_dotenv
 
 from bot_init import bot
-from external_services.kandinsky import generate_image
 from models import Phrase, Category, AudioFile, User
 from services.i18n_format import I18NFormat, I18N_FORMAT_KEY
 from services.phrase_service import process_new_phrase
+from services.reference_audio import reference_audio
+from services.tts_cache import tts_cache
 from states import SmartPhraseAdditionSG, EditPhraseSG
 
 
@@ -50,6 +51,8 @@ async def text_phrase_input(message: Message, widget: ManagedTextInput, dialog_m
             if voice:
                 msg = await message.answer_voice(voice=voice, caption=i18n_format("voice-acting"))
                 voice_id = msg.voice.file_id
+                if isinstance(voice, BufferedInputFile):
+                    await tts_cache.remember_file_id(text_phrase, voice_id)
 
             dialog_manager.dialog_data["category_id"] = dialog_manager.start_data["category_id"]
             dialog_manager.dialog_data["text_phrase"] = text_phrase
@@ -90,6 +93,7 @@ async def save_phrase_button_clicked(callback: CallbackQuery, button: Button, di
         await callback.message.answer(text=i18n_format("failed-save-phrase"))
     else:
         await callback.message.answer(text=i18n_format("phrase-saved"))
+        reference_audio.warm(phrase.audio_id)
 
     new_phrase = [phrase.text_phrase, phrase.id]
 
@@ -1,5 +1,4 @@
 import logging
-from pathlib import Path
 
 from aiogram import F
 from aiogram.enums import ContentType
@@ -12,11 +11,11 @@ from aiogram_dialog.widgets.media import DynamicMedia
 from aiogram_dialog.widgets.text import Multi
 from dotenv import load_dotenv
 
-from bot_init import bot
-from external_services.voice_recognizer import SpeechRecognizer
+from external_services.voice_recognizer import speech_recognizer
 from models import Phrase, User
 from services.i18n_format import I18NFormat, I18N_FORMAT_KEY
 from services.interval_training import check_user_answer, start_training
+from services.media import media_fetcher
 from services.services import replace_random_words
 from states import IntervalSG, IntervalTrainingSG, UserTrainingSG, ManagementSG, ErrorIntervalSG
 
@@ -88,12 +87,7 @@ async def pronunciation_training_input(message: Message, widget: MessageInput, d
     user = await User.get_or_none(id=dialog_manager.event.from_user.id)
     training_selected = dialog_manager.dialog_data['training_selected']
     answer_voice_id = message.voice.file_id
-    answer_voice = await bot.get_file(answer_voice_id)
-    answer_voice_path = answer_voice.file_path
-    answer_voice_on_disk = Path("", f"temp/{answer_voice_id}.ogg")
-    await bot.download_file(answer_voice_path, destination=answer_voice_on_disk)
-    spoken_recognizer = SpeechRecognizer(answer_voice_on_disk, answer_voice_id)
-    answer_text = spoken_recognizer.recognize_speech()
+    answer_text = await speech_recognizer.recognize(await media_fetcher.fetch(answer_voice_id))
     result = await check_user_answer(answer_text, phrase, user, training_selected)
     if result:
         await message.answer(i18n_format('right'))
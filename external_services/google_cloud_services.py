@@ -1,11 +1,14 @@
+import asyncio
+import hashlib
 import os
-from typing import Sequence
+from typing import Optional, Sequence
 
 import google.cloud.texttospeech as tts
 from dotenv import load_dotenv
 
 load_dotenv()
 voice_name = os.getenv('VOICE_NAME')
+TTS_CONCURRENCY = int(os.getenv('TTS_CONCURRENCY', '8'))
 
 os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = "bot-96c6f518f0cd.json"
 
@@ -42,21 +45,42 @@ def list_voices(language_code=None):
         print(f"{languages:<8} | {name:<24} | {gender:<8} | {rate:,} Hz")
 
 
-async def google_text_to_speech(text: str):
-    language_code = "-".join(voice_name.split("-")[:2])
-    text_input = tts.SynthesisInput(text=text)
-    voice_params = tts.VoiceSelectionParams(language_code=language_code, name=voice_name)
-    audio_config = tts.AudioConfig(audio_encoding=tts.AudioEncoding.OGG_OPUS)
+class GoogleTextToSpeech:
+    """
+    Долгоживущий асинхронный клиент Google TTS с ограничением числа одновременных запросов.
+    """
 
-    client = tts.TextToSpeechClient()
-    response = client.synthesize_speech(
-        input=text_input,
-        voice=voice_params,
-        audio_config=audio_config,
-    )
-    #
-    # filename = f"{voice_name}.ogg"
-    # with open(filename, "wb") as out:
-    #     out.write(response.audio_content)
-    #     print(f'Generated speech saved to "{filename}"')
-    return response
+    def __init__(self, voice: str = voice_name, concurrency: int = TTS_CONCURRENCY):
+        self.voice_name = voice
+        self.language_code = "-".join(voice.split("-")[:2]) if voice else None
+        self.audio_encoding = tts.AudioEncoding.OGG_OPUS
+        self.concurrency = concurrency
+        self._client: Optional[tts.TextToSpeechAsyncClient] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    def _ensure_client(self) -> tts.TextToSpeechAsyncClient:
+        # gRPC-клиент привязан к event loop, поэтому создается при первом запросе
+        if self._client is None:
+            self._client = tts.TextToSpeechAsyncClient()
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        return self._client
+
+    def cache_key(self, text: str) -> str:
+        """
+        Ключ озвучки: хэш голоса, текста и настроек аудио.
+        """
+        payload = f'{self.voice_name}\n{self.language_code}\n{self.audio_encoding.name}\n{text}'
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    async def synthesize(self, text: str) -> bytes:
+        client = self._ensure_client()
+        async with self._semaphore:
+            response = await client.synthesize_speech(
+                input=tts.SynthesisInput(text=text),
+                voice=tts.VoiceSelectionParams(language_code=self.language_code, name=self.voice_name),
+                audio_config=tts.AudioConfig(audio_encoding=self.audio_encoding),
+            )
+        return response.audio_content
+
+
+google_tts = GoogleTextToSpeech()
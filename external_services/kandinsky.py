@@ -1,9 +1,18 @@
+"""
+Асинхронный клиент Kandinsky (FusionBrain).
+
+Сессия aiohttp создается один раз на процесс, id модели кэшируется на MODEL_ID_TTL секунд.
+Статус генерации опрашивается сначала часто, затем с экспоненциально растущим интервалом
+до POLL_DEADLINE секунд.
+"""
+
 import asyncio
 import json
 import os
-import requests
-import aiohttp
 import time
+from typing import Optional
+
+import aiohttp
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -12,160 +21,130 @@ load_dotenv()
 kandinsky_api_key = os.getenv("KANDINSKY_API_KEY")
 kandinsky_secret_key = os.getenv("KANDINSKY_SECRET_KEY")
 
+BASE_URL = "https://api-key.fusionbrain.ai/"
+MODEL_ID_TTL = 60 * 60
+POLL_FIRST_DELAY = 2.0
+POLL_MAX_DELAY = 10.0
+POLL_BACKOFF = 1.5
+POLL_DEADLINE = 120.0
+NEGATIVE_PROMPT = "яркие цвета, кислотность, высокая контрастность"
 
-async def generate_image(prompt, api_key=kandinsky_api_key, secret_key=kandinsky_secret_key,
-                         width=1024, height=1024, num_images=1, style="DEFAULT"):
-    base_url = "https://api-key.fusionbrain.ai/"
-    auth_headers = {
-        "X-Key": f"Key {api_key}",
-        "X-Secret": f"Secret {secret_key}",
-    }
 
-    async with aiohttp.ClientSession() as session:
-        # Получение ID модели
-        async with session.get(base_url + "key/api/v1/models", headers=auth_headers) as response:
-            response.raise_for_status()
-            model_data = await response.json()
-            model_id = model_data[0]["id"]
+class KandinskyError(Exception):
+    pass
+
 
-        # Параметры для генерации изображения
+class KandinskyClient:
+    def __init__(self, api_key: Optional[str] = kandinsky_api_key, secret_key: Optional[str] = kandinsky_secret_key,
+                 base_url: str = BASE_URL, model_id_ttl: float = MODEL_ID_TTL):
+        self.base_url = base_url
+        self.auth_headers = {
+            "X-Key": f"Key {api_key}",
+            "X-Secret": f"Secret {secret_key}",
+        }
+        self.model_id_ttl = model_id_ttl
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._model_id: Optional[int] = None
+        self._model_id_expires = 0.0
+        self._model_lock = asyncio.Lock()
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        # Создаем лениво: сессию нельзя открыть до запуска event loop
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                headers=self.auth_headers,
+                timeout=aiohttp.ClientTimeout(total=30),
+                connector=aiohttp.TCPConnector(limit=10, keepalive_timeout=60),
+            )
+        return self._session
+
+    async def _get_json(self, path: str):
+        async with self.session.get(self.base_url + path) as response:
+            response.raise_for_status()
+            return await response.json()
+
+    async def get_model_id(self) -> int:
+        if self._model_id is not None and time.monotonic() < self._model_id_expires:
+            return self._model_id
+        async with self._model_lock:
+            if self._model_id is None or time.monotonic() >= self._model_id_expires:
+                models = await self._get_json("key/api/v1/models")
+                self._model_id = models[0]["id"]
+                self._model_id_expires = time.monotonic() + self.model_id_ttl
+        return self._model_id
+
+    def invalidate_model_id(self) -> None:
+        self._model_id = None
+
+    async def run(self, prompt: str, width: int = 1024, height: int = 1024, num_images: int = 1,
+                  style: str = "DEFAULT") -> str:
+        """
+        Ставит генерацию в очередь FusionBrain.
+
+        :return: uuid задачи
+        """
         params = {
             "type": "GENERATE",
             "style": style,
             "numImages": num_images,
             "width": width,
             "height": height,
-            "negativePromptDecoder": "яркие цвета, кислотность, высокая контрастность",
+            "negativePromptDecoder": NEGATIVE_PROMPT,
             "censored": False,
             "generateParams": {
                 "query": prompt
             }
         }
-
-        # Отправка запроса на генерацию
-        data = {
-            "model_id": (None, model_id),
-            "params": (None, json.dumps(params), "application/json")
-        }
-
-        async with session.post(base_url + "key/api/v1/text2image/run",
-                                headers=auth_headers,
-                                data=data) as response:
+        form = aiohttp.FormData()
+        form.add_field("model_id", str(await self.get_model_id()))
+        form.add_field("params", json.dumps(params), content_type="application/json")
+        async with self.session.post(self.base_url + "key/api/v1/text2image/run", data=form) as response:
+            if response.status == 404:
+                # Модель убрали, при следующем запросе получим новую
+                self.invalidate_model_id()
             response.raise_for_status()
-            response_data = await response.json()
-            uuid = response_data["uuid"]
-
-        # Проверка статуса и получение результата
-        while True:
-            async with session.get(base_url + "key/api/v1/text2image/status/" + uuid,
-                                   headers=auth_headers) as response:
-                response.raise_for_status()
-                data = await response.json()
+            return (await response.json())["uuid"]
 
-                if data["status"] == "DONE":
-                    return data["images"]
-                elif data["status"] == "FAIL":
-                    raise Exception("Ошибка при генерации изображения")
+    async def wait(self, uuid: str, deadline: float = POLL_DEADLINE) -> list[str]:
+        """
+        Ждет окончания генерации.
 
-            await asyncio.sleep(10)  # Асинхронная задержка
+        :return: Список изображений в Base64
+        """
+        delay = POLL_FIRST_DELAY
+        stop_at = time.monotonic() + deadline
+        while True:
+            data = await self._get_json("key/api/v1/text2image/status/" + uuid)
+            if data["status"] == "DONE":
+                return data["images"]
+            if data["status"] == "FAIL":
+                raise KandinskyError(f"Ошибка при генерации изображения: {data.get('errorDescription')}")
+            if time.monotonic() + delay > stop_at:
+                raise asyncio.TimeoutError(f"Изображение {uuid} не готово за {deadline} с")
+            await asyncio.sleep(delay)
+            delay = min(delay * POLL_BACKOFF, POLL_MAX_DELAY)
 
+    async def generate(self, prompt: str, **params) -> list[str]:
+        return await self.wait(await self.run(prompt, **params))
 
-class FusionBrainAPI:
+    async def close(self) -> None:
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
 
-    def __init__(self, url, api_key, secret_key):
-        self.URL = url
-        self.AUTH_HEADERS = {
-            'X-Key': f'Key {api_key}',
-            'X-Secret': f'Secret {secret_key}',
-        }
 
-    def get_pipeline(self):
-        response = requests.get(self.URL + 'key/api/v1/pipelines', headers=self.AUTH_HEADERS)
-        data = response.json()
-        return data[0]['id']
+kandinsky = KandinskyClient()
 
-    def generate(self, prompt, pipeline, images=1, width=1024, height=1024):
-        params = {
-            "type": "GENERATE",
-            "numImages": images,
-            "width": width,
-            "height": height,
-            "generateParams": {
-                "query": prompt
-            }
-        }
 
-        data = {
-            'pipeline_id': (None, pipeline),
-            'params': (None, json.dumps(params), 'application/json')
-        }
-        response = requests.post(self.URL + 'key/api/v1/pipeline/run', headers=self.AUTH_HEADERS, files=data)
-        data = response.json()
-        print(data)
-        return data['uuid']
-
-    def check_generation(self, request_id, attempts=10, delay=10):
-        while attempts > 0:
-            response = requests.get(self.URL + 'key/api/v1/pipeline/status/' + request_id, headers=self.AUTH_HEADERS)
-            data = response.json()
-            if data['status'] == 'DONE':
-                return data['files']
-
-            attempts -= 1
-            time.sleep(delay)
-
-
-# def generate_image(prompt, api_key=kandinsky_api_key, secret_key=kandinsky_secret_key,
-#                    width=1024, height=1024, num_images=1, style="DEFAULT"):
-#     base_url = "https://api-key.fusionbrain.ai/"
-#     auth_headers = {
-#         "X-Key": f"Key {api_key}",
-#         "X-Secret": f"Secret {secret_key}",
-#     }
-#
-#     # Получение ID модели
-#     response = requests.get(base_url + "key/api/v1/models", headers=auth_headers)
-#     response.raise_for_status()
-#     model_id = response.json()[0]["id"]
-#
-#     # Параметры для генерации изображения
-#     params = {
-#         "type": "GENERATE",
-#         "style": style,
-#         "numImages": num_images,
-#         "width": width,
-#         "height": height,
-#         "negativePromptUnclip": "яркие цвета, кислотность, высокая контрастность",
-#         "censored": False,
-#         "generateParams": {
-#             "query": prompt
-#         }
-#     }
-#
-#     # Отправка запроса на генерацию
-#     data = {
-#         "model_id": (None, model_id),
-#         "params": (None, json.dumps(params), "application/json")
-#     }
-#     response = requests.post(base_url + "key/api/v1/text2image/run", headers=auth_headers, files=data)
-#     response.raise_for_status()
-#     uuid = response.json()["uuid"]
-#
-#     # Проверка статуса и получение результата
-#     while True:
-#         response = requests.get(base_url + "key/api/v1/text2image/status/" + uuid, headers=auth_headers)
-#         response.raise_for_status()
-#         data = response.json()
-#         if data["status"] == "DONE":
-#             return data["images"]
-#         elif data["status"] == "FAIL":
-#             raise Exception("Ошибка при генерации изображения")
-#         time.sleep(10)
+async def generate_image(prompt, width=1024, height=1024, num_images=1, style="DEFAULT"):
+    return await kandinsky.generate(prompt, width=width, height=height, num_images=num_images, style=style)
 
 
 if __name__ == "__main__":
-    api = FusionBrainAPI('https://api-key.fusionbrain.ai/', kandinsky_api_key, kandinsky_secret_key)
-    pipeline_id = api.get_pipeline()
-    uuid = api.generate("Sun in sky", pipeline_id)
-    files = api.check_generation(uuid)
-    print(files)
+    async def _test() -> None:
+        started = time.monotonic()
+        images = await generate_image("Sun in sky")
+        print(f"images={len(images)} elapsed={time.monotonic() - started:.1f}s")
+        await kandinsky.close()
+
+    asyncio.run(_test())
@@ -10,6 +10,7 @@
 from __future__ import annotations
 
 import os
+import json
 import asyncio
 from typing import Optional
 
@@ -29,6 +30,46 @@ PROXY_URL: Optional[str] = os.getenv("PROXY_URL")
 # Используем одну модель для текстовых задач
 GPT_MODEL = "gpt-5-nano"
 
+# Шаблоны запросов (входят в ключ кэша services.llm_cache)
+ADD_SPACE_PROMPT = (
+    "Add spaces between words in the following text. "
+    "Return only the spaced text:\n\n"
+    "{text}"
+)
+TRANSLATE_PROMPT = (
+    "Translate the following text into Russian. "
+    "Return only the translation:\n\n"
+    "{text}"
+)
+ENRICH_PHRASES_PROMPT = (
+    "For each phrase below return the phrase unchanged, the phrase with spaces "
+    "between words and its translation into Russian. Keep the order of phrases. "
+    "One phrase per line:\n\n"
+    "{text}"
+)
+
+# Схема ответа для пакетного перевода (structured outputs)
+ENRICH_PHRASES_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "phrases": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "text": {"type": "string"},
+                    "spaced": {"type": "string"},
+                    "translation": {"type": "string"},
+                },
+                "required": ["text", "spaced", "translation"],
+                "additionalProperties": False,
+            },
+        },
+    },
+    "required": ["phrases"],
+    "additionalProperties": False,
+}
+
 # -----------------------------------------------------------------------------
 # Клиенты (создаются один раз на весь процесс)
 # -----------------------------------------------------------------------------
@@ -60,6 +101,41 @@ async def openai_text_to_speech(text: str):
     )
 
 
+async def openai_complete(prompt: str) -> tuple[str, int]:
+    """
+    Текстовый запрос к модели GPT_MODEL.
+
+    :param prompt: Готовый текст запроса
+    :return: Ответ модели и количество израсходованных токенов
+    """
+    response = await openai_client.responses.create(model=GPT_MODEL, input=prompt)
+    tokens = response.usage.total_tokens if response.usage else 0
+    return response.output_text, tokens
+
+
+async def openai_enrich_phrases(phrases: list[str]) -> tuple[list[dict], int]:
+    """
+    Перевод и расстановка пробелов для нескольких фраз одним запросом.
+
+    :param phrases: Фразы, по одной в строке запроса
+    :return: Список словарей {text, spaced, translation} и количество израсходованных токенов
+    """
+    response = await openai_client.responses.create(
+        model=GPT_MODEL,
+        input=ENRICH_PHRASES_PROMPT.format(text="\n".join(phrases)),
+        text={
+            "format": {
+                "type": "json_schema",
+                "name": "phrases",
+                "schema": ENRICH_PHRASES_SCHEMA,
+                "strict": True,
+            }
+        },
+    )
+    tokens = response.usage.total_tokens if response.usage else 0
+    return json.loads(response.output_text)["phrases"], tokens
+
+
 async def openai_gpt_add_space(text: str) -> str:
     """
     Добавляет пробелы между словами (актуально для японского языка).
@@ -72,15 +148,8 @@ async def openai_gpt_add_space(text: str) -> str:
     if LOCATION != "ja-JP":
         return text
 
-    response = await openai_client.responses.create(
-        model=GPT_MODEL,
-        input=(
-            "Add spaces between words in the following text. "
-            "Return only the spaced text:\n\n"
-            f"{text}"
-        ),
-    )
-    return response.output_text
+    output_text, _ = await openai_complete(ADD_SPACE_PROMPT.format(text=text))
+    return output_text
 
 
 async def openai_gpt_translate(text: str) -> str:
@@ -90,15 +159,8 @@ async def openai_gpt_translate(text: str) -> str:
     :param text: Исходный текст
     :return: Перевод
     """
-    response = await openai_client.responses.create(
-        model=GPT_MODEL,
-        input=(
-            "Translate the following text into Russian. "
-            "Return only the translation:\n\n"
-            f"{text}"
-        ),
-    )
-    return response.output_text
+    output_text, _ = await openai_complete(TRANSLATE_PROMPT.format(text=text))
+    return output_text
 
 
 async def openai_gpt_get_phrase_from_text(text: str) -> str:
@@ -1,51 +1,118 @@
+import asyncio
+import io
 import logging
+from datetime import date
 
 import librosa
 import matplotlib.pyplot as plt
 import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
 from scipy.interpolate import interp1d
 from scipy.signal import savgol_filter
 
 logger = logging.getLogger('default')
 
 
-# TODO обрабатывать оригинальные файлы только один раз при запуске бота.
+def trim_and_pad(audio: np.ndarray, sample_rate: int) -> np.ndarray:
+    """
+    Удаляет тишину и тихие шумы в начале и конце записи и добавляет 0.2 секунды тишины в начало.
+    """
+    audio, _ = librosa.effects.trim(audio, top_db=20, frame_length=1024, hop_length=256)
+    silence = np.zeros(int(sample_rate * 0.2), dtype=audio.dtype)
+    return np.concatenate((silence, audio))
+
+
+def prepare_signal(audio: np.ndarray, sample_rate: int) -> np.ndarray:
+    """
+    Подготовка записи к сравнению: обрезка, тишина в начале и нормализация амплитуды.
+    """
+    return librosa.util.normalize(trim_and_pad(audio, sample_rate)).astype(np.float32)
+
+
 class PronunciationVisualizer:
-    def __init__(self, original_audio, spoken_audio, sample_rate, file_name):
+    def __init__(self, original_audio, spoken_audio, sample_rate, original_prepared=False):
+        """
+        :param original_prepared: оригинал уже подготовлен prepare_signal (взят из кэша).
+        """
         self.original_audio = original_audio
         self.spoken_audio = spoken_audio
         self.sample_rate = sample_rate
-        self.file_name = file_name
+        self.original_prepared = original_prepared
 
-    async def preprocess_audio(self):
-        # Удаление тишины и тихих шумов в начале файлов
-        self.original_audio, _ = librosa.effects.trim(self.original_audio, top_db=20, frame_length=1024, hop_length=256)
-        self.spoken_audio, _ = librosa.effects.trim(self.spoken_audio, top_db=20, frame_length=1024, hop_length=256)
-
-        # Добавление 0.2 секунды тишины в начало обоих файлов
-        silence = np.zeros(int(self.sample_rate * 0.2))
-        self.original_audio = np.concatenate((silence, self.original_audio))
-        self.spoken_audio = np.concatenate((silence, self.spoken_audio))
+    def _preprocess(self):
+        if not self.original_prepared:
+            self.original_audio = prepare_signal(self.original_audio, self.sample_rate)
+        self.spoken_audio = prepare_signal(self.spoken_audio, self.sample_rate)
 
         # Уравнивание длины двух файлов
         max_length = max(len(self.original_audio), len(self.spoken_audio))
         self.original_audio = librosa.util.fix_length(self.original_audio, size=max_length)
         self.spoken_audio = librosa.util.fix_length(self.spoken_audio, size=max_length)
 
-        # Нормализация по максимальному значению амплитуды
-        self.original_audio = librosa.util.normalize(self.original_audio)
-        self.spoken_audio = librosa.util.normalize(self.spoken_audio)
-
+    async def preprocess_audio(self):
+        # Обрезка и нормализация librosa занимают процессор, поэтому выполняются в отдельном потоке
+        await asyncio.to_thread(self._preprocess)
         logger.debug('процессинг закончен')
 
-    async def plot_waveform(self):
-        logger.debug('начало рисования графика')
-        fig, ax = plt.subplots()
-        ax.plot(self.original_audio, label='Original')
-        ax.plot(self.spoken_audio, label='Spoken', alpha=0.7)
-        ax.legend()
-        plt.savefig(f'temp/{self.file_name}.png')
-        logger.debug('окончание рисования графика')
+
+# Точек по горизонтали достаточно для картинки шириной в несколько сотен пикселей
+ENVELOPE_POINTS = 2000
+
+
+def minmax_envelope(audio: np.ndarray, points: int = ENVELOPE_POINTS) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Прореживает сигнал до points интервалов, сохраняя в каждом минимум и максимум.
+
+    :return: Индексы начала интервалов в исходном сигнале, минимумы и максимумы.
+    """
+    audio = np.asarray(audio, dtype=np.float32)
+    if len(audio) <= points:
+        return np.arange(len(audio)), audio, audio
+    bucket = int(np.ceil(len(audio) / points))
+    padded = np.pad(audio, (0, bucket * points - len(audio)), mode='edge').reshape(points, bucket)
+    return np.arange(points) * bucket, padded.min(axis=1), padded.max(axis=1)
+
+
+def _png(fig: Figure) -> bytes:
+    buf = io.BytesIO()
+    FigureCanvasAgg(fig).print_png(buf)
+    return buf.getvalue()
+
+
+def render_waveform(original: tuple[np.ndarray, np.ndarray, np.ndarray],
+                    spoken: tuple[np.ndarray, np.ndarray, np.ndarray]) -> bytes:
+    """
+    Рисует огибающие оригинальной и произнесенной записи (результаты minmax_envelope) в PNG.
+    """
+    fig = Figure()
+    ax = fig.subplots()
+    ax.fill_between(original[0], original[1], original[2], label='Original', linewidth=0.5)
+    ax.fill_between(spoken[0], spoken[1], spoken[2], label='Spoken', alpha=0.7, linewidth=0.5)
+    ax.legend()
+    return _png(fig)
+
+
+def render_progress_histogram(dates: list[date], scores: list[int], days: int) -> bytes:
+    """
+    Рисует гистограмму выполненных заданий по дням в PNG.
+    """
+    fig = Figure(figsize=(12, 6))
+    ax = fig.subplots()
+    bars = ax.bar(dates, scores, align='center', alpha=0.8)
+    ax.set_title(f"Прогресс за последние {days} дней")
+    ax.set_xlabel("Дата")
+    ax.set_ylabel("Количество выполненных заданий")
+    ax.tick_params(axis='x', labelrotation=45)
+
+    # Добавляем текстовые метки с точными значениями над каждым столбцом
+    for bar in bars:
+        height = bar.get_height()
+        ax.text(bar.get_x() + bar.get_width() / 2., height,
+                f'{height:.0f}', ha='center', va='bottom')
+
+    fig.tight_layout()
+    return _png(fig)
 
 
 def plot_pitch(audio):
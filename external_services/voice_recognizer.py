@@ -1,5 +1,20 @@
+"""
+Распознавание речи вне event loop.
+
+Декодирование ogg (pydub/ffmpeg) и запрос к Google выполняются в ограниченном пуле потоков,
+аудио конвертируется в WAV в памяти, без временных файлов. Бэкенд распознавания подменяемый:
+для локальной проверки можно подставить StubRecognitionBackend.
+"""
+
+import asyncio
+import io
 import logging
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional, Protocol
 
 import speech_recognition as sr
 from dotenv import load_dotenv
@@ -12,37 +27,130 @@ logger = logging.getLogger('default')
 
 load_dotenv()
 location = os.getenv('LOCATION')
+RECOGNITION_WORKERS = int(os.getenv('RECOGNITION_WORKERS', '4'))
 
 
-class SpeechRecognizer:
-    def __init__(self, spoken_file, voice_id):
-        self.spoken_file = spoken_file
-        self.voice_id = voice_id
+class RecognitionBackend(Protocol):
+    def recognize(self, audio: bytes) -> str:
+        """
+        Синхронно распознает речь из ogg-файла. Вызывается в рабочем потоке.
+        """
+        ...
 
-    def recognize_speech(self):
-        recognizer = sr.Recognizer()
 
-        # Загрузка аудиофайла и конвертация во временный WAV-файл
-        audio = AudioSegment.from_ogg(self.spoken_file)
-        audio.export(f"{self.voice_id}temp.wav", format="wav")
+class GoogleRecognitionBackend:
+    def __init__(self, language: Optional[str] = location):
+        self.language = language
 
-        # Распознавание речи на японском языке из временного WAV-файла
-        with sr.AudioFile(f"{self.voice_id}temp.wav") as source:
+    @staticmethod
+    def to_wav(audio: bytes) -> io.BytesIO:
+        wav = io.BytesIO()
+        AudioSegment.from_file(io.BytesIO(audio), format='ogg').export(wav, format='wav')
+        wav.seek(0)
+        return wav
+
+    def recognize(self, audio: bytes) -> str:
+        recognizer = sr.Recognizer()
+        with sr.AudioFile(self.to_wav(audio)) as source:
             audio_data = recognizer.record(source)
-            try:
-                text = recognizer.recognize_google(audio_data, language=location)
-            # text = recognizer.recognize_google(audio_data, language="en-US")
-            except UnknownValueError:
-                text = LEXICON_RU['value_error']
+        try:
+            return recognizer.recognize_google(audio_data, language=self.language)
+        except UnknownValueError:
+            return LEXICON_RU['value_error']
+
+
+class StubRecognitionBackend:
+    """
+    Возвращает заранее заданный текст, не обращаясь к ffmpeg и сети.
+    """
+
+    def __init__(self, text: str = ''):
+        self.text = text
+
+    def recognize(self, audio: bytes) -> str:
+        return self.text
 
-        # Удаление временного WAV-файла
-        os.remove(f"{self.voice_id}temp.wav")
 
+@dataclass
+class RecognitionStats:
+    # queued - ждут свободного потока, in_progress - распознаются сейчас
+    queued: int = 0
+    in_progress: int = 0
+    completed: int = 0
+    failed: int = 0
+    total_latency: float = 0.0
+    max_latency: float = 0.0
+
+    def observe(self, latency: float) -> None:
+        self.total_latency += latency
+        self.max_latency = max(self.max_latency, latency)
+
+    def as_dict(self) -> dict:
+        done = self.completed + self.failed
+        return {
+            'queue_depth': self.queued,
+            'in_progress': self.in_progress,
+            'completed': self.completed,
+            'failed': self.failed,
+            'avg_latency': round(self.total_latency / done, 3) if done else 0.0,
+            'max_latency': round(self.max_latency, 3),
+        }
+
+
+class SpeechRecognitionService:
+    def __init__(self, backend: Optional[RecognitionBackend] = None, workers: int = RECOGNITION_WORKERS):
+        self.backend = backend or GoogleRecognitionBackend()
+        self.workers = workers
+        self.stats = RecognitionStats()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    def _ensure_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='recognizer')
+            self._semaphore = asyncio.Semaphore(self.workers)
+        return self._executor
+
+    def set_backend(self, backend: RecognitionBackend) -> None:
+        self.backend = backend
+
+    def _run(self, audio: bytes | Path) -> str:
+        if isinstance(audio, Path):
+            audio = audio.read_bytes()
+        return self.backend.recognize(audio)
+
+    async def recognize(self, audio: bytes | Path) -> str:
+        """
+        Распознает речь из ogg (содержимое или путь к файлу), не блокируя event loop.
+        """
+        executor = self._ensure_executor()
+        started = time.monotonic()
+        self.stats.queued += 1
+        waiting = True
+        try:
+            async with self._semaphore:
+                self.stats.queued -= 1
+                waiting = False
+                self.stats.in_progress += 1
+                try:
+                    text = await asyncio.get_running_loop().run_in_executor(executor, self._run, audio)
+                finally:
+                    self.stats.in_progress -= 1
+        except Exception:
+            self.stats.failed += 1
+            raise
+        finally:
+            if waiting:
+                self.stats.queued -= 1
+            self.stats.observe(time.monotonic() - started)
+        self.stats.completed += 1
         return text
 
-    def check_pronunciation(self, text):
-        # Здесь можно добавить логику для проверки произношения и предоставления рекомендаций
-        # Например, использовать библиотеку для обработки текста и анализа речи на японском языке
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+            self._semaphore = None
+
 
-        # Вернуть заглушку для примера
-        return "Нет рекомендаций на данный момент."
+speech_recognizer = SpeechRecognitionService()
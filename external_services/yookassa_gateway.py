@@ -0,0 +1,161 @@
+"""
+Асинхронный клиент API YooKassa.
+
+Особенности:
+- одна сессия aiohttp на процесс (connection pooling)
+- ограничение числа одновременных запросов (YOOKASSA_CONCURRENCY)
+- каждый запрос на создание платежа передает Idempotence-Key, поэтому повтор после
+  сетевой ошибки или ответа 5xx не создает второй платеж
+
+Локальная заглушка API для нагрузочной проверки продлений:
+    python -m external_services.yookassa_gateway mock
+    YOOKASSA_API_URL=http://127.0.0.1:8089/v3/ python -m external_services.yookassa_gateway bench 500
+"""
+
+import asyncio
+import os
+import sys
+import time
+import uuid
+from typing import Optional
+
+import aiohttp
+from aiohttp import web
+from dotenv import load_dotenv
+
+load_dotenv()
+
+YOOKASSA_API_URL = os.getenv('YOOKASSA_API_URL', 'https://api.yookassa.ru/v3/')
+YOOKASSA_CONCURRENCY = int(os.getenv('YOOKASSA_CONCURRENCY', '10'))
+MAX_RETRIES = 3
+MOCK_PORT = 8089
+
+
+class YooKassaError(Exception):
+    def __init__(self, status: int, data: dict):
+        super().__init__(f"YooKassa {status}: {data.get('description') or data}")
+        self.status = status
+        self.data = data
+
+
+class YooKassaGateway:
+    def __init__(self, account_id: Optional[str] = os.getenv('YOOKASSA_ACCOUNT_ID'),
+                 secret_key: Optional[str] = os.getenv('YOOKASSA_SECRET_KEY'),
+                 base_url: str = YOOKASSA_API_URL, concurrency: int = YOOKASSA_CONCURRENCY,
+                 max_retries: int = MAX_RETRIES):
+        self.base_url = base_url
+        self.auth = aiohttp.BasicAuth(account_id or '', secret_key or '')
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        # Создаем лениво: сессию нельзя открыть до запуска event loop
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                auth=self.auth,
+                timeout=aiohttp.ClientTimeout(total=30),
+                connector=aiohttp.TCPConnector(limit=self.concurrency, keepalive_timeout=60),
+            )
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        return self._session
+
+    async def _request(self, method: str, path: str, idempotency_key: Optional[str] = None,
+                       json: Optional[dict] = None) -> dict:
+        headers = {'Idempotence-Key': idempotency_key} if idempotency_key else None
+        session = self.session
+        for attempt in range(self.max_retries + 1):
+            try:
+                async with self._semaphore:
+                    async with session.request(method, self.base_url + path, json=json, headers=headers) as response:
+                        data = await response.json(content_type=None)
+                        if response.status < 400:
+                            return data
+                        # 4xx повторять бессмысленно, 5xx и 429 повторяем с тем же ключом
+                        if response.status < 500 and response.status != 429:
+                            raise YooKassaError(response.status, data)
+                        error = YooKassaError(response.status, data)
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                error = e
+            if attempt == self.max_retries or (method != 'GET' and not idempotency_key):
+                raise error
+            await asyncio.sleep(2 ** attempt)
+
+    async def create_payment(self, params: dict, idempotency_key: Optional[str] = None) -> dict:
+        """
+        Создает платеж.
+
+        :param params: Тело запроса POST /payments
+        :param idempotency_key: Ключ идемпотентности; один и тот же ключ дает один и тот же платеж
+        :return: Объект платежа
+        """
+        return await self._request('POST', 'payments', idempotency_key or str(uuid.uuid4()), params)
+
+    async def get_payment(self, payment_id: str) -> dict:
+        return await self._request('GET', f'payments/{payment_id}')
+
+    async def close(self) -> None:
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+
+yookassa_gateway = YooKassaGateway()
+
+
+# -----------------------------------------------------------------------------
+# Локальная заглушка API и нагрузочная проверка
+# -----------------------------------------------------------------------------
+
+def make_mock_app(latency: float = 0.3) -> web.Application:
+    """
+    Заглушка POST /v3/payments: отвечает через latency секунд и возвращает
+    один и тот же платеж на повторный Idempotence-Key.
+    """
+    payments: dict[str, dict] = {}
+
+    async def create_payment(request: web.Request) -> web.Response:
+        key = request.headers.get('Idempotence-Key')
+        if not key:
+            return web.json_response({'type': 'error', 'description': 'Idempotence-Key required'}, status=400)
+        await asyncio.sleep(latency)
+        if key not in payments:
+            body = await request.json()
+            payments[key] = {
+                'id': str(uuid.uuid4()),
+                'status': 'pending' if 'confirmation' in body else 'succeeded',
+                'amount': body['amount'],
+                'metadata': body.get('metadata', {}),
+                'confirmation': {'type': 'redirect', 'confirmation_url': 'https://example.com/pay'},
+            }
+        return web.json_response(payments[key])
+
+    app = web.Application()
+    app.router.add_post('/v3/payments', create_payment)
+    return app
+
+
+async def _bench(count: int) -> None:
+    started = time.monotonic()
+    results = await asyncio.gather(*(
+        yookassa_gateway.create_payment(
+            {'amount': {'value': '100', 'currency': 'RUB'}, 'capture': True, 'metadata': {'userId': i}},
+            idempotency_key=f'bench-{i}',
+        )
+        for i in range(count)
+    ), return_exceptions=True)
+    elapsed = time.monotonic() - started
+    failed = sum(isinstance(result, Exception) for result in results)
+    print(f'payments={count} failed={failed} elapsed={elapsed:.2f}s rate={count / elapsed:.1f}/s '
+          f'concurrency={yookassa_gateway.concurrency}')
+    await yookassa_gateway.close()
+
+
+if __name__ == '__main__':
+    if sys.argv[1:2] == ['mock']:
+        web.run_app(make_mock_app(), host='127.0.0.1', port=MOCK_PORT)
+    elif sys.argv[1:2] == ['bench']:
+        asyncio.run(_bench(int(sys.argv[2]) if len(sys.argv) > 2 else 100))
+    else:
+        print(__doc__)
@@ -9,6 +9,8 @@ from handlers.system_handlers import get_user_categories
 from models import Category, Phrase, User
 from services.i18n_format import I18NFormat, I18N_FORMAT_KEY
 from services.phrase_service import process_new_phrase
+from services.reference_audio import reference_audio
+from services.tts_cache import tts_cache
 from states import AddPhraseSG
 
 
@@ -48,6 +50,8 @@ async def phrase_input(message: Message, widget: ManagedTextInput, dialog_manage
         if voice:
             msg = await message.answer_voice(voice=voice, caption=i18n_format("voice-acting"))
             voice_id = msg.voice.file_id
+            if isinstance(voice, BufferedInputFile):
+                await tts_cache.remember_file_id(text_phrase, voice_id)
 
         user_id = dialog_manager.event.from_user.id
         user = await User.get_or_none(id=user_id)
@@ -61,6 +65,7 @@ async def phrase_input(message: Message, widget: ManagedTextInput, dialog_manage
             user=user
         )
         await message.answer(i18n_format("phrase-saved"))
+        reference_audio.warm(voice_id)
         # await dialog_manager.done()
     else:
         await message.answer(i18n_format("phrase-saved"))
@@ -1,10 +1,4 @@
-import base64
 import logging
-import os
-import asyncio
-from concurrent.futures import ThreadPoolExecutor
-
-from aiogram.enums import ContentType
 
 from aiogram.enums import ContentType
 from aiogram.types import CallbackQuery, Message, BufferedInputFile
@@ -12,16 +6,19 @@ from aiogram_dialog import DialogManager, Dialog, Window, ShowMode
 from aiogram_dialog.widgets.input import TextInput, ManagedTextInput, MessageInput
 from aiogram_dialog.widgets.kbd import Button, Group, Cancel, Next, Back
 from aiogram_dialog.widgets.text import Multi
-from pydub import AudioSegment
+from tortoise.transactions import in_transaction
 
 from bot_init import bot
-from external_services.google_cloud_services import google_text_to_speech
-from external_services.kandinsky import generate_image
-from external_services.openai_services import openai_gpt_translate, openai_gpt_add_space
 from handlers.system_handlers import repeat_ai_generate_image
 from models import AudioFile, Category, Phrase, User, Subscription
+from services.blob_store import blob_store, release
 from services.i18n_format import I18NFormat, I18N_FORMAT_KEY
+from services.image_jobs import PENDING_KEY, image_jobs, image_pending, mark_image_pending
+from services.llm_cache import cached_add_space, cached_translate
+from services.reference_audio import reference_audio
 from services.services import remove_html_tags
+from services.tts_cache import tts_cache
+from services.uploads import discard_upload, persist_upload, receive_audio
 from states import AddOriginalPhraseSG
 
 logger = logging.getLogger('default')
@@ -95,7 +92,7 @@ async def text_phrase_input(message: Message, widget: ManagedTextInput, dialog_m
             dialog_manager.dialog_data["text_phrase"] = text_phrase
             await bot.send_chat_action(chat_id=message.chat.id, action="typing")
             try:
-                spaced_phrase = await openai_gpt_add_space(text_phrase)
+                spaced_phrase = await cached_add_space(text_phrase)
             except Exception as e:
                 logger.error(f'Error adding spaces: {e}')
                 spaced_phrase = text_phrase
@@ -112,98 +109,27 @@ async def translation_input(message: Message, widget: ManagedTextInput, dialog_m
 async def translate_phrase(callback: CallbackQuery, button: Button, dialog_manager: DialogManager):
     await bot.send_chat_action(chat_id=callback.message.chat.id, action="typing")
     try:
-        translation = await openai_gpt_translate(dialog_manager.dialog_data["text_phrase"])
+        translation = await cached_translate(dialog_manager.dialog_data["text_phrase"])
     except Exception as e:
         logger.error(f'Error translating: {e}')
         translation = dialog_manager.dialog_data["text_phrase"] # Fallback
     dialog_manager.dialog_data["translation"] = translation
 
 
-def convert_audio(file_name, file_id, is_voice=False):
-    """
-    Synchronous function to convert audio/voice to OGG OPUS and return base64 data.
-    """
-    try:
-        if not is_voice:
-            # Convert audio to .OGG with OPUS codec
-            audio = AudioSegment.from_file(file_name)
-            audio.export(f"{file_id}.ogg", format="ogg", codec="libopus")
-            
-            # Read converted file
-            with open(f"{file_id}.ogg", "rb") as f:
-                audio_data = f.read()
-
-            # Clean up original file (voice cleanup handled outside if needed, but here file_name is temp)
-            if os.path.exists(file_name):
-                os.remove(file_name)
-        else:
-            # Voice is already OGG usually, but we ensure it's read correctly
-            # In original code it just downloads to .ogg and reads. 
-            # Note: Telegram voice messages are usually OGG OPUS already.
-            # We just read it.
-            with open(f"{file_id}.ogg", "rb") as f:
-                audio_data = f.read()
-
-        audio_data_base64 = base64.b64encode(audio_data).decode("utf-8")
-
-        # Cleanup output file
-        if os.path.exists(f"{file_id}.ogg"):
-            os.remove(f"{file_id}.ogg")
-            
-        return audio_data_base64
-    except Exception as e:
-        logger.error(f"Error converting audio: {e}")
-        # Cleanup on error
-        if os.path.exists(f"{file_id}.ogg"):
-            os.remove(f"{file_id}.ogg")
-        if not is_voice and os.path.exists(file_name):
-             os.remove(file_name)
-        raise e
-
-
 async def audio_handler(message: Message, widget: MessageInput, dialog_manager: DialogManager):
-    file_id = message.audio.file_id if message.audio else message.voice.file_id
-    loop = asyncio.get_running_loop()
+    i18n_format = dialog_manager.middleware_data.get(I18N_FORMAT_KEY)
     await bot.send_chat_action(chat_id=message.chat.id, action="upload_voice")
+    try:
+        # В состоянии храним только ссылку на запись, сами данные лежат в upload_store
+        digest, file_id = await receive_audio(message, caption=i18n_format("voice-acting"))
+    except Exception as e:
+        logger.error(f"Failed to process audio: {e}")
+        return
 
-    if message.audio:
-        file_name = message.audio.file_name
-        file = await bot.get_file(file_id)
-        file_path = file.file_path
-        await bot.download_file(file_path, file_name)
-
-        try:
-             # Run synchronous conversion in executor
-            audio_data_base64 = await loop.run_in_executor(None, convert_audio, file_name, file_id, False)
-
-            audio = {
-                "tg_id": "",
-                "audio": audio_data_base64
-            }
-            dialog_manager.dialog_data["audio"] = audio
-        except Exception as e:
-             logger.error(f"Failed to process audio: {e}")
-             # Optionally notify user
-             return
-
-    elif message.voice:
-        file = await bot.get_file(file_id)
-        file_path = file.file_path
-        await bot.download_file(file_path, f"{file_id}.ogg")
-        
-        try:
-            # Run synchronous read in executor (IO bound but keeps event loop free)
-             audio_data_base64 = await loop.run_in_executor(None, convert_audio, None, file_id, True)
-             
-             audio = {
-                "tg_id": file_id,
-                "audio": audio_data_base64
-            }
-             dialog_manager.dialog_data["audio"] = audio
-        except Exception as e:
-            logger.error(f"Failed to process voice: {e}")
-            return
-
+    dialog_manager.dialog_data["audio"] = {
+        "tg_id": file_id,
+        "digest": digest,
+    }
     await dialog_manager.next()
 
 
@@ -213,14 +139,16 @@ async def ai_voice_message(callback: CallbackQuery, button: Button, dialog_manag
 
     await bot.send_chat_action(chat_id=callback.message.chat.id, action="upload_voice")
     try:
-        text_to_speech = await google_text_to_speech(text_phrase)
-        voice = BufferedInputFile(text_to_speech.audio_content, filename="voice_tts.ogg")
+        audio_content = await tts_cache.synthesize(text_phrase)
+        voice = await tts_cache.voice(text_phrase)
         msg = await callback.message.answer_voice(voice=voice, caption=i18n_format("voice-acting"))
         voice_id = msg.voice.file_id
+        if isinstance(voice, BufferedInputFile):
+            await tts_cache.remember_file_id(text_phrase, voice_id)
 
         audio = await AudioFile.create(
             tg_id=voice_id,
-            audio=voice.data
+            audio_digest=await blob_store.put(audio_content)
         )
 
         audio = {
@@ -245,28 +173,28 @@ async def ai_image(callback: CallbackQuery, button: Button, dialog_manager: Dial
     dialog_manager.dialog_data["prompt"] = dialog_manager.dialog_data["translation"]
     i18n_format = dialog_manager.middleware_data.get(I18N_FORMAT_KEY)
     await callback.message.answer(i18n_format("starting-generate-image"))
-    await bot.send_chat_action(chat_id=callback.message.chat.id, action="upload_photo")
-    # Функция для генерации изображения автоматически
-    try:
-        images = await generate_image(prompt=dialog_manager.dialog_data["prompt"])
-        if images and len(images) > 0:
-            # Декодируем изображение из Base64
-            image_data = base64.b64decode(images[0])
-            image = BufferedInputFile(image_data, filename="image.png")
-            # Отправляем изображение
-            msg = await callback.message.answer_photo(photo=image, caption=i18n_format("generated-image"))
-            image_id = msg.photo[-1].file_id
-            image_msg_id = msg.message_id
-            dialog_manager.dialog_data['image_msg_id'] = image_msg_id
-            dialog_manager.dialog_data["image_id"] = image_id
-        else:
-            await callback.message.answer(i18n_format("failed-generate-image"))
-        dialog_manager.show_mode = ShowMode.SEND
-        # await dialog_manager.show(show_mode=ShowMode.SEND)
-    except Exception as e:
-        await callback.message.answer(text=i18n_format("failed-generate-image"))
-        dialog_manager.show_mode = ShowMode.SEND
-        logger.error('Ошибка при генерации изображения: %s', e)
+    # Пока изображение не готово, фраза не сохраняется (см. save_phrase_button_clicked)
+    mark_image_pending(dialog_manager.dialog_data)
+    bg_manager = dialog_manager.bg()
+
+    async def on_sent(msg: Message):
+        await bg_manager.update({'image_msg_id': msg.message_id, 'image_id': msg.photo[-1].file_id,
+                                 PENDING_KEY: None},
+                                show_mode=ShowMode.SEND)
+
+    async def on_failed():
+        await bg_manager.update({PENDING_KEY: None})
+
+    # Генерация идет в фоне, окно диалога обновится, когда изображение будет готово
+    image_jobs.submit(
+        prompt=dialog_manager.dialog_data["prompt"],
+        chat_id=callback.message.chat.id,
+        caption=i18n_format("generated-image"),
+        error_text=i18n_format("failed-generate-image"),
+        on_sent=on_sent,
+        on_failed=on_failed,
+    )
+    dialog_manager.show_mode = ShowMode.SEND
 
 
 async def delite_image_button_clicked(callback: CallbackQuery, button: Button, dialog_manager: DialogManager):
@@ -289,11 +217,15 @@ async def comment_next_button_clicked(callback: CallbackQuery, button: Button, d
 
 async def save_phrase_button_clicked(callback: CallbackQuery, button: Button, dialog_manager: DialogManager):
     i18n_format = dialog_manager.middleware_data.get(I18N_FORMAT_KEY)
+    if image_pending(dialog_manager.dialog_data):
+        await callback.answer(i18n_format("image-still-generating"), show_alert=True)
+        return
     category = await Category.get_or_none(id=dialog_manager.start_data["category_id"])
     user_id = dialog_manager.event.from_user.id
     user = await User.get_or_none(id=user_id)
     text_phrase = dialog_manager.dialog_data["text_phrase"]
     voice_id = dialog_manager.dialog_data["audio"]["tg_id"]
+    upload_digest = dialog_manager.dialog_data["audio"].get("digest")
     phrase = Phrase(
         category=category,
         user=user,
@@ -309,12 +241,25 @@ async def save_phrase_button_clicked(callback: CallbackQuery, button: Button, di
     if dialog_manager.dialog_data.get("spaced_phrase"):
         phrase.spaced_phrase = dialog_manager.dialog_data.get("spaced_phrase")
     try:
-        await phrase.save()
+        # Запись фразы переносится вместе с ней: если фраза не сохранится, не останется и AudioFile
+        async with in_transaction():
+            await phrase.save()
+            if upload_digest:
+                await persist_upload(upload_digest, voice_id)
     except Exception as e:
         logger.error('Ошибка при сохранении фразы: %s', e)
+        if upload_digest:
+            # blob и загрузка адресуются одним SHA-256; blob без AudioFile не нужен
+            try:
+                await release([upload_digest])
+            except Exception as e:
+                logger.error('Ошибка при удалении записи несохраненной фразы: %s', e)
         await callback.message.answer(text=i18n_format("failed-save-phrase"))
     else:
+        if upload_digest:
+            await discard_upload(upload_digest)
         await callback.message.answer(text=i18n_format("phrase-saved"))
+        reference_audio.warm(phrase.audio_id)
 
     new_phrase = [phrase.text_phrase, phrase.id]
 
@@ -1,18 +1,22 @@
-import base64
 import logging
 
 from aiogram import Router
+from aiogram.filters import Command
 from aiogram.enums import ContentType
-from aiogram.types import Message, CallbackQuery, BufferedInputFile
+from aiogram.types import Message, CallbackQuery
 from aiogram_dialog import Dialog, Window, DialogManager, StartMode
 from aiogram_dialog.widgets.input import TextInput, ManagedTextInput, MessageInput
 from aiogram_dialog.widgets.kbd import Start, Button, Group, Next
 
-from external_services.kandinsky import generate_image
+from bot_init import storage
 from handlers.system_handlers import getter_prompt, repeat_ai_generate_image
 from models import Category
 from models.main import MainPhoto
+from services.i18n import reload_translations
 from services.i18n_format import I18NFormat, I18N_FORMAT_KEY
+from services.image_jobs import image_jobs
+from services.llm_cache import llm_cache
+from services.services import is_admin
 from states import AdminDialogSG, UserManagementSG
 
 # Инициализируем роутер уровня модуля
@@ -40,18 +44,13 @@ async def ai_generate_image(message: Message, widget: ManagedTextInput, dialog_m
     dialog_manager.dialog_data['prompt'] = prompt
     i18n_format = dialog_manager.middleware_data.get(I18N_FORMAT_KEY)
     await message.answer(text=i18n_format("starting-generate-image"))
-    # Генерируем изображение
-    try:
-        images = await generate_image(prompt)
-        if images and len(images) > 0:
-            image_data = base64.b64decode(images[0])
-            image = BufferedInputFile(image_data, filename="image.png")
-            await message.answer_photo(photo=image, caption=i18n_format("generated-image"))
-        else:
-            await message.answer(i18n_format("failed-generate-image"))
-    except Exception as e:
-        logger.error('Ошибка при генерации изображения: %s', e)
-        await message.answer(text=i18n_format("failed-generate-image"))
+    # Генерируем изображение в фоне
+    image_jobs.submit(
+        prompt=prompt,
+        chat_id=message.chat.id,
+        caption=i18n_format("generated-image"),
+        error_text=i18n_format("failed-generate-image"),
+    )
 
 
 async def add_main_image(callback: CallbackQuery, button: Button, dialog_manager: DialogManager):
@@ -150,3 +149,27 @@ admin_dialog = Dialog(
 @router.message(lambda message: message.text in ["⚙️ Настройки(для админов)", "⚙️ Settings (for admins)"])
 async def process_admin_settings(message: Message, dialog_manager: DialogManager):
     await dialog_manager.start(state=AdminDialogSG.start, mode=StartMode.RESET_STACK)
+
+
+@router.message(Command(commands='reload_translations'), lambda message: is_admin(message.from_user.id))
+async def process_reload_translations(message: Message):
+    # Перечитываем .ftl файлы без перезапуска бота
+    try:
+        reload_translations()
+    except Exception as e:
+        logger.error('Ошибка при перезагрузке переводов: %s', e)
+        await message.answer(f'Не удалось перезагрузить переводы: {e}')
+        return
+    await message.answer('Переводы перезагружены')
+
+
+@router.message(Command(commands='llm_cache_stats'), lambda message: is_admin(message.from_user.id))
+async def process_llm_cache_stats(message: Message):
+    stats = llm_cache.stats.as_dict()
+    await message.answer('\n'.join(f'{name}: {value}' for name, value in stats.items()))
+
+
+@router.message(Command(commands='dialog_storage_stats'), lambda message: is_admin(message.from_user.id))
+async def process_dialog_storage_stats(message: Message):
+    report = await storage.report()
+    await message.answer(report.as_text())
@@ -8,7 +8,7 @@ from aiogram.fsm.context import FSMContext
 from aiogram.types import CallbackQuery, Message, ErrorEvent, ChatMemberUpdated
 from dotenv import load_dotenv
 
-from bot_init import redis
+from bot_init import storage
 from lexicon.lexicon_ru import LEXICON_RU
 from models import User
 from services.create_update_user import update_or_create_user
@@ -148,13 +148,10 @@ async def error_handler(event: ErrorEvent):
         if intent_id_match:
             intent_id = intent_id_match.group(1)
 
-            # Поиск и удаление ключа в Redis
-            async for key in redis.scan_iter("*"):
-                value = await redis.get(key)
-                if value and intent_id.encode() in value:
-                    await redis.delete(key)
-                    logger.info(f"Удален ключ из Redis: {key}")
-                    break
+            # Удаляем стек диалогов, в котором остался интент без контекста
+            stack_key = await storage.drop_intent(intent_id)
+            if stack_key:
+                logger.info(f"Удален ключ из Redis: {stack_key}")
             else:
                 logger.warning(f"Ключ для intent id {intent_id} не найден в Redis")
 
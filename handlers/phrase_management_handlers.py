@@ -7,7 +7,9 @@ from aiogram_dialog.widgets.text import Format, List, Multi
 from handlers.system_handlers import get_user_categories_to_manage, get_phrases
 from models import Category, Phrase
 from services.i18n_format import I18NFormat, I18N_FORMAT_KEY
-from states import ManagementSG, AddCategorySG, AddOriginalPhraseSG, EditPhraseSG, SmartPhraseAdditionSG
+from services.phrase_service import CATEGORY_PHRASE_LIMIT, delete_phrases
+from services.review_queue import review_queue
+from states import ManagementSG, AddCategorySG, AddOriginalPhraseSG, EditPhraseSG, SmartPhraseAdditionSG, BulkImportSG
 
 
 async def management_dialog_process_result(statr_data: Data, result: dict, dialog_manager: DialogManager, **kwargs):
@@ -21,6 +23,11 @@ async def management_dialog_process_result(statr_data: Data, result: dict, dialo
             phrases_count = dialog_manager.dialog_data.get('phrases_count', 0)
             phrases_count += 1
             dialog_manager.dialog_data['phrases_count'] = phrases_count
+        elif result.get('imported'):
+            category_id = dialog_manager.dialog_data.get('category_id') or dialog_manager.start_data.get('category_id')
+            phrases = await Phrase.filter(category_id=category_id, user_id=dialog_manager.event.from_user.id).all()
+            dialog_manager.dialog_data['phrases'] = [(phrase.text_phrase, str(phrase.id)) for phrase in phrases]
+            dialog_manager.dialog_data['phrases_count'] = len(phrases)
 
 
 async def get_category_for_delite(dialog_manager: DialogManager, **kwargs):
@@ -43,9 +50,8 @@ async def quick_add_phrase_button_clicked(callback: CallbackQuery, button: Butto
         category_id = dialog_manager.dialog_data['category_id']
     else:
         category_id = dialog_manager.start_data.get('category_id')
-    phrases = await Phrase.filter(category_id=category_id, user_id=dialog_manager.event.from_user.id).all()
-    count = len(phrases)
-    if count > 15:
+    count = await Phrase.filter(category_id=category_id, user_id=dialog_manager.event.from_user.id).count()
+    if count >= CATEGORY_PHRASE_LIMIT:
         await callback.answer(i18n_format('phrase-limit'), show_alert=True)
     else:
         await dialog_manager.start(state=SmartPhraseAdditionSG.start, data={"category_id": category_id})
@@ -57,14 +63,26 @@ async def add_phrase_button_clicked(callback: CallbackQuery, button: Button, dia
         category_id = dialog_manager.dialog_data['category_id']
     else:
         category_id = dialog_manager.start_data.get('category_id')
-    phrases = await Phrase.filter(category_id=category_id, user_id=dialog_manager.event.from_user.id).all()
-    count = len(phrases)
-    if count > 15:
+    count = await Phrase.filter(category_id=category_id, user_id=dialog_manager.event.from_user.id).count()
+    if count >= CATEGORY_PHRASE_LIMIT:
         await callback.answer(i18n_format('phrase-limit'), show_alert=True)
     else:
         await dialog_manager.start(state=AddOriginalPhraseSG.text_phrase, data={"category_id": category_id})
 
 
+async def bulk_import_button_clicked(callback: CallbackQuery, button: Button, dialog_manager: DialogManager):
+    i18n_format = dialog_manager.middleware_data.get(I18N_FORMAT_KEY)
+    if dialog_manager.dialog_data.get('category_id'):
+        category_id = dialog_manager.dialog_data['category_id']
+    else:
+        category_id = dialog_manager.start_data.get('category_id')
+    count = await Phrase.filter(category_id=category_id, user_id=dialog_manager.event.from_user.id).count()
+    if count >= CATEGORY_PHRASE_LIMIT:
+        await callback.answer(i18n_format('phrase-limit'), show_alert=True)
+    else:
+        await dialog_manager.start(state=BulkImportSG.start, data={"category_id": category_id})
+
+
 async def category_filled(callback: CallbackQuery, checkbox: ManagedMultiselect, dialog_manager: DialogManager, *args,
                           **kwargs):
     dialog_manager.dialog_data['category_filled'] = checkbox.get_checked()
@@ -136,8 +154,9 @@ async def confirm_deletion_category_button_clicked(callback: CallbackQuery, butt
     i18n_format = dialog_manager.middleware_data.get(I18N_FORMAT_KEY)
     category_ids = dialog_manager.dialog_data['category_filled']
     for cat_id in category_ids:
-        await Phrase.filter(category_id=cat_id).delete()
+        await delete_phrases(category_id=cat_id)
         await Category.filter(id=cat_id).delete()
+    await review_queue.invalidate([callback.from_user.id])
     # await dialog_manager.back()
     await callback.message.answer(i18n_format('deleted-categories'))
     await dialog_manager.switch_to(state=ManagementSG.start, show_mode=ShowMode.SEND)
@@ -147,8 +166,8 @@ async def confirm_deletion_phrase_button_clicked(callback: CallbackQuery, button
                                                  dialog_manager: DialogManager):
     i18n_format = dialog_manager.middleware_data.get(I18N_FORMAT_KEY)
     phrase_ids = dialog_manager.dialog_data['phrases_filled']
-    for phrase_id in phrase_ids:
-        await Phrase.filter(id=phrase_id).delete()
+    await delete_phrases(id__in=phrase_ids)
+    await review_queue.invalidate([callback.from_user.id])
     # await dialog_manager.done()
     await callback.message.answer(i18n_format('deleted-phrases'))
     await dialog_manager.switch_to(state=ManagementSG.select_phrase, show_mode=ShowMode.SEND)
@@ -254,6 +273,11 @@ management_dialog = Dialog(
             id='add_phrase',
             on_click=add_phrase_button_clicked,
         ),
+        Button(
+            text=I18NFormat('bulk-import-button'),
+            id='bulk_import',
+            on_click=bulk_import_button_clicked,
+        ),
         Button(
             text=I18NFormat('select-phrase-to-delete'),
             id='select_phrase_for_delete',
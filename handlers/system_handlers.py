@@ -1,17 +1,17 @@
-import base64
 import logging
 import os
 import random
 
-from aiogram.types import CallbackQuery, BufferedInputFile
+from aiogram.types import CallbackQuery
 from aiogram_dialog import DialogManager, ShowMode
 from aiogram_dialog.widgets.kbd import Select, Button
 from tortoise.expressions import Q
 
 from bot_init import bot
-from external_services.kandinsky import generate_image
 from models import User, Category, Phrase, Subscription
+from services.entitlements import entitlements
 from services.i18n_format import I18N_FORMAT_KEY
+from services.image_jobs import image_jobs
 from services.services import replace_random_words
 
 location = os.getenv('LOCATION')
@@ -40,17 +40,14 @@ async def repeat_ai_generate_image(callback: CallbackQuery, button: Button, dial
     prompt = dialog_manager.dialog_data['prompt']
     i18n_format = dialog_manager.middleware_data.get(I18N_FORMAT_KEY)
     await callback.message.answer(text=i18n_format("starting-generate-image"))
-    try:
-        images = await generate_image(prompt)
-        if images and len(images) > 0:
-            image_data = base64.b64decode(images[0])
-            image = BufferedInputFile(image_data, filename="image.png")
-            await callback.message.answer_photo(photo=image, caption=i18n_format("generated-image"))
-        else:
-            await callback.message.answer(i18n_format("failed-generate-image"))
-    except Exception as e:
-        logger.error('Ошибка при генерации изображения: %s', e)
-        await callback.message.answer(text=i18n_format("failed-generate-image"))
+    # Генерируем изображение в фоне
+    image_jobs.submit(
+        prompt=prompt,
+        chat_id=callback.message.chat.id,
+        caption=i18n_format("generated-image"),
+        error_text=i18n_format("failed-generate-image"),
+        force=True,
+    )
 
     # await dialog_manager.show(show_mode=ShowMode.SEND)
     dialog_manager.show_mode = ShowMode.SEND
@@ -221,12 +218,7 @@ async def check_day_counter(dialog_manager: DialogManager) -> bool:
 
     if user_id in admin_ids:
         return True
-    user = await User.get(id=user_id)
-    subscription = await Subscription.get_or_none(user=user).prefetch_related('type_subscription')
-    day_counter = user.day_counter
-    if str(subscription.type_subscription) != 'Free' or (str(subscription.type_subscription) == 'Free' and day_counter <= 50):
-        user.day_counter += 1
-        await user.save()
+    if await entitlements.consume(user_id):
         return True
     else:
         i18n_format = dialog_manager.middleware_data.get(I18N_FORMAT_KEY)
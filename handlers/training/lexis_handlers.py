@@ -1,6 +1,4 @@
-import os
 from datetime import timedelta, datetime
-from pathlib import Path
 
 import pytz
 from aiogram.enums import ContentType
@@ -11,9 +9,11 @@ from aiogram_dialog.widgets.kbd import Button, Cancel, Group, Select, Back
 from aiogram_dialog.widgets.text import Format, Multi
 
 from bot_init import bot
-from external_services.voice_recognizer import SpeechRecognizer
+from external_services.voice_recognizer import speech_recognizer
 from models import User, Phrase, UserAnswer, ReviewStatus
+from services.entitlements import entitlements
 from services.i18n_format import I18NFormat, I18N_FORMAT_KEY, default_format_text
+from services.media import media_fetcher
 from services.services import normalize_text
 from states import LexisTrainingSG
 from ..system_handlers import get_user_categories, first_answer_getter, second_answer_getter, \
@@ -30,19 +30,9 @@ def get_counter(data, widget, dialog_manager: DialogManager):
 
 async def answer_audio_handler(message: Message, widget: MessageInput, dialog_manager: DialogManager):
     i18n_format = dialog_manager.middleware_data.get(I18N_FORMAT_KEY, default_format_text)
-    user_id = message.from_user.id
-    # Скачиваем файл
+    # Скачиваем файл в память
     voice_id = message.voice.file_id
-    file = await bot.get_file(voice_id)
-    file_path = file.file_path
-    file_on_disk = Path("", f"temp/{voice_id}.ogg")
-    await bot.download_file(file_path, destination=file_on_disk)
-
-    spoken_recognizer = SpeechRecognizer(file_on_disk, user_id)
-    spoken_answer = spoken_recognizer.recognize_speech()
-
-    # Удаление временного файла
-    os.remove(file_on_disk)
+    spoken_answer = await speech_recognizer.recognize(await media_fetcher.fetch(voice_id))
 
     dialog_manager.dialog_data['answer'] = spoken_answer
     text_phrase = dialog_manager.dialog_data['question']
@@ -99,8 +89,7 @@ async def check_answer_text(message: Message, widget: ManagedTextInput, dialog_m
     else:
         dialog_manager.dialog_data['counter'] += 1
         user_answer.result = False
-        user.day_counter += 1
-        await user.save()
+        await entitlements.increment(user_id)
     await user_answer.save()
 
 
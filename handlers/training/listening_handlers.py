@@ -1,5 +1,4 @@
 import os
-import re
 
 from aiogram.enums import ContentType
 from aiogram.types import BufferedInputFile, Message
@@ -8,10 +7,12 @@ from aiogram_dialog.widgets.input import ManagedTextInput, TextInput, MessageInp
 from aiogram_dialog.widgets.kbd import Cancel, Group
 
 from bot_init import bot
-from external_services.google_cloud_services import google_text_to_speech
+from external_services.google_cloud_services import google_tts
 from handlers.system_handlers import check_day_counter
-from models import TextToSpeech, Subscription, User
+from models import Subscription, User
 from services.i18n_format import I18NFormat, I18N_FORMAT_KEY
+from services.tts_cache import tts_cache
+from services.tts_store import tts_store
 from states import TextToSpeechSG
 
 
@@ -35,25 +36,20 @@ async def phrase_to_speech(message: Message, widget: ManagedTextInput, dialog_ma
         user_id = dialog_manager.event.from_user.id
         is_day_counter = await check_day_counter(dialog_manager)
         if is_day_counter:
-            # Создать имя файла из строки
-            filename = re.sub(r'[^\w\s-]', '', text).replace(' ', '_')
             # проверить есть ли в базе уже такая фраза
-            voice = await TextToSpeech.filter(text=filename).first()
+            digest = google_tts.cache_key(text)
+            voice_id = await tts_store.get_file_id(digest)
 
-            if voice:
-                await message.answer_voice(voice=voice.voice_id, caption=f'{text}')
+            if voice_id:
+                await message.answer_voice(voice=voice_id, caption=f'{text}')
 
             else:
-                response = await google_text_to_speech(text)
-                voice = BufferedInputFile(response.audio_content, filename="voice_tts.txt")
+                audio = await tts_cache.synthesize(text)
+                voice = BufferedInputFile(audio, filename="voice_tts.txt")
                 msg = await message.answer_voice(voice=voice, caption=f'{text}')
                 voice_id = msg.voice.file_id
-                await TextToSpeech.create(
-                    voice_id=voice_id,
-                    user_id=user_id,
-                    text=filename,
-                    voice=response.audio_content,
-                )
+                await tts_cache.remember_file_id(text, voice_id)
+                await tts_store.save(digest, text, user_id, voice_id, audio)
 
 
 async def voice_message_handler(message: Message, widget: MessageInput, dialog_manager: DialogManager) -> None:
@@ -1,20 +1,20 @@
-import os
+import asyncio
 import random
-from pathlib import Path
 
-import librosa
 from aiogram.enums import ContentType
-from aiogram.types import Message, CallbackQuery, FSInputFile
+from aiogram.types import Message, CallbackQuery, BufferedInputFile
 from aiogram_dialog import DialogManager, Dialog, Window, ShowMode
 from aiogram_dialog.widgets.input import MessageInput
 from aiogram_dialog.widgets.kbd import Button, Cancel, Group, Select, Back
 from aiogram_dialog.widgets.text import Format, Multi
 
-from bot_init import bot
 from external_services.visualizer import PronunciationVisualizer
-from external_services.voice_recognizer import SpeechRecognizer
+from external_services.voice_recognizer import speech_recognizer
 from models import Phrase, UserAnswer
+from services.charts import chart_renderer
 from services.i18n_format import I18NFormat, I18N_FORMAT_KEY
+from services.media import media_fetcher
+from services.reference_audio import decode_ogg, reference_audio
 from states import PronunciationTrainingSG
 from ..system_handlers import category_selected, get_user_categories, get_phrases, check_day_counter
 
@@ -72,27 +72,18 @@ async def answer_audio_handler(message: Message, widget: MessageInput, dialog_ma
     dialog_manager.dialog_data['translation'] = phrase.translation
     dialog_manager.dialog_data['comment'] = phrase.comment if phrase.comment else ' '
     answer_voice_id = message.voice.file_id
-    original_voice_id = phrase.audio_id
-    # download files
-    answer_voice = await bot.get_file(answer_voice_id)
-    original_voice = await bot.get_file(original_voice_id)
-    answer_voice_path = answer_voice.file_path
-    original_voice_path = original_voice.file_path
-    answer_voice_on_disk = Path("", f"temp/{answer_voice_id}.ogg")
-    original_voice_on_disk = Path("", f"temp/{original_voice_id}.ogg")
-    await bot.download_file(answer_voice_path, destination=answer_voice_on_disk)
-    if not original_voice_on_disk.exists():
-        await bot.download_file(original_voice_path, destination=original_voice_on_disk)
+    # download file
+    answer_voice = await media_fetcher.fetch(answer_voice_id)
     # recognize file
-    spoken_recognizer = SpeechRecognizer(answer_voice_on_disk, answer_voice_id)
-    answer_text = spoken_recognizer.recognize_speech()
+    answer_text = await speech_recognizer.recognize(answer_voice)
     dialog_manager.dialog_data['answer_text'] = answer_text
-    original_voice, sample_rate = librosa.load(original_voice_on_disk)
-    spoken_audio, _ = librosa.load(answer_voice_on_disk, sr=sample_rate)
-    visual = PronunciationVisualizer(original_voice, spoken_audio, sample_rate, answer_voice_id)
+    original_voice, sample_rate = await reference_audio.get(phrase.audio_id)
+    spoken_audio = await asyncio.to_thread(decode_ogg, answer_voice, sample_rate)
+    visual = PronunciationVisualizer(original_voice, spoken_audio, sample_rate, original_prepared=True)
     await visual.preprocess_audio()
-    await visual.plot_waveform()  # Визуализация графика звуковой волны
-    photo = FSInputFile(f'temp/{answer_voice_id}.png')
+    # Визуализация графика звуковой волны
+    waveform = await chart_renderer.waveform(visual.original_audio, visual.spoken_audio)
+    photo = BufferedInputFile(waveform, filename=f'{answer_voice_id}.png')
     await message.answer_photo(photo, caption=i18n_format('image-caption', dialog_manager.dialog_data))
     await UserAnswer.create(
         user_id=message.from_user.id,
@@ -101,8 +92,6 @@ async def answer_audio_handler(message: Message, widget: MessageInput, dialog_ma
         audio_id=answer_voice_id,
         exercise='pronunciation'
     )
-    os.remove(answer_voice_on_disk)
-    os.remove(f'temp/{answer_voice_id}.png')
 
 
 async def error_handler(message: Message, widget: MessageInput, dialog_manager: DialogManager):
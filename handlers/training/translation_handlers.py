@@ -6,6 +6,7 @@ from aiogram_dialog.widgets.kbd import Group, Cancel, Select, Back, Button
 from aiogram_dialog.widgets.text import Format, Multi
 
 from models import Phrase, User, UserAnswer
+from services.entitlements import entitlements
 from services.i18n_format import I18NFormat, I18N_FORMAT_KEY, default_format_text
 from services.services import normalize_text
 from states import TranslationTrainingSG
@@ -56,8 +57,7 @@ async def check_answer_text(message: Message, widget: ManagedTextInput, dialog_m
     else:
         dialog_manager.dialog_data['counter'] += 1
         user_answer.result = False
-        user.day_counter += 1
-        await user.save()
+        await entitlements.increment(user_id)
     await user_answer.save()
 
 
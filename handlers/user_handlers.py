@@ -18,7 +18,8 @@ from models.main import MainPhoto
 from services.create_update_user import update_or_create_user
 from services.i18n_format import I18NFormat, I18N_FORMAT_KEY, default_format_text
 from services.interval_training import start_training
-from services.services import is_admin, build_user_progress_histogram
+from services.progress_histograms import progress_histograms
+from services.services import is_admin
 from states import StartDialogSG, UserTrainingSG, ManagementSG, SubscribeManagementSG, SelectLanguageSG, IntervalSG
 
 load_dotenv()
@@ -133,9 +134,10 @@ async def process_phrase_management(message: Message, dialog_manager: DialogMana
     await bot.set_my_commands(user_menu, scope=types.BotCommandScopeChat(chat_id=chat_id))
     await update_or_create_user(message)
     days = 7
-    img_buf = await build_user_progress_histogram(user_id, days=days)
-    photo = BufferedInputFile(img_buf.read(), filename='image.jpg')
-    await message.answer_photo(photo=photo)
+    photo, version = await progress_histograms.get_photo(user_id, days=days)
+    msg = await message.answer_photo(photo=photo)
+    if isinstance(photo, BufferedInputFile):
+        await progress_histograms.remember_file_id(user_id, days, version, msg.photo[-1].file_id)
 
 
 @router.message(lambda message: message.text in ["🔔 Управление подпиской 💎",
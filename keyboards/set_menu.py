@@ -5,8 +5,8 @@ from aiogram import Bot, types
 from aiogram.types import BotCommand
 from dotenv import load_dotenv
 
-from bot_init import make_i18n_middleware
 from lexicon.lexicon_ru import LEXICON_COMMANDS_RU
+from services.i18n import get_l10ns
 
 
 load_dotenv()
@@ -28,7 +28,7 @@ async def get_localized_menu(i18n_format):
 
 # Функция для установки меню бота с локалью по умолчанию
 async def set_default_commands(bot: Bot):
-    default_l10n = make_i18n_middleware().l10ns[default_locale]
+    default_l10n = get_l10ns()[default_locale]
     default_menu = await get_localized_menu(default_l10n.format_value)
     await bot.set_my_commands(default_menu)
 
@@ -6,8 +6,8 @@ from aiogram.dispatcher.middlewares.manager import MiddlewareManager
 from aiogram.types import CallbackQuery, Message
 from fluent.runtime import FluentLocalization
 
-from models import User
 from services.i18n_format import I18N_FORMAT_KEY
+from services.locale_cache import locale_cache
 
 logger = logging.getLogger('default')
 
@@ -42,9 +42,8 @@ class I18nMiddleware(BaseMiddleware):
             data: Dict[str, Any],
     ) -> Any:
         user_id = event.from_user.id
-        user = await User.get_or_none(id=user_id)
-        lang = user.language if user else self.default_lang
-        l10n = self.l10ns[lang]
+        lang = await locale_cache.get(user_id)
+        l10n = self.l10ns.get(lang) or self.l10ns[self.default_lang]
         data[I18N_FORMAT_KEY] = l10n.format_value
 
         return await handler(event, data)
\ No newline at end of file
@@ -3,3 +3,4 @@ from .phrase import *
 from .tts import *
 from .payments import *
 from .subscription import *
+from .llm import *
@@ -0,0 +1,14 @@
+from tortoise import fields, models
+
+
+class LlmResponse(models.Model):
+    """
+    Сохраненный ответ модели. key - SHA-256 (модель, шаблон запроса, нормализованный текст).
+    """
+    id = fields.IntField(pk=True)
+    key = fields.CharField(max_length=64, unique=True)
+    model = fields.CharField(max_length=100)
+    text = fields.TextField()
+    output = fields.TextField()
+    tokens = fields.IntField(default=0)
+    created_at = fields.DatetimeField(auto_now_add=True)
@@ -4,3 +4,15 @@ from tortoise import fields, models
 class MainPhoto(models.Model):
     id = fields.IntField(pk=True)
     tg_id = fields.CharField(max_length=255)
+
+
+class GeneratedImage(models.Model):
+    """
+    Сгенерированное изображение. key - SHA-256 (стиль, размер, нормализованный запрос).
+    """
+    id = fields.IntField(pk=True)
+    key = fields.CharField(max_length=64, unique=True)
+    prompt = fields.TextField()
+    image_digest = fields.CharField(max_length=64, index=True)
+    tg_id = fields.CharField(max_length=255, null=True)
+    created_at = fields.DatetimeField(auto_now_add=True)
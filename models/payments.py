@@ -17,3 +17,22 @@ class Payment(models.Model):
 
     class Meta:
         table = "payments"
+
+
+class PaymentEvent(models.Model):
+    """
+    Уведомление о платеже, принятое вебхуком. Применяется фоновым обработчиком ровно один раз.
+    """
+    id = fields.IntField(pk=True)
+    payment_id = fields.CharField(max_length=100, unique=True)
+    data = fields.JSONField()
+    status = fields.CharField(max_length=20, default='pending', index=True)
+    attempts = fields.IntField(default=0)
+    error = fields.TextField(null=True)
+    created_at = fields.DatetimeField(auto_now_add=True)
+    processed_at = fields.DatetimeField(null=True)
+    # Не раньше этого времени событие берется снова после ошибки
+    next_attempt_at = fields.DatetimeField(null=True)
+
+    class Meta:
+        table = "payment_events"
@@ -17,7 +17,8 @@ class Category(models.Model):
 class AudioFile(models.Model):
     id = fields.IntField(pk=True)
     tg_id = fields.CharField(max_length=255, null=True)
-    audio = fields.BinaryField()
+    # SHA-256 записи в services.blob_store
+    audio_digest = fields.CharField(max_length=64, null=True, index=True)
 
 
 class UserAnswer(models.Model):
@@ -40,6 +41,9 @@ class ReviewStatus(models.Model):
     note = fields.BooleanField(default=False)
     date_start = fields.DatetimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = (('user', 'next_review'), ('user', 'phrase'))
+
     def __str__(self):
         return (f"ReviewStatus for {self.user.id} phrase {self.phrase}, "
                 f"{self.next_review}, review_count: {self.review_count}, note: {self.note}")
@@ -58,7 +62,7 @@ class Phrase(models.Model):
     group = fields.ForeignKeyField('models.UserGroup', related_name='phrases', null=True)
     teacher = fields.ForeignKeyField('models.Teacher', related_name='phrases', null=True)
 
-    plot_image = fields.BinaryField(null=True)
+    plot_image_digest = fields.CharField(max_length=64, null=True, index=True)
     image_id = fields.CharField(max_length=255, null=True)
     comment = fields.TextField(null=True)
 
@@ -66,6 +70,7 @@ class Phrase(models.Model):
 
     class Meta:
         unique_together = ('text_phrase', 'user')
+        indexes = (('user', 'category'),)
 
     def __str__(self):
         return f"{self.text_phrase[:200]}..."
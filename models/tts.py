@@ -2,9 +2,21 @@ from tortoise import fields, models
 
 
 class TextToSpeech(models.Model):
+    """
+    Озвученная фраза. Поиск - по digest (SHA-256 голоса, настроек и текста), для отправки
+    достаточно voice_id; ссылка на саму запись лежит отдельно в TextToSpeechAudio.
+    """
     id = fields.IntField(pk=True)
+    digest = fields.CharField(max_length=64, unique=True)
     voice_id = fields.CharField(max_length=255)
     user_id = fields.IntField()
-    text = fields.CharField(max_length=1024, unique=True)
-    voice = fields.BinaryField()
+    text = fields.CharField(max_length=1024)
     created_at = fields.DatetimeField(auto_now_add=True)
+    last_used_at = fields.DatetimeField(auto_now_add=True, index=True)
+
+
+class TextToSpeechAudio(models.Model):
+    id = fields.IntField(pk=True)
+    tts = fields.OneToOneField('models.TextToSpeech', related_name='audio', on_delete=fields.CASCADE)
+    # SHA-256 записи в services.blob_store
+    voice_digest = fields.CharField(max_length=64, index=True)
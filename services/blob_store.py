@@ -0,0 +1,180 @@
+"""
+Хранилище двоичных данных (аудио, картинки) вне строк Postgres.
+
+Данные адресуются SHA-256 содержимого, модели хранят только digest. Локальная реализация
+раскладывает файлы по каталогам ab/cd/<digest>, а для отправки в Telegram отдает
+FSInputFile, который читается с диска потоково.
+
+Перенос уже сохраненных в базе данных:
+    psql "$DB_URL" -f db/migrations/001_blob_store_prepare.sql
+    python -m services.blob_store
+    psql "$DB_URL" -f db/migrations/002_blob_store_cleanup.sql
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+from pathlib import Path
+from typing import Optional, Protocol
+
+from aiogram.types import FSInputFile
+from dotenv import load_dotenv
+from tortoise import Tortoise
+from tortoise.transactions import in_transaction
+
+from db.config import init_db
+from models import AudioFile, Phrase, TextToSpeechAudio
+from models.main import GeneratedImage
+
+load_dotenv()
+logger = logging.getLogger('default')
+
+BLOB_STORE_DIR = Path(os.getenv('BLOB_STORE_DIR', 'blobs'))
+MIGRATION_BATCH_SIZE = 100
+
+
+class BlobStore(Protocol):
+    async def put(self, data: bytes) -> str:
+        """Сохраняет данные и возвращает их digest."""
+        ...
+
+    async def get(self, digest: str) -> Optional[bytes]:
+        ...
+
+    def input_file(self, digest: str, filename: str) -> Optional[FSInputFile]:
+        """Файл для отправки в Telegram без загрузки в память целиком; None, если его нет."""
+        ...
+
+    async def delete(self, digest: str) -> None:
+        ...
+
+
+def blob_digest(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+class LocalBlobStore:
+    def __init__(self, root: Path = BLOB_STORE_DIR):
+        self.root = root
+
+    def path(self, digest: str) -> Path:
+        return self.root / digest[:2] / digest[2:4] / digest
+
+    def _write(self, digest: str, data: bytes) -> None:
+        path = self.path(digest)
+        if path.exists():
+            return
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Пишем во временный файл и переименовываем, чтобы читатель не увидел недописанный
+        tmp_path = path.with_name(f'{digest}.{os.getpid()}.tmp')
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def _read(self, digest: str) -> Optional[bytes]:
+        try:
+            return self.path(digest).read_bytes()
+        except FileNotFoundError:
+            return None
+
+    async def put(self, data: bytes) -> str:
+        digest = blob_digest(data)
+        await asyncio.to_thread(self._write, digest, data)
+        return digest
+
+    async def get(self, digest: str) -> Optional[bytes]:
+        return await asyncio.to_thread(self._read, digest)
+
+    def input_file(self, digest: str, filename: str) -> Optional[FSInputFile]:
+        path = self.path(digest)
+        return FSInputFile(path, filename=filename) if path.exists() else None
+
+    async def delete(self, digest: str) -> None:
+        await asyncio.to_thread(self.path(digest).unlink, missing_ok=True)
+
+
+blob_store: BlobStore = LocalBlobStore()
+
+
+async def is_referenced(digest: str) -> bool:
+    """
+    Проверяет, ссылается ли на blob хоть одна запись: одинаковое содержимое хранится один раз.
+    """
+    return (await AudioFile.filter(audio_digest=digest).exists()
+            or await TextToSpeechAudio.filter(voice_digest=digest).exists()
+            or await Phrase.filter(plot_image_digest=digest).exists()
+            or await GeneratedImage.filter(image_digest=digest).exists())
+
+
+async def release(digests: list[str]) -> int:
+    """
+    Удаляет blob'ы, на которые больше никто не ссылается.
+
+    :return: Количество удаленных файлов.
+    """
+    released = 0
+    for digest in set(digests):
+        if digest and not await is_referenced(digest):
+            await blob_store.delete(digest)
+            released += 1
+    return released
+
+
+# Таблица, первичный ключ, старая колонка с данными, новая колонка с digest
+MIGRATIONS = (
+    ('audiofile', 'id', 'audio', 'audio_digest'),
+    ('texttospeechaudio', 'id', 'voice', 'voice_digest'),
+    ('phrase', 'id', 'plot_image', 'plot_image_digest'),
+)
+
+
+async def migrate_table(table: str, pk: str, blob_column: str, digest_column: str,
+                        batch_size: int = MIGRATION_BATCH_SIZE) -> int:
+    """
+    Переносит данные из колонки blob_column в хранилище пачками и записывает digest.
+    Колонка digest_column должна быть уже добавлена (db/migrations/001_blob_store_prepare.sql),
+    старую колонку после переноса удаляет db/migrations/002_blob_store_cleanup.sql.
+
+    :return: Количество перенесенных строк.
+    """
+    connection = Tortoise.get_connection('default')
+    _, columns = await connection.execute_query(
+        'SELECT 1 FROM information_schema.columns WHERE table_name = $1 AND column_name = $2',
+        [table, blob_column],
+    )
+    if not columns:
+        # Колонка уже удалена или таблица создана сразу в новом виде
+        return 0
+    moved = 0
+    while True:
+        _, rows = await connection.execute_query(
+            f'SELECT {pk}, {blob_column} FROM {table} '
+            f'WHERE {blob_column} IS NOT NULL AND {digest_column} IS NULL ORDER BY {pk} LIMIT $1',
+            [batch_size],
+        )
+        if not rows:
+            return moved
+        updates = [(row[pk], await blob_store.put(bytes(row[blob_column]))) for row in rows]
+        async with in_transaction() as tx:
+            for row_id, digest in updates:
+                await tx.execute_query(
+                    f'UPDATE {table} SET {digest_column} = $1 WHERE {pk} = $2',
+                    [digest, row_id],
+                )
+        moved += len(updates)
+        logger.info(f'{table}: moved {moved} blobs')
+
+
+async def _migrate():
+    await init_db()
+    try:
+        for table, pk, blob_column, digest_column in MIGRATIONS:
+            moved = await migrate_table(table, pk, blob_column, digest_column)
+            print(f'{table:<18} moved={moved}')
+    finally:
+        await Tortoise.close_connections()
+
+
+if __name__ == '__main__':
+    asyncio.run(_migrate())
@@ -0,0 +1,71 @@
+"""
+Отрисовка графиков вне event loop.
+
+Фигуры строятся объектным API matplotlib (Agg, без глобального состояния pyplot)
+в пуле процессов и возвращаются как PNG в памяти. Процессы запускаются через spawn:
+к моменту первого графика в боте уже работают потоки и открыты соединения, fork их бы
+скопировал. Пул создается при запуске бота (start) и пересоздается, если его процесс погиб.
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import date
+from typing import Optional
+
+import numpy as np
+
+from external_services.visualizer import minmax_envelope, render_progress_histogram, render_waveform
+
+logger = logging.getLogger('default')
+
+CHART_WORKERS = int(os.getenv('CHART_WORKERS', '2'))
+
+
+class ChartRenderer:
+    def __init__(self, workers: int = CHART_WORKERS):
+        self.workers = workers
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def start(self) -> None:
+        self._ensure_executor()
+
+    def _ensure_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                 mp_context=multiprocessing.get_context('spawn'))
+        return self._executor
+
+    async def _render(self, func, *args) -> bytes:
+        loop = asyncio.get_running_loop()
+        executor = self._ensure_executor()
+        try:
+            return await loop.run_in_executor(executor, func, *args)
+        except BrokenProcessPool as e:
+            # Процесс пула убит (например, OOM killer): без нового пула не отрисуется ни один график
+            logger.error(f'Пул отрисовки графиков сломан, создаем заново: {e}')
+            if self._executor is executor:
+                executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+            return await loop.run_in_executor(self._ensure_executor(), func, *args)
+
+    async def waveform(self, original: np.ndarray, spoken: np.ndarray) -> bytes:
+        """
+        PNG с волнами оригинальной и произнесенной записи. Сигналы прореживаются до огибающей
+        до передачи в пул, чтобы не пересылать сотни тысяч отсчетов.
+        """
+        return await self._render(render_waveform, minmax_envelope(original), minmax_envelope(spoken))
+
+    async def progress_histogram(self, dates: list[date], scores: list[int], days: int) -> bytes:
+        return await self._render(render_progress_histogram, dates, scores, days)
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+chart_renderer = ChartRenderer()
@@ -5,6 +5,7 @@ from datetime import datetime, timedelta
 from dotenv import load_dotenv
 
 from models import User, TypeSubscription, Subscription
+from services.locale_cache import locale_cache
 from services.services import notify_admins
 
 logger = logging.getLogger('default')
@@ -105,6 +106,7 @@ async def update_or_create_user(message):
                 language='ru' if location == 'ja-JP' else 'en'
             )
             await user.save()
+            await locale_cache.invalidate(user_id)
 
             # Создание пробной подписки
             type_subscription = await TypeSubscription.get(name='Free trial')
@@ -128,6 +130,7 @@ async def update_or_create_user(message):
             user.last_name = message.from_user.last_name
             user.user_status = 'active'
             await user.save()
+            await locale_cache.set(user_id, user.language)
 
             logger.debug(f"Пользователь {user.username} обновлён.")
         except Exception as e:
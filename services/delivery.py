@@ -0,0 +1,233 @@
+"""
+Очередь исходящих сообщений для массовых рассылок.
+
+Особенности:
+- общий и поканальный (на каждый чат) лимит скорости через token bucket
+- повтор после TelegramRetryAfter и при сетевых ошибках с экспоненциальной задержкой
+- пользователи, заблокировавшие бота, помечаются user_status='blocked' (администраторы - нет)
+- срочные одиночные сообщения (priority=True) обгоняют накопившуюся массовую рассылку
+- счетчики отправленных/неудачных сообщений и пропускной способности
+"""
+
+import asyncio
+import itertools
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Any, Optional
+
+from aiogram import Bot
+from aiogram.exceptions import (
+    TelegramForbiddenError,
+    TelegramNetworkError,
+    TelegramRetryAfter,
+    TelegramServerError,
+)
+from dotenv import load_dotenv
+
+from bot_init import bot
+from models import User
+
+load_dotenv()
+logger = logging.getLogger('default')
+
+# Telegram допускает около 30 сообщений в секунду суммарно и 1 сообщение в секунду в один чат
+GLOBAL_RATE = float(os.getenv('DELIVERY_GLOBAL_RATE', '25'))
+PER_CHAT_RATE = float(os.getenv('DELIVERY_PER_CHAT_RATE', '1'))
+WORKERS = int(os.getenv('DELIVERY_WORKERS', '10'))
+MAX_RETRIES = 3
+# Сколько поканальных ведер держим в памяти, прежде чем чистить неактивные
+MAX_CHAT_BUCKETS = 10000
+# Ошибка отправки в чат администратора не означает, что пользователь заблокировал бота
+ADMIN_IDS = frozenset(admin_id.strip() for admin_id in os.getenv('ADMIN_IDS', '').split(',') if admin_id.strip())
+PRIORITY_HIGH = 0
+PRIORITY_BULK = 1
+
+
+class TokenBucket:
+    """
+    Ведро токенов: rate токенов в секунду, не больше capacity за раз.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def pause(self, seconds: float) -> None:
+        """Опустошает ведро так, чтобы следующий токен появился через seconds."""
+        self._refill()
+        self.tokens = -seconds * self.rate
+
+
+@dataclass
+class OutgoingMessage:
+    chat_id: int | str
+    text: str
+    kwargs: dict[str, Any] = field(default_factory=dict)
+    future: Optional[asyncio.Future] = field(default=None, repr=False)
+
+
+@dataclass
+class DeliveryStats:
+    queued: int = 0
+    sent: int = 0
+    failed: int = 0
+    blocked: int = 0
+    retried: int = 0
+    started_at: float = field(default_factory=time.monotonic)
+
+    @property
+    def throughput(self) -> float:
+        """Отправлено сообщений в секунду с момента запуска."""
+        elapsed = time.monotonic() - self.started_at
+        return self.sent / elapsed if elapsed > 0 else 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            'queued': self.queued,
+            'sent': self.sent,
+            'failed': self.failed,
+            'blocked': self.blocked,
+            'retried': self.retried,
+            'throughput': round(self.throughput, 2),
+        }
+
+
+class DeliveryService:
+    def __init__(self, bot: Bot, global_rate: float = GLOBAL_RATE, per_chat_rate: float = PER_CHAT_RATE,
+                 workers: int = WORKERS, max_retries: int = MAX_RETRIES):
+        self.bot = bot
+        self.global_bucket = TokenBucket(global_rate)
+        self.per_chat_rate = per_chat_rate
+        self.chat_buckets: dict[int | str, TokenBucket] = {}
+        self.workers_count = workers
+        self.max_retries = max_retries
+        self.stats = DeliveryStats()
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._workers: list[asyncio.Task] = []
+        # Порядок внутри одного приоритета - порядок постановки в очередь
+        self._sequence = itertools.count()
+
+    def _ensure_workers(self) -> None:
+        if self._workers:
+            return
+        self._queue = asyncio.PriorityQueue()
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.workers_count)]
+
+    async def stop(self) -> None:
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def submit(self, chat_id: int | str, text: str, priority: bool = False, **kwargs) -> asyncio.Future:
+        """
+        Ставит сообщение в очередь.
+
+        :param priority: Отправить раньше массовой рассылки (сообщения, которых ждет обработчик).
+        :return: Future, который завершится True, если сообщение доставлено, иначе False.
+        """
+        self._ensure_workers()
+        message = OutgoingMessage(chat_id, text, kwargs, asyncio.get_running_loop().create_future())
+        self._queue.put_nowait((PRIORITY_HIGH if priority else PRIORITY_BULK, next(self._sequence), message))
+        self.stats.queued += 1
+        return message.future
+
+    async def send(self, chat_id: int | str, text: str, priority: bool = False, **kwargs) -> bool:
+        return await self.submit(chat_id, text, priority=priority, **kwargs)
+
+    async def send_many(self, messages: list[OutgoingMessage], priority: bool = False) -> list[bool]:
+        futures = [self.submit(message.chat_id, message.text, priority=priority, **message.kwargs)
+                   for message in messages]
+        return list(await asyncio.gather(*futures))
+
+    def _chat_bucket(self, chat_id: int | str) -> TokenBucket:
+        bucket = self.chat_buckets.get(chat_id)
+        if bucket is None:
+            if len(self.chat_buckets) >= MAX_CHAT_BUCKETS:
+                self._prune_chat_buckets()
+            bucket = self.chat_buckets[chat_id] = TokenBucket(self.per_chat_rate, 1)
+        return bucket
+
+    def _prune_chat_buckets(self) -> None:
+        # Ведро, которое успело наполниться, ничем не отличается от нового
+        now = time.monotonic()
+        self.chat_buckets = {
+            chat_id: bucket for chat_id, bucket in self.chat_buckets.items()
+            if (now - bucket.updated_at) * bucket.rate < bucket.capacity
+        }
+
+    async def _worker(self) -> None:
+        while True:
+            _, _, message = await self._queue.get()
+            try:
+                result = await self._deliver(message)
+            except Exception as e:
+                logger.error(f"Ошибка доставки сообщения в чат {message.chat_id}: {e}")
+                result = False
+            finally:
+                self._queue.task_done()
+            if not message.future.done():
+                message.future.set_result(result)
+
+    async def _deliver(self, message: OutgoingMessage) -> bool:
+        for attempt in range(self.max_retries + 1):
+            await self.global_bucket.acquire()
+            await self._chat_bucket(message.chat_id).acquire()
+            try:
+                await self.bot.send_message(chat_id=message.chat_id, text=message.text, **message.kwargs)
+            except TelegramRetryAfter as e:
+                # Флуд-контроль действует на весь бот, поэтому притормаживаем всю очередь
+                logger.warning(f"Flood control, повтор через {e.retry_after} с")
+                self.stats.retried += 1
+                self.global_bucket.pause(e.retry_after)
+            except TelegramForbiddenError:
+                self.stats.blocked += 1
+                if str(message.chat_id) not in ADMIN_IDS:
+                    await mark_blocked(message.chat_id)
+                return False
+            except (TelegramNetworkError, TelegramServerError) as e:
+                logger.warning(f"Ошибка сети при отправке в чат {message.chat_id}: {e}")
+                self.stats.retried += 1
+                await asyncio.sleep(2 ** attempt)
+            except Exception as e:
+                logger.error(f"Не удалось отправить сообщение в чат {message.chat_id}: {e}")
+                self.stats.failed += 1
+                return False
+            else:
+                self.stats.sent += 1
+                return True
+
+        self.stats.failed += 1
+        return False
+
+
+async def mark_blocked(chat_id: int | str) -> None:
+    """
+    Помечает пользователя, заблокировавшего бота.
+    """
+    try:
+        await User.filter(id=int(chat_id)).update(user_status='blocked')
+    except Exception as e:
+        logger.error(f"Не удалось обновить статус пользователя {chat_id}: {e}")
+
+
+delivery = DeliveryService(bot)
@@ -0,0 +1,270 @@
+"""
+Хранилище FSM и диалогов aiogram_dialog в Redis с индексом интентов.
+
+aiogram_dialog хранит стек диалогов (destiny aiogram_dialog_stack:<id>) и контекст каждого
+интента (destiny aiogram_dialog_context:<intent_id>) как обычные данные FSM. При записи стека
+хранилище дополнительно запоминает:
+- dialog_intent:<intent_id> -> ключ стека, чтобы по ошибке "Context not found for intent id"
+  удалить сломанный стек одним GET без обхода всех ключей;
+- dialog_stacks (zset: ключ стека -> время записи) и dialog_stack_contexts (hash: ключ стека ->
+  ключи контекстов его интентов) для фоновой чистки стеков, чьи контексты пропали.
+
+Данные сериализуются в msgpack и живут DIALOG_DATA_TTL секунд. Длинные строки и bytes
+(больше BLOB_INLINE_LIMIT) выносятся в отдельные ключи dialog_blob:<sha256>, а в данных
+остается ссылка, поэтому они не переписываются при каждом переходе между окнами.
+Записи больше DATA_SIZE_WARNING попадают в лог.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field, replace
+from typing import Any, Mapping, Optional
+
+import msgpack
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.fsm.storage.redis import RedisStorage
+from dotenv import load_dotenv
+
+load_dotenv()
+logger = logging.getLogger('default')
+
+DIALOG_STATE_TTL = int(os.getenv('DIALOG_STATE_TTL', str(14 * 24 * 60 * 60)))
+DIALOG_DATA_TTL = int(os.getenv('DIALOG_DATA_TTL', str(14 * 24 * 60 * 60)))
+BLOB_INLINE_LIMIT = 4 * 1024
+DATA_SIZE_WARNING = 32 * 1024
+BLOB_PREFIX = 'dialog_blob:'
+BLOB_MARKER = '__dialog_blob__'
+
+STACK_DESTINY = 'aiogram_dialog_stack:'
+CONTEXT_DESTINY = 'aiogram_dialog_context:'
+INTENT_INDEX_PREFIX = 'dialog_intent:'
+STACKS_KEY = 'dialog_stacks'
+STACK_CONTEXTS_KEY = 'dialog_stack_contexts'
+INTENT_INDEX_TTL = 30 * 24 * 60 * 60
+# Стек, записанный недавно, может еще ждать записи своих контекстов
+SWEEP_GRACE = 10 * 60
+SWEEP_BATCH_SIZE = 500
+
+
+def _is_blob_ref(value: Any) -> bool:
+    return isinstance(value, dict) and len(value) == 1 and BLOB_MARKER in value
+
+
+@dataclass
+class StateGroupUsage:
+    keys: int = 0
+    bytes: int = 0
+
+
+@dataclass
+class DialogStorageReport:
+    groups: dict[str, StateGroupUsage] = field(default_factory=lambda: defaultdict(StateGroupUsage))
+    blobs: int = 0
+    blob_bytes: int = 0
+
+    def as_text(self) -> str:
+        lines = [f'{group}: {usage.keys} keys, {usage.bytes} B'
+                 for group, usage in sorted(self.groups.items(), key=lambda item: -item[1].bytes)]
+        lines.append(f'blobs: {self.blobs} keys, {self.blob_bytes} B')
+        return '\n'.join(lines)
+
+
+class IndexedRedisStorage(RedisStorage):
+    def __init__(self, *args, state_ttl: Optional[int] = DIALOG_STATE_TTL, data_ttl: Optional[int] = DIALOG_DATA_TTL,
+                 **kwargs):
+        super().__init__(*args, state_ttl=state_ttl, data_ttl=data_ttl, **kwargs)
+
+    def _data_key(self, key: StorageKey) -> str:
+        return self.key_builder.build(key, 'data')
+
+    # --- Сериализация -------------------------------------------------------
+
+    def _extract_blobs(self, value: Any, blobs: dict[str, Any]) -> Any:
+        if isinstance(value, (str, bytes)) and len(value) > BLOB_INLINE_LIMIT:
+            raw = value.encode() if isinstance(value, str) else value
+            digest = hashlib.sha256(raw).hexdigest()
+            blobs[digest] = value
+            return {BLOB_MARKER: digest}
+        if isinstance(value, dict):
+            return {k: self._extract_blobs(v, blobs) for k, v in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [self._extract_blobs(v, blobs) for v in value]
+        return value
+
+    def _collect_refs(self, value: Any, refs: set[str]) -> None:
+        if _is_blob_ref(value):
+            refs.add(value[BLOB_MARKER])
+        elif isinstance(value, dict):
+            for v in value.values():
+                self._collect_refs(v, refs)
+        elif isinstance(value, list):
+            for v in value:
+                self._collect_refs(v, refs)
+
+    def _resolve_refs(self, value: Any, blobs: dict[str, Any]) -> Any:
+        if _is_blob_ref(value):
+            return blobs.get(value[BLOB_MARKER])
+        if isinstance(value, dict):
+            return {k: self._resolve_refs(v, blobs) for k, v in value.items()}
+        if isinstance(value, list):
+            return [self._resolve_refs(v, blobs) for v in value]
+        return value
+
+    @staticmethod
+    def decode(raw: bytes) -> dict[str, Any]:
+        try:
+            return msgpack.unpackb(raw, raw=False, strict_map_key=False)
+        except (ValueError, msgpack.UnpackException):
+            # Запись, сохраненная в JSON до перехода на msgpack
+            return json.loads(raw)
+
+    async def get_data(self, key: StorageKey) -> dict[str, Any]:
+        raw = await self.redis.get(self._data_key(key))
+        if raw is None:
+            return {}
+        data = self.decode(raw)
+        refs = set()
+        self._collect_refs(data, refs)
+        if not refs:
+            return data
+        refs = list(refs)
+        values = await self.redis.mget([BLOB_PREFIX + digest for digest in refs])
+        blobs = {}
+        for digest, packed in zip(refs, values):
+            if packed is None:
+                logger.warning(f"Вынесенное значение {digest} из {key.destiny} истекло")
+            else:
+                blobs[digest] = msgpack.unpackb(packed, raw=False)
+        return self._resolve_refs(data, blobs)
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        redis_key = self._data_key(key)
+        if not data:
+            await self.redis.delete(redis_key)
+        else:
+            blobs = {}
+            packed = msgpack.packb(self._extract_blobs(dict(data), blobs), use_bin_type=True)
+            if len(packed) > DATA_SIZE_WARNING:
+                logger.warning(f"Данные диалога {key.destiny} (состояние {data.get('state')}) "
+                               f"занимают {len(packed)} байт")
+            # Уже сохраненные значения не отправляем повторно, только продлеваем им срок жизни
+            digests = list(blobs)
+            stored = await self.redis.exists(*[BLOB_PREFIX + d for d in digests]) if digests else 0
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for digest in digests:
+                    if stored == len(digests):
+                        pipe.expire(BLOB_PREFIX + digest, self.data_ttl)
+                    else:
+                        pipe.set(BLOB_PREFIX + digest, msgpack.packb(blobs[digest], use_bin_type=True),
+                                 ex=self.data_ttl)
+                pipe.set(redis_key, packed, ex=self.data_ttl)
+                await pipe.execute()
+        destiny = key.destiny or ''
+        try:
+            if destiny.startswith(STACK_DESTINY):
+                await self._index_stack(key, data)
+            elif destiny.startswith(CONTEXT_DESTINY) and not data:
+                await self.redis.delete(INTENT_INDEX_PREFIX + destiny[len(CONTEXT_DESTINY):])
+        except Exception as e:
+            # Индекс вспомогательный, его ошибка не должна ломать диалог
+            logger.error(f"Ошибка обновления индекса интентов: {e}")
+
+    async def _index_stack(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        stack_key = self._data_key(key)
+        async with self.redis.pipeline(transaction=False) as pipe:
+            if not data:
+                pipe.zrem(STACKS_KEY, stack_key)
+                pipe.hdel(STACK_CONTEXTS_KEY, stack_key)
+            else:
+                intents = data.get('intents') or []
+                context_keys = [self._data_key(replace(key, destiny=CONTEXT_DESTINY + intent_id))
+                                for intent_id in intents]
+                for intent_id in intents:
+                    pipe.set(INTENT_INDEX_PREFIX + intent_id, stack_key, ex=INTENT_INDEX_TTL)
+                pipe.zadd(STACKS_KEY, {stack_key: time.time()})
+                pipe.hset(STACK_CONTEXTS_KEY, stack_key, ' '.join(context_keys))
+            await pipe.execute()
+
+    async def _drop_stack(self, stack_key: str) -> None:
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.delete(stack_key)
+            pipe.zrem(STACKS_KEY, stack_key)
+            pipe.hdel(STACK_CONTEXTS_KEY, stack_key)
+            await pipe.execute()
+
+    async def drop_intent(self, intent_id: str) -> Optional[str]:
+        """
+        Удаляет стек, в котором находится интент.
+
+        :return: Ключ удаленного стека или None, если интент не найден в индексе.
+        """
+        stack_key = await self.redis.get(INTENT_INDEX_PREFIX + intent_id)
+        if stack_key is None:
+            return None
+        stack_key = stack_key.decode()
+        await self._drop_stack(stack_key)
+        await self.redis.delete(INTENT_INDEX_PREFIX + intent_id)
+        return stack_key
+
+    async def sweep_orphaned_stacks(self, grace: float = SWEEP_GRACE, batch_size: int = SWEEP_BATCH_SIZE) -> int:
+        """
+        Удаляет стеки, у которых пропал контекст хотя бы одного интента, и забывает удаленные стеки.
+
+        :return: Количество удаленных стеков.
+        """
+        dropped = 0
+        offset = 0
+        while True:
+            stack_keys = await self.redis.zrangebyscore(STACKS_KEY, '-inf', time.time() - grace,
+                                                        start=offset, num=batch_size)
+            if not stack_keys:
+                return dropped
+            contexts = await self.redis.hmget(STACK_CONTEXTS_KEY, stack_keys)
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for stack_key, context_keys in zip(stack_keys, contexts):
+                    pipe.exists(stack_key, *(context_keys.split() if context_keys else []))
+                existing = await pipe.execute()
+            kept = 0
+            for stack_key, context_keys, count in zip(stack_keys, contexts, existing):
+                expected = 1 + len(context_keys.split()) if context_keys else 1
+                if count == expected:
+                    kept += 1
+                    continue
+                await self._drop_stack(stack_key.decode())
+                dropped += 1
+            offset += kept
+
+    async def report(self, batch_size: int = SWEEP_BATCH_SIZE) -> DialogStorageReport:
+        """
+        Количество и размер контекстов диалогов по группам состояний, а также вынесенных значений.
+        Обходит только ключи из индекса стеков.
+        """
+        report = DialogStorageReport()
+        refs = set()
+        cursor = 0
+        while True:
+            cursor, stack_contexts = await self.redis.hscan(STACK_CONTEXTS_KEY, cursor, count=batch_size)
+            context_keys = [context_key for keys in stack_contexts.values() for context_key in keys.split()]
+            values = await self.redis.mget(context_keys) if context_keys else []
+            for raw in values:
+                if raw is None:
+                    continue
+                data = self.decode(raw)
+                group = str(data.get('state') or 'unknown').split(':')[0]
+                report.groups[group].keys += 1
+                report.groups[group].bytes += len(raw)
+                self._collect_refs(data, refs)
+            if cursor == 0:
+                break
+        if refs:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for digest in refs:
+                    pipe.strlen(BLOB_PREFIX + digest)
+                sizes = await pipe.execute()
+            report.blobs = sum(1 for size in sizes if size)
+            report.blob_bytes = sum(sizes)
+        return report
@@ -0,0 +1,315 @@
+"""
+Права пользователя на упражнения: тариф подписки и дневной счетчик.
+
+Тариф кэшируется в памяти процесса и в Redis и сбрасывается при изменении подписки.
+Дневные счетчики живут в хэше Redis и увеличиваются атомарно (HINCRBY),
+в базу они переносятся по расписанию (только изменившиеся, по множеству day_counters:dirty)
+и перед ночным обнулением. Перенос и ночное обнуление не пересекаются: оба держат блокировку
+в Redis на все время чтения и записи, иначе перенос мог бы вернуть в базу вчерашние значения.
+Если ночной перенос в базе не удался (или процесс упал посреди него), отложенные счетчики
+возвращаются в текущий день, и следующий перенос засчитает их вместе с новыми.
+"""
+
+import logging
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+
+from cachetools import TTLCache
+from redis.asyncio import Redis
+from redis.exceptions import ResponseError
+from tortoise.expressions import F
+
+from models import Subscription, User
+
+logger = logging.getLogger('default')
+
+FREE_TIER = 'Free'
+# Бесплатный тариф допускает упражнение, пока счетчик до увеличения не больше лимита
+FREE_DAILY_LIMIT = 50
+TIER_TTL = 60 * 60
+MAX_LOCAL_ENTRIES = 50000
+FLUSH_BATCH_SIZE = 1000
+
+COUNTERS_KEY = 'day_counters'
+ROLLOVER_KEY = 'day_counters:rollover'
+DIRTY_KEY = 'day_counters:dirty'
+LOCK_KEY = 'day_counters:lock'
+# Блокировка снимается сама, если процесс упал, не отпустив ее
+LOCK_TIMEOUT = 10 * 60
+ROLLOVER_LOCK_WAIT = 60
+# Служебное поле хэша: если оно есть, счетчики уже обнулялись и пустое значение означает 0,
+# иначе (первый запуск или потеря данных Redis) счетчик берется из базы
+ROLLED_MARKER = '__rolled__'
+
+
+class EntitlementService:
+    def __init__(self, daily_limit: int = FREE_DAILY_LIMIT, tier_ttl: int = TIER_TTL):
+        self.daily_limit = daily_limit
+        self.tier_ttl = tier_ttl
+        self.tiers = TTLCache(maxsize=MAX_LOCAL_ENTRIES, ttl=tier_ttl)
+        self.redis: Optional[Redis] = None
+
+    @staticmethod
+    def _tier_key(user_id: int) -> str:
+        return f'tier:{user_id}'
+
+    async def get_tier(self, user_id: int) -> str:
+        """
+        Возвращает название тарифа подписки пользователя.
+        """
+        tier = self.tiers.get(user_id)
+        if tier is not None:
+            return tier
+
+        if self.redis is not None:
+            try:
+                value = await self.redis.get(self._tier_key(user_id))
+            except Exception as e:
+                logger.error(f"Ошибка чтения тарифа пользователя {user_id} из Redis: {e}")
+                value = None
+            if value is not None:
+                tier = value.decode() if isinstance(value, bytes) else value
+                self.tiers[user_id] = tier
+                return tier
+
+        tier = await Subscription.filter(user_id=user_id).first().values_list('type_subscription__name', flat=True)
+        tier = tier or FREE_TIER
+        self.tiers[user_id] = tier
+        if self.redis is not None:
+            try:
+                await self.redis.set(self._tier_key(user_id), tier, ex=self.tier_ttl)
+            except Exception as e:
+                logger.error(f"Ошибка записи тарифа пользователя {user_id} в Redis: {e}")
+        return tier
+
+    async def invalidate_tier(self, user_id: int) -> None:
+        """
+        Вызывается после любого изменения типа подписки пользователя.
+        """
+        self.tiers.pop(user_id, None)
+        if self.redis is not None:
+            try:
+                await self.redis.delete(self._tier_key(user_id))
+            except Exception as e:
+                logger.error(f"Ошибка удаления тарифа пользователя {user_id} из Redis: {e}")
+
+    async def _seed_counter(self, user_id: int) -> None:
+        # Один лишний запрос к базе на пользователя, только пока счетчики ни разу не обнулялись
+        exists, rolled = await self.redis.hmget(COUNTERS_KEY, [str(user_id), ROLLED_MARKER])
+        if exists is not None or rolled is not None:
+            return
+        day_counter = await User.filter(id=user_id).first().values_list('day_counter', flat=True)
+        await self.redis.hsetnx(COUNTERS_KEY, str(user_id), day_counter or 0)
+
+    async def increment(self, user_id: int, amount: int = 1) -> int:
+        """
+        Увеличивает дневной счетчик пользователя.
+
+        :return: Новое значение счетчика.
+        """
+        if self.redis is None:
+            await User.filter(id=user_id).update(day_counter=F('day_counter') + amount)
+            return await User.filter(id=user_id).first().values_list('day_counter', flat=True) or 0
+        await self._seed_counter(user_id)
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.hincrby(COUNTERS_KEY, str(user_id), amount)
+            pipe.sadd(DIRTY_KEY, user_id)
+            counter, _ = await pipe.execute()
+        return counter
+
+    async def consume(self, user_id: int) -> bool:
+        """
+        Проверяет дневной лимит и, если упражнение разрешено, засчитывает его.
+
+        :return: True, если упражнение разрешено.
+        """
+        tier = await self.get_tier(user_id)
+        counter = await self.increment(user_id)
+        if tier != FREE_TIER or counter - 1 <= self.daily_limit:
+            return True
+        # Лимит исчерпан: возвращаем счетчик, отказ не считается упражнением
+        await self.increment(user_id, -1)
+        return False
+
+    async def get_day_counter(self, user_id: int) -> int:
+        if self.redis is not None:
+            value = await self.redis.hget(COUNTERS_KEY, str(user_id))
+            if value is not None:
+                return int(value)
+            if await self.redis.hexists(COUNTERS_KEY, ROLLED_MARKER):
+                return 0
+        return await User.filter(id=user_id).first().values_list('day_counter', flat=True) or 0
+
+    @staticmethod
+    async def _save_counters(counters: dict) -> int:
+        users = [
+            User(id=int(user_id), day_counter=int(value))
+            for user_id, value in counters.items()
+            if value is not None and (user_id.decode() if isinstance(user_id, bytes) else user_id) != ROLLED_MARKER
+        ]
+        if users:
+            await User.bulk_update(users, fields=['day_counter'], batch_size=FLUSH_BATCH_SIZE)
+        return len(users)
+
+    async def _flush_key(self, key: str) -> int:
+        return await self._save_counters(await self.redis.hgetall(key))
+
+    async def _flush_dirty(self) -> int:
+        # Множество забирается атомарно: счетчик, измененный после этого, снова попадет в него
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.smembers(DIRTY_KEY)
+            pipe.delete(DIRTY_KEY)
+            user_ids, _ = await pipe.execute()
+        if not user_ids:
+            return 0
+        user_ids = list(user_ids)
+        try:
+            values = await self.redis.hmget(COUNTERS_KEY, user_ids)
+            return await self._save_counters(dict(zip(user_ids, values)))
+        except Exception:
+            await self.redis.sadd(DIRTY_KEY, *user_ids)
+            raise
+
+    async def _restore_rollover(self) -> int:
+        """
+        Возвращает отложенные счетчики в текущий день: перенос в UserProgress не состоялся,
+        и в базе остались значения, записанные start_rollover.
+        """
+        counters = await self.redis.hgetall(ROLLOVER_KEY)
+        users = {
+            user_id: int(value) for user_id, value in counters.items()
+            if (user_id.decode() if isinstance(user_id, bytes) else user_id) != ROLLED_MARKER
+        }
+        async with self.redis.pipeline(transaction=True) as pipe:
+            for user_id, value in users.items():
+                pipe.hincrby(COUNTERS_KEY, user_id, value)
+            if users:
+                pipe.sadd(DIRTY_KEY, *users)
+            pipe.delete(ROLLOVER_KEY)
+            await pipe.execute()
+        logger.warning(f'Day counters rollover did not finish, restored: {len(users)}')
+        return len(users)
+
+    async def flush_counters(self) -> int:
+        """
+        Переносит в таблицу user пачками счетчики, изменившиеся после прошлого переноса.
+
+        :return: Количество обновленных пользователей.
+        """
+        if self.redis is None:
+            return 0
+        lock = self.redis.lock(LOCK_KEY, timeout=LOCK_TIMEOUT, blocking=False)
+        if not await lock.acquire():
+            # Идет ночной перенос: новые счетчики запишутся после обнуления базы
+            return 0
+        try:
+            if await self.redis.exists(ROLLOVER_KEY):
+                # Блокировка свободна, значит перенос не идет, а упал, не успев вернуть счетчики
+                await self._restore_rollover()
+            flushed = await self._flush_dirty()
+        finally:
+            await lock.release()
+        logger.debug(f'Day counters flushed: {flushed}')
+        return flushed
+
+    @asynccontextmanager
+    async def rollover(self) -> AsyncIterator[None]:
+        """
+        Ночное обнуление: счетчики откладываются и записываются в базу, внутри блока база
+        переносит их в UserProgress и обнуляет. Перенос по расписанию на это время пропускается.
+        """
+        if self.redis is None:
+            yield
+            return
+        lock = self.redis.lock(LOCK_KEY, timeout=LOCK_TIMEOUT, blocking_timeout=ROLLOVER_LOCK_WAIT)
+        if not await lock.acquire():
+            raise TimeoutError('Не дождались окончания переноса дневных счетчиков')
+        try:
+            await self.start_rollover()
+            try:
+                yield
+            except BaseException:
+                # Транзакция в базе откатилась: счетчики не должны потеряться или уйти в другой день
+                await self._restore_rollover()
+                raise
+            await self.finish_rollover()
+        finally:
+            await lock.release()
+
+    async def start_rollover(self) -> None:
+        """
+        Атомарно откладывает текущие счетчики для ночного переноса и начинает новый день с нуля.
+        """
+        if self.redis is None:
+            return
+        # Остаток упавшего прошлого переноса возвращаем в текущий день до того, как RENAME его перезапишет
+        if await self.redis.exists(ROLLOVER_KEY):
+            await self._restore_rollover()
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.rename(COUNTERS_KEY, ROLLOVER_KEY)
+            pipe.hset(COUNTERS_KEY, ROLLED_MARKER, 1)
+            # Отложенные счетчики записываются целиком, отметки об изменениях больше не нужны
+            pipe.delete(DIRTY_KEY)
+            results = await pipe.execute(raise_on_error=False)
+        if isinstance(results[0], ResponseError):
+            # Хэша счетчиков еще не было — переносить нечего
+            logger.debug(f'Day counters rollover: {results[0]}')
+            return
+        await self._flush_key(ROLLOVER_KEY)
+
+    async def finish_rollover(self) -> None:
+        if self.redis is not None:
+            await self.redis.delete(ROLLOVER_KEY)
+
+
+entitlements = EntitlementService()
+
+
+async def _check_failed_rollover():
+    """
+    Проверяет, что неудавшийся ночной перенос не теряет счетчики и не оставляет отложенный хэш.
+    Нужны отдельные база (BENCHMARK_DB_URL) и Redis (BENCHMARK_REDIS_HOST): их данные удаляются.
+    """
+    import os
+
+    from tortoise import Tortoise
+
+    from db.config import init_benchmark_db
+
+    redis_host = os.getenv('BENCHMARK_REDIS_HOST')
+    if not redis_host or redis_host == os.getenv('REDIS_DSN'):
+        raise RuntimeError('Укажите в BENCHMARK_REDIS_HOST отдельный Redis для проверки')
+
+    await init_benchmark_db()
+    service = EntitlementService()
+    service.redis = Redis(host=redis_host)
+    try:
+        await service.redis.delete(COUNTERS_KEY, ROLLOVER_KEY, DIRTY_KEY, LOCK_KEY)
+        await User.filter(id__in=[1, 2]).delete()
+        await User.bulk_create([User(id=1, day_counter=0), User(id=2, day_counter=0)])
+        await service.redis.hset(COUNTERS_KEY, mapping={ROLLED_MARKER: 1, '1': 5, '2': 3})
+
+        try:
+            async with service.rollover():
+                # Счетчик, увеличенный во время переноса, относится уже к новому дню
+                await service.increment(1)
+                raise RuntimeError('перенос в базе не удался')
+        except RuntimeError:
+            pass
+
+        assert not await service.redis.exists(ROLLOVER_KEY), 'отложенный хэш остался после ошибки'
+        assert await service.get_day_counter(1) == 6, 'счетчик пользователя 1 потерян'
+        assert await service.get_day_counter(2) == 3, 'счетчик пользователя 2 потерян'
+        assert await service.flush_counters() == 2, 'восстановленные счетчики не попали в перенос'
+        assert await User.filter(id=1).first().values_list('day_counter', flat=True) == 6
+        print('failed rollover: ok')
+    finally:
+        await service.redis.delete(COUNTERS_KEY, ROLLOVER_KEY, DIRTY_KEY, LOCK_KEY)
+        await service.redis.aclose()
+        await Tortoise.close_connections()
+
+
+if __name__ == '__main__':
+    import asyncio
+
+    asyncio.run(_check_failed_rollover())
@@ -1,25 +1,126 @@
+import logging
+import os
+from typing import Optional
+
+from dotenv import load_dotenv
+from fluent.runtime import FluentLocalization, FluentResourceLoader
+from fluent.syntax import FluentParser
 from fluent_compiler.bundle import FluentBundle
 
 from fluentogram import FluentTranslator, TranslatorHub
 
+load_dotenv()
+logger = logging.getLogger('default')
+
+TRANSLATIONS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "translations")
+RESOURCE_ID = "main.ftl"
+
+# Локали хаба переводчиков: код локали для fluent_compiler и цепочка запасных языков
+HUB_LOCALES = {
+    "ru": ("ru-RU", ("ru", "en")),
+    "en": ("en-US", ("en", "ru")),
+}
+
+default_locale = os.getenv('DEFAULT_LOCALE')
+locales = os.getenv('LOCALES').split(',')
+
+# Тексты .ftl файлов и разобранные ресурсы, общие для всего процесса
+_sources: dict[str, str] = {}
+_resources: dict[str, list] = {}
+_translator_hub: Optional[TranslatorHub] = None
+# Словарь изменяется на месте при перезагрузке, поэтому ссылки на него в миддлвари остаются актуальными
+l10ns: dict[str, FluentLocalization] = {}
+
+
+def _read_source(locale: str) -> Optional[str]:
+    if locale not in _sources:
+        path = os.path.join(TRANSLATIONS_DIR, locale, RESOURCE_ID)
+        if not os.path.isfile(path):
+            return None
+        with open(path, encoding='utf-8') as f:
+            _sources[locale] = f.read()
+    return _sources[locale]
+
+
+class SharedResourceLoader(FluentResourceLoader):
+    """
+    Загрузчик ресурсов, который разбирает каждый .ftl файл один раз на процесс.
+    """
+
+    def __init__(self):
+        super().__init__(os.path.join(TRANSLATIONS_DIR, "{locale}"))
+
+    def resources(self, locale, resource_ids):
+        if locale not in _resources:
+            source = _read_source(locale)
+            _resources[locale] = [FluentParser().parse(source)] if source is not None else []
+        if _resources[locale]:
+            yield _resources[locale]
+
 
 def create_translator_hub() -> TranslatorHub:
     translator_hub = TranslatorHub(
-        {
-            "ru": ("ru", "en"),
-            "en": ("en", "ru")
-        },
+        {locale: fallbacks for locale, (_, fallbacks) in HUB_LOCALES.items()},
         [
             FluentTranslator(
-                locale="ru",
-                translator=FluentBundle.from_files(
-                    locale="ru-RU",
-                    filenames=["translations/ru/main.ftl"])),
-            FluentTranslator(
-                locale="en",
-                translator=FluentBundle.from_files(
-                    locale="en-US",
-                    filenames=["translations/en/main.ftl"]))
+                locale=locale,
+                translator=FluentBundle.from_string(locale=bundle_locale, text=_read_source(locale)))
+            for locale, (bundle_locale, _) in HUB_LOCALES.items()
         ],
     )
     return translator_hub
+
+
+def _build_l10ns() -> dict[str, FluentLocalization]:
+    loader = SharedResourceLoader()
+    result = {}
+    for locale in locales:
+        l10n = FluentLocalization(list(dict.fromkeys([locale, default_locale])), [RESOURCE_ID], loader)
+        # Несуществующий ключ заставляет пройти по всем бандлам и собрать их заранее
+        l10n.format_value('__precompile__')
+        result[locale] = l10n
+    return result
+
+
+def get_translator_hub() -> TranslatorHub:
+    """
+    Возвращает общий для процесса хаб переводчиков, при первом обращении собирает его.
+    """
+    global _translator_hub
+    if _translator_hub is None:
+        _translator_hub = create_translator_hub()
+    return _translator_hub
+
+
+def get_l10ns() -> dict[str, FluentLocalization]:
+    """
+    Возвращает общие для процесса объекты FluentLocalization по локалям.
+    """
+    if not l10ns:
+        l10ns.update(_build_l10ns())
+    return l10ns
+
+
+def precompile_translations() -> None:
+    """
+    Собирает все переводы при старте, чтобы первый запрос не платил за разбор .ftl файлов.
+    """
+    get_translator_hub()
+    get_l10ns()
+    logger.info(f'Translations compiled for locales: {", ".join(l10ns)}')
+
+
+def reload_translations() -> None:
+    """
+    Перечитывает .ftl файлы и подменяет переводы без перезапуска бота.
+    """
+    global _translator_hub
+    _sources.clear()
+    _resources.clear()
+    translator_hub = create_translator_hub()
+    new_l10ns = _build_l10ns()
+    # Подменяем только после успешной сборки, чтобы ошибка в .ftl не оставила бота без переводов
+    _translator_hub = translator_hub
+    l10ns.clear()
+    l10ns.update(new_l10ns)
+    logger.info(f'Translations reloaded for locales: {", ".join(l10ns)}')
@@ -0,0 +1,106 @@
+"""
+Кэш сгенерированных изображений.
+
+Ключ - SHA-256 (стиль, размер, нормализованный запрос). Для каждого ключа хранятся
+изображение в blob_store и file_id Telegram после первой отправки, поэтому одинаковые
+запросы (например, переводы общих фраз) не генерируются заново. Кнопка повторной
+генерации обходит кэш и перезаписывает запись.
+"""
+
+import hashlib
+import logging
+from dataclasses import dataclass
+from typing import Optional
+
+from redis.asyncio import Redis
+
+from models.main import GeneratedImage
+from services.blob_store import blob_store, release
+from services.llm_cache import normalize_prompt_text
+
+logger = logging.getLogger('default')
+
+CACHE_TTL = 30 * 24 * 60 * 60
+
+
+@dataclass
+class CachedImage:
+    image_digest: str
+    tg_id: Optional[str] = None
+
+
+class ImageCache:
+    def __init__(self, ttl: int = CACHE_TTL):
+        self.ttl = ttl
+        self.redis: Optional[Redis] = None
+
+    @staticmethod
+    def cache_key(prompt: str, style: str = "DEFAULT", width: int = 1024, height: int = 1024) -> str:
+        payload = f'{style}\n{width}x{height}\n{normalize_prompt_text(prompt).lower()}'
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    @staticmethod
+    def _redis_key(key: str) -> str:
+        return f'image:{key}'
+
+    async def _to_redis(self, key: str, image: CachedImage) -> None:
+        if self.redis is None:
+            return
+        mapping = {'digest': image.image_digest}
+        if image.tg_id:
+            mapping['tg_id'] = image.tg_id
+        try:
+            await self.redis.hset(self._redis_key(key), mapping=mapping)
+            await self.redis.expire(self._redis_key(key), self.ttl)
+        except Exception as e:
+            logger.error(f"Ошибка записи изображения {key} в Redis: {e}")
+
+    async def get(self, key: str) -> Optional[CachedImage]:
+        if self.redis is not None:
+            try:
+                digest, tg_id = await self.redis.hmget(self._redis_key(key), ['digest', 'tg_id'])
+            except Exception as e:
+                logger.error(f"Ошибка чтения изображения {key} из Redis: {e}")
+                digest = None
+            if digest is not None:
+                return CachedImage(digest.decode(), tg_id.decode() if tg_id else None)
+
+        row = await GeneratedImage.filter(key=key).first().values('image_digest', 'tg_id')
+        if row is None:
+            return None
+        image = CachedImage(row['image_digest'], row['tg_id'])
+        await self._to_redis(key, image)
+        return image
+
+    async def save(self, key: str, prompt: str, image: bytes) -> CachedImage:
+        """
+        Сохраняет новое изображение для ключа; старое, если было, заменяется.
+        """
+        cached = CachedImage(await blob_store.put(image))
+        old_digest = await GeneratedImage.filter(key=key).first().values_list('image_digest', flat=True)
+        await GeneratedImage.update_or_create(
+            key=key, defaults={'prompt': prompt, 'image_digest': cached.image_digest, 'tg_id': None})
+        if old_digest and old_digest != cached.image_digest:
+            await release([old_digest])
+        if self.redis is not None:
+            try:
+                await self.redis.delete(self._redis_key(key))
+            except Exception as e:
+                logger.error(f"Ошибка удаления изображения {key} из Redis: {e}")
+        await self._to_redis(key, cached)
+        return cached
+
+    async def remember_file_id(self, key: str, tg_id: str) -> None:
+        """
+        Запоминает file_id отправленного изображения.
+        """
+        await GeneratedImage.filter(key=key).update(tg_id=tg_id)
+        if self.redis is None:
+            return
+        try:
+            await self.redis.hset(self._redis_key(key), 'tg_id', tg_id)
+        except Exception as e:
+            logger.error(f"Ошибка записи file_id изображения {key} в Redis: {e}")
+
+
+image_cache = ImageCache()
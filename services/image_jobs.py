@@ -0,0 +1,162 @@
+"""
+Фоновая очередь генерации изображений.
+
+Генерация в Kandinsky занимает десятки секунд, поэтому обработчик диалога только ставит
+задачу в очередь и сразу отвечает пользователю. Воркер генерирует изображение, отправляет
+его в чат и вызывает on_sent с отправленным сообщением, например чтобы сохранить file_id
+через менеджер диалога dialog_manager.bg(). Одинаковые запросы берутся из image_cache,
+если только генерация не запрошена заново (force).
+
+Пока изображение генерируется, в данных диалога стоит отметка mark_image_pending, и диалог
+не должен сохранять фразу (image_pending), иначе она сохранится без изображения. Отметку
+снимают on_sent и on_failed; если задача потерялась (перезапуск бота), отметка истекает сама.
+"""
+
+import asyncio
+import base64
+import logging
+import os
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Optional
+
+from aiogram import Bot
+from aiogram.types import BufferedInputFile, InputFile, Message
+from dotenv import load_dotenv
+
+from bot_init import bot
+from external_services.kandinsky import KandinskyClient, kandinsky
+from services.blob_store import blob_store
+from services.image_cache import ImageCache, image_cache
+
+load_dotenv()
+logger = logging.getLogger('default')
+
+# FusionBrain сам держит очередь, параллельные запросы одного ключа ее не ускоряют
+WORKERS = int(os.getenv('IMAGE_WORKERS', '2'))
+PENDING_KEY = 'image_pending'
+PENDING_TIMEOUT = 10 * 60
+
+
+def mark_image_pending(dialog_data: dict) -> None:
+    dialog_data[PENDING_KEY] = time.time()
+
+
+def image_pending(dialog_data: dict) -> bool:
+    started = dialog_data.get(PENDING_KEY)
+    return bool(started) and time.time() - started < PENDING_TIMEOUT
+
+
+@dataclass
+class ImageJob:
+    prompt: str
+    chat_id: int
+    caption: str
+    error_text: str
+    on_sent: Optional[Callable[[Message], Awaitable[None]]]
+    on_failed: Optional[Callable[[], Awaitable[None]]]
+    force: bool
+    future: asyncio.Future
+
+
+class ImageGenerationQueue:
+    def __init__(self, bot: Bot, client: KandinskyClient = kandinsky, cache: ImageCache = image_cache,
+                 workers: int = WORKERS):
+        self.bot = bot
+        self.client = client
+        self.cache = cache
+        self.workers_count = workers
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: list[asyncio.Task] = []
+
+    def _ensure_workers(self) -> None:
+        if self._workers:
+            return
+        self._queue = asyncio.Queue()
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.workers_count)]
+
+    async def stop(self) -> None:
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        await self.client.close()
+
+    def submit(self, prompt: str, chat_id: int, caption: str, error_text: str,
+               on_sent: Optional[Callable[[Message], Awaitable[None]]] = None,
+               on_failed: Optional[Callable[[], Awaitable[None]]] = None,
+               force: bool = False) -> asyncio.Future:
+        """
+        Ставит генерацию в очередь. С force=True изображение генерируется заново, даже если есть в кэше.
+
+        :return: Future с отправленным сообщением или None, если изображение получить не удалось.
+        """
+        self._ensure_workers()
+        job = ImageJob(prompt, chat_id, caption, error_text, on_sent, on_failed, force,
+                       asyncio.get_running_loop().create_future())
+        self._queue.put_nowait(job)
+        return job.future
+
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize() if self._queue else 0
+
+    async def _worker(self) -> None:
+        while True:
+            job = await self._queue.get()
+            try:
+                result = await self._process(job)
+            except Exception as e:
+                logger.error('Ошибка при генерации изображения: %s', e)
+                result = None
+                await self._notify_failure(job)
+            finally:
+                self._queue.task_done()
+            if not job.future.done():
+                job.future.set_result(result)
+
+    async def _cached_photo(self, key: str) -> Optional[str | InputFile]:
+        cached = await self.cache.get(key)
+        if cached is None:
+            return None
+        if cached.tg_id:
+            return cached.tg_id
+        # Файл отправляется с диска потоком, без чтения в память
+        return blob_store.input_file(cached.image_digest, filename="image.png")
+
+    async def _process(self, job: ImageJob) -> Optional[Message]:
+        key = self.cache.cache_key(job.prompt)
+        photo = None if job.force else await self._cached_photo(key)
+        if photo is None:
+            await self.bot.send_chat_action(chat_id=job.chat_id, action="upload_photo")
+            images = await self.client.generate(job.prompt)
+            if not images:
+                await self._notify_failure(job)
+                return None
+            image = base64.b64decode(images[0])
+            await self.cache.save(key, job.prompt, image)
+            photo = BufferedInputFile(image, filename="image.png")
+        msg = await self.bot.send_photo(chat_id=job.chat_id, photo=photo, caption=job.caption)
+        if isinstance(photo, InputFile):
+            await self.cache.remember_file_id(key, msg.photo[-1].file_id)
+        if job.on_sent is not None:
+            try:
+                await job.on_sent(msg)
+            except Exception as e:
+                # Изображение уже у пользователя, сообщать об ошибке генерации не нужно
+                logger.error('Ошибка при обработке сгенерированного изображения: %s', e)
+        return msg
+
+    async def _notify_failure(self, job: ImageJob) -> None:
+        try:
+            await self.bot.send_message(chat_id=job.chat_id, text=job.error_text)
+        except Exception as e:
+            logger.error(f"Не удалось сообщить об ошибке генерации в чат {job.chat_id}: {e}")
+        if job.on_failed is not None:
+            try:
+                await job.on_failed()
+            except Exception as e:
+                logger.error('Ошибка при обработке неудачной генерации изображения: %s', e)
+
+
+image_jobs = ImageGenerationQueue(bot)
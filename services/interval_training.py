@@ -1,14 +1,17 @@
 import logging
 import random
 from datetime import datetime
+from typing import Optional
 
 import pytz
 from aiogram_dialog import DialogManager, ShowMode
 from dotenv import load_dotenv
+from tortoise import Tortoise
 
 from config_data.config import INTERVALS
 from handlers.system_handlers import check_day_counter
 from models import Phrase, ReviewStatus, UserAnswer
+from services.review_queue import review_queue
 from services.services import normalize_text
 from states import IntervalTrainingSG, ErrorIntervalSG
 
@@ -41,6 +44,9 @@ async def check_user_answer(answer_text: str, phrase: Phrase, user, training_sel
         )
     review_status.note = False
     await review_status.save()
+    if review_queue.enabled:
+        await review_queue.update(review_status.user_id, review_status.phrase_id,
+                                  review_status.review_count, review_status.next_review)
     await UserAnswer.create(
         user=user,
         phrase=phrase,
@@ -51,57 +57,82 @@ async def check_user_answer(answer_text: str, phrase: Phrase, user, training_sel
     return result
 
 
+# Фраза к повторению с самой ранней датой, последняя заданная фраза исключается
+DUE_PHRASE_SQL = '''
+    SELECT rs.phrase_id
+    FROM reviewstatus rs
+    JOIN phrase p ON p.id = rs.phrase_id
+    JOIN category c ON c.id = p.category_id
+    WHERE rs.user_id = $1
+      AND p.user_id = $1
+      AND NOT c.public
+      AND rs.review_count < $2
+      AND rs.next_review <= $3
+      AND ($4::varchar IS NULL OR p.text_phrase <> $4)
+    ORDER BY rs.next_review
+    LIMIT 1
+'''
+
+# Случайная фраза: сначала неизученные, затем любые; последняя заданная - только если других нет
+RANDOM_PHRASE_SQL = '''
+    SELECT p.id AS phrase_id
+    FROM phrase p
+    JOIN category c ON c.id = p.category_id
+    LEFT JOIN reviewstatus rs ON rs.phrase_id = p.id AND rs.user_id = $1
+    WHERE p.user_id = $1
+      AND NOT c.public
+    ORDER BY p.text_phrase IS NOT DISTINCT FROM $2::varchar, rs.id IS NOT NULL, random()
+    LIMIT 1
+'''
+
+
+async def select_random_phrase(user_id, last_phrase: Optional[str] = None) -> Optional[int]:
+    """
+    Случайная фраза пользователя: сначала неизученные, последняя заданная - только если других нет.
+    """
+    _, rows = await Tortoise.get_connection('default').execute_query(RANDOM_PHRASE_SQL, [user_id, last_phrase])
+    return rows[0]['phrase_id'] if rows else None
+
+
 async def select_phrase_for_interval_training(user_id, dialog_manager: DialogManager):
+    """
+    Выбирает фразу для интервальной тренировки на стороне базы:
+    фраза с самой ранней наступившей датой повторения, иначе случайная неизученная, иначе любая случайная.
+
+    :return: id фразы или None, если у пользователя нет своих фраз.
+    """
     now = datetime.now(pytz.UTC)
+    last_phrase = dialog_manager.dialog_data.get('question')
 
-    # 1. Выбираем все фразы из категории
-    # all_phrases = await Phrase.filter(user_id=user_id).all()
-    all_phrases = await Phrase.filter(user_id=user_id, category__public=False).prefetch_related('category')
-    if all_phrases:
-        logger.debug(f'All phrases: {all_phrases}')
+    _, rows = await Tortoise.get_connection('default').execute_query(
+        DUE_PHRASE_SQL, [user_id, len(INTERVALS), now, last_phrase])
+    chosen_phrase_id = rows[0]['phrase_id'] if rows else await select_random_phrase(user_id, last_phrase)
+    logger.debug(f'Chosen phrase: {chosen_phrase_id}')
+    return chosen_phrase_id
 
-        # 2. Исключаем последнюю введенную фразу, если она есть
-        last_phrase = dialog_manager.dialog_data.get('question')
-        if last_phrase:
-            all_phrases = [phrase for phrase in all_phrases if phrase.text_phrase != last_phrase]
-            logger.debug(f'Phrase without last phrase: {all_phrases}')
 
-        # 3. Получаем все статусы повторений для пользователя и фраз
-        phrase_ids = [phrase.id for phrase in all_phrases]
-        review_statuses = await ReviewStatus.filter(
-            user_id=user_id,
-            phrase_id__in=phrase_ids
-        ).prefetch_related('phrase')
-        logger.debug(f'Review statuses: {review_statuses}')
-
-        # 4. Находим фразы, которые нужно повторить
-        phrases_to_review = []
-        for status in review_statuses:
-            if status.review_count < len(INTERVALS) and now >= status.next_review:
-                phrases_to_review.append((status.phrase, status.next_review))
-        logger.debug(f'Phrases to review: {phrases_to_review}')
-        if phrases_to_review:
-            # Выбираем фразу с самой ранней датой следующего повторения
-            chosen_phrase, _ = min(phrases_to_review, key=lambda x: x[1])
-            logger.debug(f'Chosen phrase: {chosen_phrase}')
-        else:
-            # Если нет фраз для повторения, выбираем случайную из тех, которые еще не изучались
-            studied_phrase_ids = [status.phrase_id for status in review_statuses]
-            logger.debug(f'Studied phrase ids: {studied_phrase_ids}')
-            unstudied_phrases = [phrase for phrase in all_phrases if phrase.id not in studied_phrase_ids]
-            logger.debug(f'Unstudied phrases: {unstudied_phrases}')
-            if unstudied_phrases:
-                chosen_phrase = random.choice(unstudied_phrases)
-                logger.debug(f'Chosen phrase: {chosen_phrase}')
-            else:
-                # Если все фразы уже изучались, выбираем случайную
-                chosen_phrase = random.choice(all_phrases)
-                logger.debug(f'Chosen phrase: {chosen_phrase}')
+async def select_next_review(user_id, dialog_manager: DialogManager) -> tuple[Optional[int], Optional[int]]:
+    """
+    Следующая фраза для тренировки и ее review_count (None - фраза еще не изучалась).
+    Наступившие повторения берутся из очереди в Redis, без обращения к базе.
+    """
+    if not review_queue.enabled:
+        phrase_id = await select_phrase_for_interval_training(user_id, dialog_manager)
+        if phrase_id is None:
+            return None, None
+        review_count = await ReviewStatus.filter(
+            user_id=user_id, phrase_id=phrase_id).first().values_list('review_count', flat=True)
+        return phrase_id, review_count
 
-        return chosen_phrase.id
+    now = datetime.now(pytz.UTC)
+    due = await review_queue.next_due(user_id, now, exclude_phrase_id=dialog_manager.dialog_data.get('phrase_id'))
+    if due:
+        return due
 
-    else:
-        return None
+    phrase_id = await select_random_phrase(user_id, dialog_manager.dialog_data.get('question'))
+    if phrase_id is None:
+        return None, None
+    return phrase_id, await review_queue.get_review_count(user_id, phrase_id)
 
 
 async def translation_training(dialog_manager: DialogManager):
@@ -152,18 +183,17 @@ async def start_training(dialog_manager: DialogManager) -> None:
     user_id = dialog_manager.event.from_user.id
     is_day_counter = await check_day_counter(dialog_manager)
     if is_day_counter:
-        phrase_id = await select_phrase_for_interval_training(user_id, dialog_manager)
+        phrase_id, review_count = await select_next_review(user_id, dialog_manager)
         if phrase_id:
             dialog_manager.dialog_data['phrase_id'] = phrase_id
-            review_status = await ReviewStatus.get_or_none(user_id=user_id, phrase_id=phrase_id)
 
             # Получаем предыдущую тренировку, если она была
             previous_training = dialog_manager.dialog_data.get('training_selected')
 
-            if review_status:
-                if review_status.review_count > 5:
+            if review_count is not None:
+                if review_count > 5:
                     training_selected = 'translation'
-                elif review_status.review_count < 3:
+                elif review_count < 3:
                     training_type = ['listening', 'lexis', 'pronunciation', 'pronunciation_text']
                     if previous_training in training_type:
                         training_type.remove(previous_training)
@@ -200,5 +230,116 @@ async def start_training(dialog_manager: DialogManager) -> None:
             await error_interval_training(dialog_manager)
 
 
+async def _select_phrase_in_python(user_id, last_phrase: Optional[str] = None):
+    """
+    Прежний выбор фразы в Python. Используется только бенчмарком как точка отсчета.
+    """
+    now = datetime.now(pytz.UTC)
+
+    # 1. Выбираем все фразы из категории
+    # all_phrases = await Phrase.filter(user_id=user_id).all()
+    all_phrases = await Phrase.filter(user_id=user_id, category__public=False).prefetch_related('category')
+    if all_phrases:
+        logger.debug(f'All phrases: {all_phrases}')
+
+        # 2. Исключаем последнюю введенную фразу, если она есть
+        if last_phrase:
+            all_phrases = [phrase for phrase in all_phrases if phrase.text_phrase != last_phrase]
+            logger.debug(f'Phrase without last phrase: {all_phrases}')
+
+        # 3. Получаем все статусы повторений для пользователя и фраз
+        phrase_ids = [phrase.id for phrase in all_phrases]
+        review_statuses = await ReviewStatus.filter(
+            user_id=user_id,
+            phrase_id__in=phrase_ids
+        ).prefetch_related('phrase')
+        logger.debug(f'Review statuses: {review_statuses}')
+
+        # 4. Находим фразы, которые нужно повторить
+        phrases_to_review = []
+        for status in review_statuses:
+            if status.review_count < len(INTERVALS) and now >= status.next_review:
+                phrases_to_review.append((status.phrase, status.next_review))
+        logger.debug(f'Phrases to review: {phrases_to_review}')
+        if phrases_to_review:
+            # Выбираем фразу с самой ранней датой следующего повторения
+            chosen_phrase, _ = min(phrases_to_review, key=lambda x: x[1])
+            logger.debug(f'Chosen phrase: {chosen_phrase}')
+        else:
+            # Если нет фраз для повторения, выбираем случайную из тех, которые еще не изучались
+            studied_phrase_ids = [status.phrase_id for status in review_statuses]
+            logger.debug(f'Studied phrase ids: {studied_phrase_ids}')
+            unstudied_phrases = [phrase for phrase in all_phrases if phrase.id not in studied_phrase_ids]
+            logger.debug(f'Unstudied phrases: {unstudied_phrases}')
+            if unstudied_phrases:
+                chosen_phrase = random.choice(unstudied_phrases)
+                logger.debug(f'Chosen phrase: {chosen_phrase}')
+            else:
+                # Если все фразы уже изучались, выбираем случайную
+                chosen_phrase = random.choice(all_phrases)
+                logger.debug(f'Chosen phrase: {chosen_phrase}')
+
+        return chosen_phrase.id
+
+    else:
+        return None
+
+
+async def _benchmark_phrase_selection(phrases_count: int = 10000, runs: int = 50):
+    """
+    Сравнивает выбор фразы в Python и в базе для пользователя с большим количеством фраз.
+    """
+    import time
+    from datetime import timedelta
+    from types import SimpleNamespace
+
+    from db.config import init_benchmark_db
+    from models import Category, User
+
+    await init_benchmark_db()
+    try:
+        await ReviewStatus.all().delete()
+        await Phrase.all().delete()
+        await Category.all().delete()
+        await User.filter(id=1).delete()
+        user = await User.create(id=1)
+        category = await Category.create(name='benchmark', user=user)
+        await Phrase.bulk_create(
+            [Phrase(text_phrase=f'phrase {i}', spaced_phrase=f'phrase {i}', category=category, user=user)
+             for i in range(phrases_count)],
+            batch_size=1000,
+        )
+        phrase_ids = await Phrase.filter(user=user).order_by('id').values_list('id', flat=True)
+        now = datetime.now(pytz.UTC)
+
+        # Половина фраз изучалась, из них каждая десятая уже ждет повторения
+        studied = phrase_ids[:phrases_count // 2]
+        await ReviewStatus.bulk_create(
+            [ReviewStatus(user=user, phrase_id=phrase_id, review_count=i % len(INTERVALS),
+                          next_review=now + (timedelta(minutes=-i) if i % 10 == 0 else timedelta(days=1)))
+             for i, phrase_id in enumerate(studied)],
+            batch_size=1000,
+        )
+
+        dialog_manager = SimpleNamespace(dialog_data={'question': 'phrase 0'})
+        for name, select in (
+                ('python', lambda: _select_phrase_in_python(user.id, 'phrase 0')),
+                ('sql', lambda: select_phrase_for_interval_training(user.id, dialog_manager)),
+        ):
+            for scenario in ('due', 'unstudied'):
+                if scenario == 'unstudied':
+                    await ReviewStatus.filter(user=user).update(next_review=now + timedelta(days=1))
+                started = time.monotonic()
+                for _ in range(runs):
+                    await select()
+                elapsed = (time.monotonic() - started) / runs
+                print(f'{name:<6} {scenario:<9} phrases={phrases_count} {elapsed * 1000:.1f}ms')
+            await ReviewStatus.filter(user=user, phrase_id__in=studied[::10]).update(next_review=now)
+    finally:
+        await Tortoise.close_connections()
+
+
 if __name__ == '__main__':
-    pass
+    import asyncio
+
+    asyncio.run(_benchmark_phrase_selection())
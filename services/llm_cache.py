@@ -0,0 +1,154 @@
+"""
+Кэш ответов OpenAI для перевода и расстановки пробелов.
+
+Ключ - SHA-256 (модель, шаблон запроса, текст со схлопнутыми пробелами). Модели уходит
+исходный текст: ответ (например, фраза с пробелами) должен совпадать с ним посимвольно,
+поэтому полноширинные и обычные символы в ключе не смешиваются. Ответы хранятся в Redis
+и в таблице LlmResponse (если Redis пуст или недоступен). Одинаковые запросы, пришедшие
+одновременно, объединяются в один вызов API.
+"""
+
+import asyncio
+import hashlib
+import logging
+import re
+from dataclasses import dataclass
+from typing import Optional
+
+from redis.asyncio import Redis
+from tortoise.exceptions import IntegrityError
+
+from external_services.openai_services import (
+    ADD_SPACE_PROMPT,
+    GPT_MODEL,
+    LOCATION,
+    TRANSLATE_PROMPT,
+    openai_complete,
+)
+from models import LlmResponse
+
+logger = logging.getLogger('default')
+
+REDIS_TTL = 90 * 24 * 60 * 60
+
+
+def normalize_prompt_text(text: str) -> str:
+    return re.sub(r'\s+', ' ', text).strip()
+
+
+@dataclass
+class LlmCacheStats:
+    redis_hits: int = 0
+    db_hits: int = 0
+    misses: int = 0
+    coalesced: int = 0
+    tokens_saved: int = 0
+    tokens_spent: int = 0
+
+    def as_dict(self) -> dict:
+        hits = self.redis_hits + self.db_hits + self.coalesced
+        total = hits + self.misses
+        return {
+            'redis_hits': self.redis_hits,
+            'db_hits': self.db_hits,
+            'misses': self.misses,
+            'coalesced': self.coalesced,
+            'hit_rate': round(hits / total, 3) if total else 0.0,
+            'tokens_saved': self.tokens_saved,
+            'tokens_spent': self.tokens_spent,
+        }
+
+
+class LlmCache:
+    def __init__(self, model: str = GPT_MODEL, ttl: int = REDIS_TTL):
+        self.model = model
+        self.ttl = ttl
+        self.redis: Optional[Redis] = None
+        self.stats = LlmCacheStats()
+        self._pending: dict[str, asyncio.Task] = {}
+
+    def cache_key(self, template: str, text: str) -> str:
+        payload = f'{self.model}\n{template}\n{text}'
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    @staticmethod
+    def _redis_key(key: str) -> str:
+        return f'llm:{key}'
+
+    async def _from_redis(self, key: str) -> Optional[tuple[str, int]]:
+        if self.redis is None:
+            return None
+        try:
+            output, tokens = await self.redis.hmget(self._redis_key(key), ['output', 'tokens'])
+        except Exception as e:
+            logger.error(f"Ошибка чтения ответа модели из Redis: {e}")
+            return None
+        if output is None:
+            return None
+        return output.decode(), int(tokens or 0)
+
+    async def _to_redis(self, key: str, output: str, tokens: int) -> None:
+        if self.redis is None:
+            return
+        try:
+            await self.redis.hset(self._redis_key(key), mapping={'output': output, 'tokens': tokens})
+            await self.redis.expire(self._redis_key(key), self.ttl)
+        except Exception as e:
+            logger.error(f"Ошибка записи ответа модели в Redis: {e}")
+
+    async def _resolve(self, key: str, template: str, text: str) -> str:
+        cached = await self._from_redis(key)
+        if cached is not None:
+            self.stats.redis_hits += 1
+            self.stats.tokens_saved += cached[1]
+            return cached[0]
+
+        row = await LlmResponse.filter(key=key).first().values('output', 'tokens')
+        if row is not None:
+            self.stats.db_hits += 1
+            self.stats.tokens_saved += row['tokens']
+            await self._to_redis(key, row['output'], row['tokens'])
+            return row['output']
+
+        self.stats.misses += 1
+        output, tokens = await openai_complete(template.format(text=text))
+        self.stats.tokens_spent += tokens
+        try:
+            await LlmResponse.create(key=key, model=self.model, text=text, output=output, tokens=tokens)
+        except IntegrityError:
+            # Тот же ответ уже записал другой процесс
+            pass
+        await self._to_redis(key, output, tokens)
+        return output
+
+    async def complete(self, template: str, text: str) -> str:
+        """
+        Ответ модели на запрос template с подставленным текстом, из кэша, если он там есть.
+        """
+        key = self.cache_key(template, normalize_prompt_text(text))
+        task = self._pending.get(key)
+        if task is not None:
+            self.stats.coalesced += 1
+        else:
+            task = self._pending[key] = asyncio.create_task(self._resolve(key, template, text))
+            task.add_done_callback(lambda _: self._pending.pop(key, None))
+        return await asyncio.shield(task)
+
+
+llm_cache = LlmCache()
+
+
+async def cached_add_space(text: str) -> str:
+    """
+    Кэширующий вариант openai_gpt_add_space.
+    """
+    if LOCATION != "ja-JP":
+        return text
+    return await llm_cache.complete(ADD_SPACE_PROMPT, text)
+
+
+async def cached_translate(text: str) -> str:
+    """
+    Кэширующий вариант openai_gpt_translate.
+    """
+    return await llm_cache.complete(TRANSLATE_PROMPT, text)
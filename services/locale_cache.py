@@ -0,0 +1,86 @@
+import logging
+from typing import Optional
+
+from cachetools import TTLCache
+from redis.asyncio import Redis
+
+from models import User
+
+logger = logging.getLogger('default')
+
+LOCAL_TTL = 300
+REDIS_TTL = 24 * 60 * 60
+MAX_LOCAL_ENTRIES = 50000
+
+
+class LocaleCache:
+    """
+    Кэш языка пользователя: словарь в памяти процесса, за ним Redis, за ним база.
+    """
+
+    def __init__(self, local_ttl: int = LOCAL_TTL, redis_ttl: int = REDIS_TTL):
+        self.local = TTLCache(maxsize=MAX_LOCAL_ENTRIES, ttl=local_ttl)
+        self.redis_ttl = redis_ttl
+        self.redis: Optional[Redis] = None
+        self.local_hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(user_id: int) -> str:
+        return f'locale:{user_id}'
+
+    async def get(self, user_id: int) -> Optional[str]:
+        """
+        Возвращает язык пользователя или None, если пользователя нет в базе.
+        """
+        language = self.local.get(user_id)
+        if language is not None:
+            self.local_hits += 1
+            return language
+
+        if self.redis is not None:
+            try:
+                value = await self.redis.get(self._key(user_id))
+            except Exception as e:
+                logger.error(f"Ошибка чтения языка пользователя {user_id} из Redis: {e}")
+                value = None
+            if value is not None:
+                self.redis_hits += 1
+                language = value.decode() if isinstance(value, bytes) else value
+                self.local[user_id] = language
+                return language
+
+        self.misses += 1
+        language = await User.filter(id=user_id).first().values_list('language', flat=True)
+        if language is not None:
+            await self.set(user_id, language)
+        return language
+
+    async def set(self, user_id: int, language: str) -> None:
+        self.local[user_id] = language
+        if self.redis is not None:
+            try:
+                await self.redis.set(self._key(user_id), language, ex=self.redis_ttl)
+            except Exception as e:
+                logger.error(f"Ошибка записи языка пользователя {user_id} в Redis: {e}")
+
+    async def invalidate(self, user_id: int) -> None:
+        self.local.pop(user_id, None)
+        if self.redis is not None:
+            try:
+                await self.redis.delete(self._key(user_id))
+            except Exception as e:
+                logger.error(f"Ошибка удаления языка пользователя {user_id} из Redis: {e}")
+
+    def stats(self) -> dict:
+        total = self.local_hits + self.redis_hits + self.misses
+        return {
+            'local_hits': self.local_hits,
+            'redis_hits': self.redis_hits,
+            'misses': self.misses,
+            'hit_rate': round((self.local_hits + self.redis_hits) / total, 3) if total else 0.0,
+        }
+
+
+locale_cache = LocaleCache()
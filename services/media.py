@@ -0,0 +1,71 @@
+"""
+Загрузка файлов из Telegram в память.
+
+Пути файлов (bot.get_file) кэшируются: Telegram гарантирует, что ссылка живет не меньше часа.
+Одновременные загрузки одного file_id объединяются в одну. Данные скачиваются в BytesIO
+и передаются декодерам как bytes, временные файлы на диске не создаются.
+"""
+
+import asyncio
+import io
+import logging
+from typing import Optional
+
+import aiohttp
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest
+from cachetools import TTLCache
+
+from bot_init import bot
+
+logger = logging.getLogger('default')
+
+FILE_PATH_TTL = 55 * 60
+MAX_CACHED_PATHS = 4096
+# Бот не может скачать из Telegram файл больше 20 МБ
+MAX_MEDIA_SIZE = 20 * 1024 * 1024
+
+
+class MediaTooLarge(Exception):
+    pass
+
+
+class TelegramMediaFetcher:
+    def __init__(self, bot: Bot, max_size: int = MAX_MEDIA_SIZE):
+        self.bot = bot
+        self.max_size = max_size
+        self.file_paths: TTLCache = TTLCache(maxsize=MAX_CACHED_PATHS, ttl=FILE_PATH_TTL)
+        self._pending: dict[str, asyncio.Task] = {}
+
+    async def _file_path(self, file_id: str) -> str:
+        file_path = self.file_paths.get(file_id)
+        if file_path is None:
+            file = await self.bot.get_file(file_id)
+            if file.file_size and file.file_size > self.max_size:
+                raise MediaTooLarge(f'{file_id}: {file.file_size} байт')
+            file_path = self.file_paths[file_id] = file.file_path
+        return file_path
+
+    async def _download(self, file_id: str) -> bytes:
+        buffer = io.BytesIO()
+        try:
+            await self.bot.download_file(await self._file_path(file_id), destination=buffer)
+        except (TelegramBadRequest, aiohttp.ClientResponseError):
+            # Ссылка устарела раньше срока, получаем новую
+            self.file_paths.pop(file_id, None)
+            buffer = io.BytesIO()
+            await self.bot.download_file(await self._file_path(file_id), destination=buffer)
+        return buffer.getvalue()
+
+    async def fetch(self, file_id: str) -> bytes:
+        """
+        Содержимое файла Telegram.
+        """
+        task: Optional[asyncio.Task] = self._pending.get(file_id)
+        if task is None:
+            task = self._pending[file_id] = asyncio.create_task(self._download(file_id))
+            task.add_done_callback(lambda _: self._pending.pop(file_id, None))
+        return await asyncio.shield(task)
+
+
+media_fetcher = TelegramMediaFetcher(bot)
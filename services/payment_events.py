@@ -0,0 +1,225 @@
+"""
+Применение уведомлений о платежах YooKassa.
+
+Вебхук только проверяет запрос, сохраняет событие в PaymentEvent (payment_id уникален,
+поэтому повторные уведомления отбрасываются) и сразу отвечает 200. Фоновый обработчик
+забирает ожидающие события пачками. Каждое событие применяется в одной транзакции
+с отметкой status='done', поэтому подписка продлевается ровно один раз даже при нескольких
+процессах (строки блокируются через SKIP LOCKED). Сообщения пользователю и администратору
+отправляются после фиксации транзакции. Событие, которое не удалось применить, берется снова
+не сразу, а с растущей задержкой (next_attempt_at), чтобы кратковременная ошибка базы не
+исчерпала все попытки за доли секунды.
+
+Повторная обработка неудачных событий:
+    python -m services.payment_events replay [payment_id ...]
+"""
+
+import asyncio
+import logging
+import sys
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Optional
+
+import pytz
+from dateutil.relativedelta import relativedelta
+from tortoise import Tortoise
+from tortoise.expressions import Q
+from tortoise.transactions import in_transaction
+
+from bot_init import bot, bg_factory
+from db.config import init_db
+from models import PaymentEvent, Subscription, TypeSubscription, User
+from services.entitlements import entitlements
+from states import SubscribeSG
+
+logger = logging.getLogger('default')
+
+BATCH_SIZE = 50
+MAX_ATTEMPTS = 5
+# Как часто проверять очередь, если вебхук не разбудил обработчик (например, событие другого процесса)
+POLL_INTERVAL = 10
+# Задержка перед повтором после первой ошибки, дальше удваивается
+RETRY_DELAY = 30
+ADMIN_CHAT_ID = 693131974
+REQUIRED_FIELDS = ('paymentId', 'userId', 'payload')
+
+
+@dataclass
+class AppliedPayment:
+    user_id: int
+    is_auto: bool
+    amount: Optional[str]
+    currency: Optional[str]
+
+
+async def apply_payment(data: dict) -> AppliedPayment:
+    """
+    Продлевает подписку по уведомлению. Вызывается внутри транзакции события.
+    """
+    user_id = int(data['userId'])
+    type_subscription = await TypeSubscription.get(payload=data['payload'])
+    subscription = await Subscription.filter(user_id=user_id).select_for_update().get()
+    subscription.payment_token = data['paymentId']
+    subscription.type_subscription = type_subscription
+    subscription.date_end = subscription.date_end + relativedelta(months=type_subscription.months)
+    await subscription.save()
+    return AppliedPayment(user_id, bool(data.get('is_auto')), data.get('amount'), data.get('currency'))
+
+
+async def notify_payment(applied: AppliedPayment) -> None:
+    user_id = applied.user_id
+    await entitlements.invalidate_tier(user_id)
+    user = await User.get(id=user_id)
+    # Получаем менеджер диалога для конкретного пользователя и чата
+    dialog_manager = bg_factory.bg(
+        bot=bot,
+        user_id=user_id,
+        chat_id=user_id
+    )
+    await dialog_manager.switch_to(state=SubscribeSG.payment_result)
+
+    msg_to_admin = (
+        f"Пользователь {user_id} {user.username} {user.first_name} успешно подписался на бота. "
+        f"Платеж на сумму {applied.amount} {applied.currency} прошел успешно.")
+    await bot.send_message(chat_id=ADMIN_CHAT_ID, text=msg_to_admin)
+    if not applied.is_auto:
+        await bot.send_message(chat_id=user_id, text="Поздравляем! Вы оформили подписку. Приятного обучения!")
+
+
+class PaymentEventConsumer:
+    def __init__(self, batch_size: int = BATCH_SIZE, max_attempts: int = MAX_ATTEMPTS,
+                 poll_interval: float = POLL_INTERVAL):
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def ingest(self, data: dict) -> bool:
+        """
+        Сохраняет событие и будит обработчик.
+
+        :return: False, если событие с таким paymentId уже было принято.
+        """
+        _, created = await PaymentEvent.get_or_create(payment_id=str(data['paymentId']), defaults={'data': data})
+        self.wake()
+        return created
+
+    def wake(self) -> None:
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def start(self) -> None:
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                while await self.process_batch() == self.batch_size:
+                    pass
+            except Exception as e:
+                logger.error(f"Ошибка обработки уведомлений о платежах: {e}")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def process_batch(self) -> int:
+        """
+        Применяет до batch_size ожидающих событий.
+
+        :return: Количество взятых в обработку событий.
+        """
+        event_ids = await PaymentEvent.filter(
+            Q(next_attempt_at__isnull=True) | Q(next_attempt_at__lte=datetime.now(pytz.UTC)),
+            status='pending',
+        ).order_by('id').limit(self.batch_size).values_list('id', flat=True)
+        for event_id in event_ids:
+            await self.process_event(event_id)
+        return len(event_ids)
+
+    async def process_event(self, event_id: int) -> None:
+        applied = None
+        try:
+            async with in_transaction():
+                # Событие, которое уже применил или сейчас применяет другой процесс, пропускаем
+                event = await PaymentEvent.filter(id=event_id, status='pending').select_for_update(
+                    skip_locked=True).first()
+                if event is None:
+                    return
+                applied = await apply_payment(event.data)
+                event.status = 'done'
+                event.attempts += 1
+                event.error = None
+                event.processed_at = datetime.now(pytz.UTC)
+                await event.save(update_fields=['status', 'attempts', 'error', 'processed_at'])
+        except Exception as e:
+            logger.error(f"Ошибка применения платежа (событие {event_id}): {e}")
+            await self._mark_failed(event_id, e)
+            return
+
+        if applied is not None:
+            try:
+                await notify_payment(applied)
+            except Exception as e:
+                # Подписка уже продлена, повторно событие не применяем
+                logger.error(f"Ошибка уведомления об оплате пользователя {applied.user_id}: {e}")
+
+    async def _mark_failed(self, event_id: int, error: Exception) -> None:
+        event = await PaymentEvent.get_or_none(id=event_id)
+        if event is None or event.status != 'pending':
+            return
+        event.attempts += 1
+        event.error = str(error)
+        if event.attempts >= self.max_attempts:
+            event.status = 'failed'
+        else:
+            event.next_attempt_at = datetime.now(pytz.UTC) + timedelta(
+                seconds=RETRY_DELAY * 2 ** (event.attempts - 1))
+        await event.save(update_fields=['status', 'attempts', 'error', 'next_attempt_at'])
+
+    async def replay(self, payment_ids: Optional[list[str]] = None) -> int:
+        """
+        Возвращает неудачные события в очередь и применяет их.
+
+        :param payment_ids: Какие платежи повторить; по умолчанию все неудачные.
+        :return: Количество событий, возвращенных в очередь.
+        """
+        query = PaymentEvent.filter(status='failed')
+        if payment_ids:
+            query = query.filter(payment_id__in=payment_ids)
+        requeued = await query.update(status='pending', attempts=0, next_attempt_at=None)
+        while await self.process_batch() == self.batch_size:
+            pass
+        return requeued
+
+
+payment_events = PaymentEventConsumer()
+
+
+async def _replay(payment_ids: list[str]) -> None:
+    await init_db()
+    try:
+        requeued = await payment_events.replay(payment_ids or None)
+        failed = await PaymentEvent.filter(status='failed').count()
+        print(f'requeued={requeued} still_failed={failed}')
+    finally:
+        await bot.session.close()
+        await Tortoise.close_connections()
+
+
+if __name__ == '__main__':
+    if sys.argv[1:2] == ['replay']:
+        asyncio.run(_replay(sys.argv[2:]))
+    else:
+        print(__doc__)
@@ -1,16 +1,25 @@
 import asyncio
 import logging
-from typing import Optional, Tuple
+import re
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Optional, Tuple, Union
 
+import pytz
 from aiogram.types import BufferedInputFile
+from tortoise import Tortoise
 
-from external_services.google_cloud_services import google_text_to_speech
-from external_services.openai_services import openai_gpt_add_space, openai_gpt_translate
+from external_services.openai_services import LOCATION, openai_enrich_phrases
+from models import AudioFile, Phrase
+from services.blob_store import release
+from services.llm_cache import cached_add_space, cached_translate
+from services.reference_audio import reference_audio
+from services.tts_cache import tts_cache
 
 logger = logging.getLogger(__name__)
 
 
-async def process_new_phrase(text_phrase: str) -> Tuple[str, str, Optional[BufferedInputFile], Optional[str]]:
+async def process_new_phrase(text_phrase: str) -> Tuple[str, str, Optional[Union[BufferedInputFile, str]], Optional[str]]:
     """
     Processes a new phrase by adding spaces, translating, and generating speech concurrently.
 
@@ -21,30 +30,28 @@ async def process_new_phrase(text_phrase: str) -> Tuple[str, str, Optional[Buffe
         A tuple containing:
         - spaced_phrase: The phrase with spaces added (or original if failed).
         - translation: The translation (or original if failed).
-        - voice: BufferedInputFile with audio content (or None if failed).
+        - voice: BufferedInputFile with audio content, Telegram file_id if this speech
+          was already sent (see tts_cache.remember_file_id), or None if failed.
         - voice_id: None (placeholder as it's generated after sending message).
     """
 
     async def safe_add_space():
         try:
-            return await openai_gpt_add_space(text_phrase)
+            return await cached_add_space(text_phrase)
         except Exception as e:
             logger.error(f'Error adding spaces: {e}')
             return text_phrase
 
     async def safe_translate():
         try:
-            return await openai_gpt_translate(text_phrase)
+            return await cached_translate(text_phrase)
         except Exception as e:
             logger.error(f'Error translating: {e}')
             return text_phrase
 
     async def safe_tts():
         try:
-            tts_result = await google_text_to_speech(text_phrase)
-            if tts_result and tts_result.audio_content:
-                return BufferedInputFile(tts_result.audio_content, filename="voice_tts.ogg")
-            return None
+            return await tts_cache.voice(text_phrase)
         except Exception as e:
             logger.error(f'Error generating TTS: {e}')
             return None
@@ -58,3 +65,184 @@ async def process_new_phrase(text_phrase: str) -> Tuple[str, str, Optional[Buffe
 
     spaced_phrase, translation, voice = results
     return spaced_phrase, translation, voice, None
+
+
+# Столько фраз можно держать в одной категории (см. phrase-limit)
+CATEGORY_PHRASE_LIMIT = 15
+MAX_PHRASE_LENGTH = 150
+# Длина колонок spaced_phrase и translation
+MAX_FIELD_LENGTH = 255
+
+_LIST_MARKER = re.compile(r'^\s*(?:[-*•]|\d+[.)])\s*')
+
+
+@dataclass
+class BulkPhrase:
+    text_phrase: str
+    spaced_phrase: str = ''
+    translation: str = ''
+    voice: Optional[Union[BufferedInputFile, str]] = None
+    audio_id: Optional[str] = None
+
+
+@dataclass
+class BulkImportResult:
+    phrases: list[BulkPhrase] = field(default_factory=list)
+    duplicates: int = 0
+    too_long: int = 0
+    over_limit: int = 0
+
+
+def parse_phrase_list(text: str) -> list[str]:
+    """
+    Фразы из вставленного списка или файла: по одной в строке, маркеры списка отбрасываются,
+    повторы (без учета регистра) пропускаются.
+    """
+    phrases, seen = [], set()
+    for line in text.splitlines():
+        phrase = _LIST_MARKER.sub('', line).strip()
+        if phrase and phrase.lower() not in seen:
+            seen.add(phrase.lower())
+            phrases.append(phrase)
+    return phrases
+
+
+async def _process_phrase_text(text_phrase: str) -> tuple[str, str]:
+    async def safe(coro):
+        try:
+            return await coro
+        except Exception as e:
+            logger.error(f'Error processing phrase: {e}')
+            return text_phrase
+
+    spaced_phrase, translation = await asyncio.gather(
+        safe(cached_add_space(text_phrase)),
+        safe(cached_translate(text_phrase)),
+    )
+    return spaced_phrase, translation
+
+
+async def enrich_phrases(phrases: list[str]) -> dict[str, tuple[str, str]]:
+    """
+    Пробелы и перевод для списка фраз одним запросом к модели: за раз добавляется
+    не больше CATEGORY_PHRASE_LIMIT фраз, поэтому делить список на пачки не нужно.
+
+    :return: Словарь фраза -> (spaced_phrase, translation)
+    """
+    try:
+        items, _ = await openai_enrich_phrases(phrases)
+    except Exception as e:
+        logger.error(f'Error enriching phrases: {e}')
+        items = []
+    enriched = {item['text']: (item['spaced'], item['translation']) for item in items}
+    missing = [phrase for phrase in phrases if phrase not in enriched]
+    if missing:
+        # Фразы, которые модель потеряла или изменила, переводим по одной
+        results = await asyncio.gather(*(_process_phrase_text(phrase) for phrase in missing))
+        enriched.update(zip(missing, results))
+    if LOCATION != 'ja-JP':
+        enriched = {phrase: (phrase, translation) for phrase, (_, translation) in enriched.items()}
+    return enriched
+
+
+async def prepare_bulk_import(user_id: int, category_id: int, text: str) -> BulkImportResult:
+    """
+    Готовит фразы для массового добавления в категорию: отбрасывает повторы и фразы сверх лимита,
+    переводит их одним запросом и озвучивает параллельно. Фразы, у которых пробелы или перевод
+    не помещаются в колонку, считаются слишком длинными.
+    """
+    result = BulkImportResult()
+    existing = {phrase.lower() for phrase in
+                await Phrase.filter(user_id=user_id).values_list('text_phrase', flat=True)}
+    candidates = []
+    for phrase in parse_phrase_list(text):
+        if len(phrase) >= MAX_PHRASE_LENGTH:
+            result.too_long += 1
+        elif phrase.lower() in existing:
+            result.duplicates += 1
+        else:
+            candidates.append(phrase)
+
+    free_slots = max(CATEGORY_PHRASE_LIMIT - await Phrase.filter(category_id=category_id, user_id=user_id).count(), 0)
+    result.over_limit = max(len(candidates) - free_slots, 0)
+    candidates = candidates[:free_slots]
+    if not candidates:
+        return result
+
+    async def safe_tts(phrase: str):
+        try:
+            return await tts_cache.voice(phrase)
+        except Exception as e:
+            logger.error(f'Error generating TTS: {e}')
+            return None
+
+    # Число одновременных запросов к TTS ограничивает семафор клиента
+    enriched, voices = await asyncio.gather(
+        enrich_phrases(candidates),
+        asyncio.gather(*(safe_tts(phrase) for phrase in candidates)),
+    )
+    for phrase, voice in zip(candidates, voices):
+        spaced_phrase, translation = enriched.get(phrase, (phrase, phrase))
+        if len(spaced_phrase) > MAX_FIELD_LENGTH or len(translation) > MAX_FIELD_LENGTH:
+            result.too_long += 1
+        else:
+            result.phrases.append(BulkPhrase(phrase, spaced_phrase, translation, voice=voice))
+    return result
+
+
+async def save_bulk_phrases(user_id: int, category_id: int, phrases: list[BulkPhrase]) -> list[Phrase]:
+    """
+    Сохраняет подготовленные фразы одним запросом. Фразы, которые пользователь успел
+    добавить за это время (text_phrase уникальна для пользователя), пропускаются.
+
+    :return: Только действительно добавленные фразы.
+    """
+    if not phrases:
+        return []
+    _, rows = await Tortoise.get_connection('default').execute_query(
+        '''
+        INSERT INTO phrase (category_id, user_id, text_phrase, spaced_phrase, translation, audio_id, created_at)
+        SELECT $1, $2, text_phrase, spaced_phrase, translation, audio_id, $3
+        FROM unnest($4::varchar[], $5::varchar[], $6::varchar[], $7::varchar[])
+            AS t (text_phrase, spaced_phrase, translation, audio_id)
+        ON CONFLICT (text_phrase, user_id) DO NOTHING
+        RETURNING id
+        ''',
+        [
+            category_id,
+            user_id,
+            datetime.now(pytz.UTC),
+            [phrase.text_phrase for phrase in phrases],
+            [phrase.spaced_phrase for phrase in phrases],
+            [phrase.translation for phrase in phrases],
+            [phrase.audio_id for phrase in phrases],
+        ],
+    )
+    saved = await Phrase.filter(id__in=[row['id'] for row in rows])
+    for phrase in saved:
+        reference_audio.warm(phrase.audio_id)
+    return saved
+
+
+async def delete_phrases(**filters) -> int:
+    """
+    Удаляет фразы вместе с их графиками и записями в blob_store. Запись (AudioFile) удаляется,
+    только если ее file_id больше не использует ни одна фраза.
+
+    :return: Количество удаленных фраз.
+    """
+    phrases = await Phrase.filter(**filters).values('id', 'audio_id', 'plot_image_digest')
+    if not phrases:
+        return 0
+    deleted = await Phrase.filter(id__in=[phrase['id'] for phrase in phrases]).delete()
+    digests = [phrase['plot_image_digest'] for phrase in phrases if phrase['plot_image_digest']]
+    audio_ids = {phrase['audio_id'] for phrase in phrases if phrase['audio_id']}
+    if audio_ids:
+        still_used = set(await Phrase.filter(audio_id__in=audio_ids).values_list('audio_id', flat=True))
+        orphaned = list(audio_ids - still_used)
+        if orphaned:
+            digests += await AudioFile.filter(tg_id__in=orphaned).values_list('audio_digest', flat=True)
+            await AudioFile.filter(tg_id__in=orphaned).delete()
+    # Одинаковое содержимое хранится один раз, release удалит только то, на что никто не ссылается
+    await release(digests)
+    return deleted
@@ -0,0 +1,138 @@
+"""
+Гистограммы прогресса пользователя с кэшированием.
+
+За день меняется только столбец текущего дня, поэтому:
+- ряды прошлых дней всех пользователей считаются один раз за ночь при переносе счетчиков
+  и хранятся в хэше Redis progress_series:{дата} (user_id -> очки за MAX_DAYS - 1 дней до даты);
+- готовая картинка (file_id Telegram после первой отправки или PNG в памяти) переиспользуется
+  для (пользователь, период, дата), пока не изменится дневной счетчик.
+"""
+
+import logging
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Optional
+
+from aiogram.types import BufferedInputFile
+from cachetools import LRUCache
+from redis.asyncio import Redis
+
+from models import UserProgress
+from services.charts import chart_renderer
+from services.entitlements import entitlements
+
+logger = logging.getLogger('default')
+
+PERIODS = (7, 30)
+MAX_DAYS = max(PERIODS)
+SERIES_TTL = 2 * 24 * 60 * 60
+CHART_TTL = 24 * 60 * 60
+SERIES_BATCH_SIZE = 1000
+MAX_LOCAL_IMAGES = 1000
+# Служебное поле хэша: ряды на эту дату посчитаны, отсутствие пользователя означает одни нули
+BUILT_MARKER = '__built__'
+
+
+class ProgressHistograms:
+    def __init__(self):
+        self.redis: Optional[Redis] = None
+        self.images = LRUCache(maxsize=MAX_LOCAL_IMAGES)
+
+    @staticmethod
+    def _series_key(day: date) -> str:
+        return f'progress_series:{day.isoformat()}'
+
+    @staticmethod
+    def _chart_key(user_id: int, days: int) -> str:
+        return f'progress_chart:{user_id}:{days}'
+
+    async def precompute(self, day: date) -> int:
+        """
+        Считает ряды прошлых дней для всех пользователей на дату day.
+
+        :return: Количество пользователей с ненулевым прогрессом.
+        """
+        if self.redis is None:
+            return 0
+        start_date = day - timedelta(days=MAX_DAYS - 1)
+        rows = await UserProgress.filter(
+            date__gte=start_date, date__lt=day, score__gt=0,
+        ).values_list('user_id', 'date', 'score')
+
+        series = defaultdict(lambda: [0] * (MAX_DAYS - 1))
+        for user_id, progress_date, score in rows:
+            series[user_id][(progress_date - start_date).days] = score
+
+        key = self._series_key(day)
+        items = [(user_id, ','.join(map(str, scores))) for user_id, scores in series.items()]
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.delete(key)
+            for i in range(0, len(items), SERIES_BATCH_SIZE):
+                pipe.hset(key, mapping=dict(items[i:i + SERIES_BATCH_SIZE]))
+            pipe.hset(key, BUILT_MARKER, 1)
+            pipe.expire(key, SERIES_TTL)
+            await pipe.execute()
+        logger.debug(f'Progress series precomputed for {day}: {len(items)}')
+        return len(items)
+
+    async def _past_scores(self, user_id: int, days: int, today: date) -> list[int]:
+        if self.redis is not None:
+            value, built = await self.redis.hmget(self._series_key(today), [str(user_id), BUILT_MARKER])
+            if value is not None:
+                return [int(score) for score in value.decode().split(',')][-(days - 1):]
+            if built is not None:
+                return [0] * (days - 1)
+
+        start_date = today - timedelta(days=days - 1)
+        progress_data = await UserProgress.filter(
+            user_id=user_id,
+            date__range=[start_date, today - timedelta(days=1)]
+        ).values_list('date', 'score')
+        scores = [0] * (days - 1)
+        for progress_date, score in progress_data:
+            scores[(progress_date - start_date).days] = score
+        return scores
+
+    async def render(self, user_id: int, days: int, today: date, today_counter: int) -> bytes:
+        scores = await self._past_scores(user_id, days, today) + [today_counter]
+        dates = [today - timedelta(days=days - 1 - i) for i in range(days)]
+        return await chart_renderer.progress_histogram(dates, scores, days)
+
+    async def get_photo(self, user_id: int, days: int = 30) -> tuple[str | BufferedInputFile, str]:
+        """
+        Возвращает гистограмму прогресса пользователя за период: file_id, если такая картинка
+        уже отправлялась, иначе PNG.
+
+        :param days: количество дней для анализа (7 или 30)
+        :return: Фото для answer_photo и версия картинки для remember_file_id.
+        """
+        if days not in PERIODS:
+            raise ValueError("Период должен быть 7 или 30 дней")
+
+        today = datetime.now().date()
+        today_counter = await entitlements.get_day_counter(user_id)
+        version = f'{today.isoformat()}:{today_counter}'
+
+        if self.redis is not None:
+            cached = await self.redis.get(self._chart_key(user_id, days))
+            if cached is not None:
+                cached_version, _, file_id = cached.decode().rpartition(':')
+                if cached_version == version:
+                    return file_id, version
+
+        image = self.images.get((user_id, days, version))
+        if image is None:
+            image = await self.render(user_id, days, today, today_counter)
+            self.images[(user_id, days, version)] = image
+        return BufferedInputFile(image, filename='image.png'), version
+
+    async def remember_file_id(self, user_id: int, days: int, version: str, file_id: str) -> None:
+        """
+        Запоминает file_id отправленной картинки, чтобы не рисовать и не загружать ее повторно.
+        """
+        self.images.pop((user_id, days, version), None)
+        if self.redis is not None:
+            await self.redis.set(self._chart_key(user_id, days), f'{version}:{file_id}', ex=CHART_TTL)
+
+
+progress_histograms = ProgressHistograms()
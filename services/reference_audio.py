@@ -0,0 +1,109 @@
+"""
+Кэш подготовленных оригинальных записей для сравнения произношения.
+
+Запись скачивается и обрабатывается (декодирование, обрезка тишины, нормализация) один раз -
+при сохранении фразы или при первой попытке пользователя. Результат хранится в .npy (float32)
+в каталоге REFERENCE_AUDIO_DIR и открывается через memory map, перед диском стоит LRU в памяти.
+"""
+
+import asyncio
+import hashlib
+import io
+import logging
+import os
+from pathlib import Path
+from typing import Optional
+
+import librosa
+import numpy as np
+from cachetools import LRUCache
+from dotenv import load_dotenv
+from pydub import AudioSegment
+
+from external_services.visualizer import prepare_signal
+from services.media import media_fetcher
+
+load_dotenv()
+logger = logging.getLogger('default')
+
+REFERENCE_AUDIO_DIR = Path(os.getenv('REFERENCE_AUDIO_DIR', 'temp/reference_audio'))
+# Частота, с которой librosa.load загружает файлы по умолчанию
+REFERENCE_SAMPLE_RATE = 22050
+MAX_MEMORY_ENTRIES = 256
+
+
+def decode_ogg(audio: bytes, sample_rate: int = REFERENCE_SAMPLE_RATE) -> np.ndarray:
+    """
+    Декодирует ogg в моно-сигнал float32 с заданной частотой дискретизации.
+    """
+    segment = AudioSegment.from_file(io.BytesIO(audio), format='ogg').set_channels(1)
+    samples = np.array(segment.get_array_of_samples(), dtype=np.float32)
+    samples /= float(1 << (8 * segment.sample_width - 1))
+    if segment.frame_rate != sample_rate:
+        samples = librosa.resample(samples, orig_sr=segment.frame_rate, target_sr=sample_rate)
+    return samples
+
+
+class ReferenceAudioCache:
+    def __init__(self, directory: Path = REFERENCE_AUDIO_DIR, sample_rate: int = REFERENCE_SAMPLE_RATE,
+                 max_entries: int = MAX_MEMORY_ENTRIES):
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.memory = LRUCache(maxsize=max_entries)
+        self._pending: dict[str, asyncio.Task] = {}
+        self._background: set[asyncio.Task] = set()
+
+    def _path(self, audio_id: str) -> Path:
+        # file_id Telegram длинный и может содержать символы, неудобные для имени файла
+        digest = hashlib.sha1(audio_id.encode()).hexdigest()
+        return self.directory / f'{digest}_{self.sample_rate}.npy'
+
+    def _prepare(self, audio: bytes, path: Path) -> np.ndarray:
+        signal = prepare_signal(decode_ogg(audio, self.sample_rate), self.sample_rate)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Пишем во временный файл и переименовываем, чтобы параллельный читатель не увидел недописанный
+        tmp_path = path.with_suffix('.tmp')
+        with open(tmp_path, 'wb') as f:
+            np.save(f, signal)
+        os.replace(tmp_path, path)
+        return np.load(path, mmap_mode='r')
+
+    async def _build(self, audio_id: str) -> np.ndarray:
+        path = self._path(audio_id)
+        if path.exists():
+            return np.load(path, mmap_mode='r')
+        audio = await media_fetcher.fetch(audio_id)
+        return await asyncio.to_thread(self._prepare, audio, path)
+
+    async def get(self, audio_id: str) -> tuple[np.ndarray, int]:
+        """
+        Возвращает подготовленный оригинальный сигнал (только для чтения) и его частоту дискретизации.
+        """
+        signal = self.memory.get(audio_id)
+        if signal is None:
+            # Одновременные запросы одной записи обрабатываются один раз
+            task = self._pending.get(audio_id)
+            if task is None:
+                task = self._pending[audio_id] = asyncio.create_task(self._build(audio_id))
+                task.add_done_callback(lambda _: self._pending.pop(audio_id, None))
+            signal = await asyncio.shield(task)
+            self.memory[audio_id] = signal
+        return signal, self.sample_rate
+
+    async def _warm(self, audio_id: str) -> None:
+        try:
+            await self.get(audio_id)
+        except Exception as e:
+            logger.error(f"Ошибка подготовки оригинальной записи {audio_id}: {e}")
+
+    def warm(self, audio_id: Optional[str]) -> None:
+        """
+        Готовит запись в фоне; вызывается после сохранения фразы с озвучкой.
+        """
+        if audio_id and audio_id not in self.memory and audio_id not in self._pending:
+            task = asyncio.create_task(self._warm(audio_id))
+            self._background.add(task)
+            task.add_done_callback(self._background.discard)
+
+
+reference_audio = ReferenceAudioCache()
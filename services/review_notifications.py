@@ -0,0 +1,113 @@
+import logging
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Iterable
+
+import pytz
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
+from tortoise.functions import Count
+from tortoise.transactions import in_transaction
+
+from models import ReviewStatus
+from services.delivery import OutgoingMessage, delivery
+from services.i18n import get_translator_hub
+from services.review_queue import review_queue
+
+logger = logging.getLogger('default')
+
+# Размер пачки id пользователей для одного IN (...) запроса
+BATCH_SIZE = 1000
+# Статусы, просроченные дольше этого срока, удаляются после уведомления
+STALE_REVIEW_AGE = timedelta(days=3)
+
+
+@dataclass
+class NotificationReport:
+    users_processed: int = 0
+    users_notified: int = 0
+    duration: float = 0.0
+
+
+def _chunks(items: list, size: int = BATCH_SIZE) -> Iterable[list]:
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+async def find_users_with_due_reviews(now: datetime) -> list[dict]:
+    """
+    Одним сгруппированным запросом находит пользователей с включенными уведомлениями,
+    у которых есть фразы для повторения.
+
+    :param now: Текущее время (UTC).
+    :return: Список словарей с ключами user_id, language и due_count.
+    """
+    return await ReviewStatus.filter(
+        note=False,
+        next_review__lt=now,
+        user__notifications=True,
+    ).annotate(
+        due_count=Count('id'),
+    ).group_by(
+        'user_id', 'user__language',
+    ).values(
+        'user_id', 'due_count', language='user__language',
+    )
+
+
+async def mark_notified(user_ids: list[int], now: datetime) -> None:
+    """
+    Массово помечает статусы повторения уведомленных пользователей
+    и удаляет давно просроченные.
+
+    :param user_ids: ID пользователей, которым ушло уведомление.
+    :param now: Время, на которое выбирались статусы.
+    """
+    stale_before = now - STALE_REVIEW_AGE
+    pruned_chunks = []
+    async with in_transaction():
+        for chunk in _chunks(user_ids):
+            deleted = await ReviewStatus.filter(
+                user_id__in=chunk, note=False, next_review__lt=stale_before,
+            ).delete()
+            if deleted:
+                pruned_chunks.append(chunk)
+            await ReviewStatus.filter(
+                user_id__in=chunk, note=False, next_review__lt=now,
+            ).update(note=True)
+    # Удаленные фразы снова считаются неизученными - очереди повторений пересоберутся из базы
+    for chunk in pruned_chunks:
+        await review_queue.invalidate(chunk)
+
+
+async def run_review_notifications() -> NotificationReport:
+    """
+    Один прогон рассылки напоминаний об интервальных повторениях.
+    """
+    started = time.monotonic()
+    report = NotificationReport()
+    now = datetime.now(pytz.UTC)
+
+    rows = await find_users_with_due_reviews(now)
+    report.users_processed = len(rows)
+
+    if rows:
+        translator_hub = get_translator_hub()
+
+        messages = []
+        for row in rows:
+            translator = translator_hub.get_translator_by_locale(row['language'])
+            button = InlineKeyboardButton(text=translator.get('next'), callback_data="open_interval_dialog")
+            keyboard = InlineKeyboardMarkup(inline_keyboard=[[button]])
+            messages.append(OutgoingMessage(row['user_id'], translator.get('practice-time'),
+                                            {'reply_markup': keyboard}))
+
+        results = await delivery.send_many(messages)
+        notified = [row['user_id'] for row, delivered in zip(rows, results) if delivered]
+        report.users_notified = len(notified)
+        await mark_notified(notified, now)
+
+    report.duration = time.monotonic() - started
+    logger.info(f'Interval notifications: processed {report.users_processed} users, '
+                f'notified {report.users_notified} in {report.duration:.2f}s; delivery: {delivery.stats.as_dict()}')
+    return report
@@ -0,0 +1,131 @@
+"""
+Очередь интервальных повторений пользователя в Redis.
+
+Для каждого пользователя хранятся:
+- review_queue:{user_id} - sorted set, член - id фразы, score - время next_review (unix timestamp);
+- review_counts:{user_id} - хэш id фразы -> review_count;
+- review_queue:built:{user_id} - метка, что очередь собрана из ReviewStatus.
+
+Если метки нет (холодный старт, истек TTL, очередь сброшена), очередь пересобирается из базы
+при первом обращении. Все ключи пользователя живут одинаковый TTL, продлеваемый при каждом ответе.
+"""
+
+import logging
+from datetime import datetime
+from typing import Iterable, Optional
+
+from redis.asyncio import Redis
+
+from config_data.config import INTERVALS
+from models import ReviewStatus
+
+logger = logging.getLogger('default')
+
+QUEUE_TTL = 7 * 24 * 60 * 60
+
+
+class ReviewQueue:
+    def __init__(self, ttl: int = QUEUE_TTL):
+        self.ttl = ttl
+        self.redis: Optional[Redis] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.redis is not None
+
+    @staticmethod
+    def _keys(user_id: int) -> tuple[str, str, str]:
+        return f'review_queue:{user_id}', f'review_counts:{user_id}', f'review_queue:built:{user_id}'
+
+    async def rebuild(self, user_id: int) -> int:
+        """
+        Собирает очередь пользователя заново из ReviewStatus.
+
+        :return: Количество фраз в очереди.
+        """
+        statuses = await ReviewStatus.filter(
+            user_id=user_id,
+            phrase__user_id=user_id,
+            phrase__category__public=False,
+            review_count__lt=len(INTERVALS),
+            next_review__isnull=False,
+        ).values_list('phrase_id', 'review_count', 'next_review')
+
+        queue_key, counts_key, built_key = self._keys(user_id)
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.delete(queue_key, counts_key)
+            if statuses:
+                pipe.zadd(queue_key, {phrase_id: next_review.timestamp() for phrase_id, _, next_review in statuses})
+                pipe.hset(counts_key, mapping={phrase_id: review_count for phrase_id, review_count, _ in statuses})
+                pipe.expire(queue_key, self.ttl)
+                pipe.expire(counts_key, self.ttl)
+            pipe.set(built_key, 1, ex=self.ttl)
+            await pipe.execute()
+        logger.debug(f'Review queue rebuilt for user {user_id}: {len(statuses)}')
+        return len(statuses)
+
+    async def ensure(self, user_id: int) -> None:
+        if not await self.redis.exists(self._keys(user_id)[2]):
+            await self.rebuild(user_id)
+
+    async def next_due(self, user_id: int, now: datetime,
+                       exclude_phrase_id: Optional[int] = None) -> Optional[tuple[int, int]]:
+        """
+        Фраза с самой ранней наступившей датой повторения.
+
+        :param exclude_phrase_id: Фраза, которую пропускаем (последняя заданная).
+        :return: (id фразы, review_count) или None, если повторять нечего.
+        """
+        await self.ensure(user_id)
+        queue_key, counts_key, _ = self._keys(user_id)
+        # Берем две фразы: первая может оказаться исключенной
+        due = await self.redis.zrangebyscore(queue_key, '-inf', now.timestamp(), start=0, num=2)
+        for member in due:
+            phrase_id = int(member)
+            if phrase_id != exclude_phrase_id:
+                review_count = await self.redis.hget(counts_key, phrase_id)
+                return phrase_id, int(review_count or 0)
+        return None
+
+    async def get_review_count(self, user_id: int, phrase_id: int) -> Optional[int]:
+        """
+        :return: review_count фразы или None, если фраза еще не изучалась.
+        """
+        await self.ensure(user_id)
+        review_count = await self.redis.hget(self._keys(user_id)[1], phrase_id)
+        return int(review_count) if review_count is not None else None
+
+    async def update(self, user_id: int, phrase_id: int, review_count: int, next_review: datetime) -> None:
+        """
+        Обновляет фразу в очереди после ответа. Несобранную очередь не трогаем -
+        она соберется из базы при следующем обращении.
+        """
+        queue_key, counts_key, built_key = self._keys(user_id)
+        try:
+            if not await self.redis.exists(built_key):
+                return
+            async with self.redis.pipeline(transaction=True) as pipe:
+                pipe.zadd(queue_key, {phrase_id: next_review.timestamp()})
+                pipe.hset(counts_key, phrase_id, review_count)
+                for key in (queue_key, counts_key, built_key):
+                    pipe.expire(key, self.ttl)
+                await pipe.execute()
+        except Exception as e:
+            logger.error(f"Ошибка обновления очереди повторений пользователя {user_id}: {e}")
+            await self.invalidate([user_id])
+
+    async def invalidate(self, user_ids: Iterable[int]) -> None:
+        """
+        Сбрасывает очереди пользователей; вызывается после удаления фраз или статусов повторения.
+        """
+        if self.redis is None:
+            return
+        keys = [key for user_id in user_ids for key in self._keys(user_id)]
+        if keys:
+            try:
+                await self.redis.delete(*keys)
+            except Exception as e:
+                logger.error(f"Ошибка сброса очередей повторений: {e}")
+
+
+review_queue = ReviewQueue()
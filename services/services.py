@@ -1,4 +1,4 @@
-import io
+import asyncio
 import logging
 import os
 import random
@@ -6,16 +6,18 @@ import re
 import string
 from datetime import date, timedelta, datetime
 
-import pytz
 from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
 from dotenv import load_dotenv
-from matplotlib import pyplot as plt
 from tortoise.exceptions import IntegrityError
 from tortoise.expressions import Q
-
-from bot_init import bot
-from models import Subscription, TypeSubscription, User, ReviewStatus, UserProgress
-from services.i18n import create_translator_hub
+from tortoise.transactions import in_transaction
+
+from models import Subscription, TypeSubscription, User, UserProgress
+from services.delivery import OutgoingMessage, delivery
+from services.entitlements import entitlements
+from services.i18n import get_translator_hub
+from services.progress_histograms import progress_histograms
+from services.review_notifications import run_review_notifications
 from services.yookassa import auto_renewal_subscription_command
 
 load_dotenv()
@@ -86,10 +88,11 @@ async def check_subscriptions():
             # Установка типа подписки на "Free"
             subscription.type_subscription = free_subscription_type
             await subscription.save()
+            await entitlements.invalidate_tier(subscription.user_id)
 
             user = await User.get(id=subscription.user_id)
             user_locale = user.language
-            translator_hub = create_translator_hub()
+            translator_hub = get_translator_hub()
             translator = translator_hub.get_translator_by_locale(user_locale)
             subscribe = translator.get('subscribe-button')
             use_free = translator.get('use-free')
@@ -101,7 +104,7 @@ async def check_subscriptions():
 
             # Отправка сообщения с кнопкой
             subscription_expired = translator.get('subscription-expired')
-            # await bot.send_message(chat_id=subscription.user_id, text=subscription_expired, reply_markup=keyboard)
+            # await delivery.send(subscription.user_id, subscription_expired, reply_markup=keyboard)
     except Exception as e:
         logger.error(f"Error in check_subscriptions: {e}")
 
@@ -118,54 +121,63 @@ async def auto_renewal_subscriptions():
                                                          (~Q(type_subscription=free_subscription_type) |
                                                           ~Q(type_subscription=free_trial_subscription_type)))
 
-        for subscription in ending_subscriptions:
-            if subscription.payment_token:
-                await auto_renewal_subscription_command(subscription.id)
+        # Запросы к YooKassa идут параллельно, их число ограничивает yookassa_gateway
+        await asyncio.gather(*(auto_renewal_subscription_command(subscription.id)
+                               for subscription in ending_subscriptions if subscription.payment_token))
     except Exception as e:
         logger.error(f"Error in auto_renewal_subscriptions: {e}")
 
 
 async def interval_notifications():
-    users = await User.filter(notifications=True).all()
     logger.debug('Interval notifications start')
-    logger.debug(f'Interval notifications users: {users}')
-    translator_hub = create_translator_hub()
+    report = await run_review_notifications()
+    return report
 
-    for user in users:
-        user_locale = user.language
-        now = datetime.now(pytz.UTC)
-        review_statuses = await ReviewStatus.filter(
-            Q(user_id=user.id) &
-            Q(note=False) &
-            Q(next_review__lt=now)
-        ).all()
-        logger.debug(f'Interval notifications review statuses: {review_statuses}')
-
-        if review_statuses:
-            # Отправляем сообщение пользователю
-            translator = translator_hub.get_translator_by_locale(user_locale)
-            practice_time = translator.get('practice-time')
-            next_practice = translator.get('next')
 
-            try:
-                button = InlineKeyboardButton(text=next_practice, callback_data="open_interval_dialog")
-                keyboard = InlineKeyboardMarkup(inline_keyboard=[[button]])
-                # Отправка сообщения с кнопкой
-                await bot.send_message(chat_id=user.id, text=practice_time, reply_markup=keyboard)
-                # Обновляем статусы
-                await ReviewStatus.filter(id__in=[status.id for status in review_statuses]).update(note=True)
-
-                three_days_ago = now - timedelta(days=3)
-                await ReviewStatus.filter(id__in=[status.id for status in review_statuses],
-                                          next_review__lt=three_days_ago).delete()
+async def auto_reset_daily_counter(bulk: bool = True) -> int:
+    """
+    Переносит дневные счетчики пользователей в UserProgress и обнуляет их.
+    Счетчики из Redis предварительно записываются в базу, после переноса
+    готовятся ряды прошлых дней для гистограмм прогресса.
 
-            except Exception as e:
-                logger.error(f"Не удалось отправить сообщение пользователю {user.id}: {e}")
+    :param bulk: True - одним upsert и одним update в транзакции, False - построчно для каждого пользователя.
+    :return: Количество перенесенных записей.
+    """
+    today = datetime.now().date()
+    async with entitlements.rollover():
+        if bulk:
+            affected = await rollover_daily_counters(today)
+        else:
+            affected = await _reset_daily_counter_per_user(today)
+    logger.debug(f'Daily counters rolled over: {affected}')
+    # Ряды прошлых дней для гистограмм прогресса на завтра уже не изменятся
+    try:
+        await progress_histograms.precompute(today + timedelta(days=1))
+    except Exception as e:
+        logger.error(f"Ошибка подготовки рядов прогресса: {e}")
+    return affected
+
+
+async def rollover_daily_counters(today: date) -> int:
+    async with in_transaction() as connection:
+        _, rows = await connection.execute_query(
+            '''
+            WITH upserted AS (
+                INSERT INTO userprogress (user_id, date, score)
+                SELECT id, $1, day_counter FROM "user"
+                ON CONFLICT (user_id, date) DO UPDATE SET score = EXCLUDED.score
+                RETURNING 1
+            )
+            SELECT count(*) AS affected FROM upserted
+            ''',
+            [today],
+        )
+        await connection.execute_query('UPDATE "user" SET day_counter = 0 WHERE day_counter <> 0')
+    return rows[0]['affected']
 
 
-async def auto_reset_daily_counter():
+async def _reset_daily_counter_per_user(today: date) -> int:
     users = await User.all()
-    today = datetime.now().date()
     for user in users:
         try:
             # Попытка создать новую запись
@@ -188,69 +200,11 @@ async def auto_reset_daily_counter():
         # Опционально: сбрасываем day_counter пользователя
         user.day_counter = 0
         await user.save()
+    return len(users)
 
-    logger.debug('=============================================')
-
-
-async def build_user_progress_histogram(user_id: int, days: int = 30):
-    """
-    Строит гистограмму прогресса пользователя за указанный период.
-    :param user_id: ID пользователя
-    :param days: количество дней для анализа (7 или 30)
-    :return: объект BytesIO с изображением гистограммы
-    """
-    if days not in [7, 30]:
-        raise ValueError("Период должен быть 7 или 30 дней")
-
-    end_date = datetime.now().date()
-    start_date = end_date - timedelta(days=days - 1)
-
-    user = await User.get(id=user_id)
-    today_counter = user.day_counter
 
-    # Получаем данные о прогрессе пользователя
-    progress_data = await UserProgress.filter(
-        user_id=user_id,
-        date__range=[start_date, end_date]
-    ).values('date', 'score')
-
-    # Создаем словарь для хранения данных за каждый день
-    daily_scores = {start_date + timedelta(days=i): 0 for i in range(days)}
-
-    # Заполняем словарь данными из базы
-    for item in progress_data:
-        daily_scores[item['date']] = item['score']
-
-    # Добавляем данные текущего дня
-    daily_scores[end_date] = today_counter
-
-    # Подготавливаем данные для построения графика
-    dates = list(daily_scores.keys())
-    scores = list(daily_scores.values())
-
-    # Создаем график
-    plt.figure(figsize=(12, 6))
-    bars = plt.bar(dates, scores, align='center', alpha=0.8)
-    plt.title(f"Прогресс за последние {days} дней")
-    plt.xlabel("Дата")
-    plt.ylabel("Количество выполненных заданий")
-    plt.xticks(rotation=45)
-
-    # Добавляем текстовые метки с точными значениями над каждым столбцом
-    for bar in bars:
-        height = bar.get_height()
-        plt.text(bar.get_x() + bar.get_width() / 2., height,
-                 f'{height:.0f}', ha='center', va='bottom')
-
-    plt.tight_layout()
-
-    # Сохраняем график в BytesIO объект
-    img_buf = io.BytesIO()
-    plt.savefig(img_buf, format='png')
-    img_buf.seek(0)
-    plt.close()
-
-    return img_buf
+async def flush_day_counters() -> int:
+    return await entitlements.flush_counters()
 
 
 async def notify_admins(user: User, message_prefix: str):
@@ -267,8 +221,48 @@ async def notify_admins(user: User, message_prefix: str):
         f'[last name: {user.last_name}]\n'
         f'[username: {user.username}]\n'
     )
+    messages = [OutgoingMessage(admin_id, message_for_admin) for admin_id in map(str.strip, admin_ids.split(','))]
+    # Вызывается из обработчиков пользователя (/start), поэтому не ждет в очереди рассылки
+    results = await delivery.send_many(messages, priority=True)
+    if not all(results):
+        logger.error("Ошибка отправки уведомления администраторам")
+
+
+async def _benchmark_daily_counter_reset(users_count: int = 10000):
+    """
+    Сравнивает построчный и пакетный перенос дневных счетчиков на заполненной тестовой базе.
+    Redis не трогается: вызываются только функции переноса в базе, без entitlements.rollover и гистограмм.
+    """
+    import time
+
+    from tortoise import Tortoise
+
+    from db.config import init_benchmark_db
+
+    await init_benchmark_db()
+    today = datetime.now().date()
     try:
-        for admin_id in map(str.strip, admin_ids.split(',')):
-            await bot.send_message(chat_id=admin_id, text=message_for_admin)
-    except Exception as e:
-        logger.error(f"Ошибка отправки уведомления администраторам: {e}")
+        await UserProgress.all().delete()
+        await User.all().delete()
+        await User.bulk_create([User(id=user_id, day_counter=user_id % 60) for user_id in range(1, users_count + 1)],
+                               batch_size=1000)
+
+        for bulk in (False, True):
+            # Второй прогон за тот же день проходит через ветку обновления существующих записей
+            for run in ('insert', 'update'):
+                await Tortoise.get_connection('default').execute_query(
+                    'UPDATE "user" SET day_counter = id % 60')
+                started = time.monotonic()
+                if bulk:
+                    affected = await rollover_daily_counters(today)
+                else:
+                    affected = await _reset_daily_counter_per_user(today)
+                elapsed = time.monotonic() - started
+                print(f"{'bulk' if bulk else 'loop':<4} {run:<6} users={affected:<6} {elapsed:.3f}s")
+            await UserProgress.all().delete()
+    finally:
+        await Tortoise.close_connections()
+
+
+if __name__ == '__main__':
+    asyncio.run(_benchmark_daily_counter_reset())
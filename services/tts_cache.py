@@ -0,0 +1,109 @@
+"""
+Кэш озвучки Google TTS.
+
+Ключ - хэш (голос, текст, настройки аудио). Для каждого ключа хранятся синтезированный OGG
+и file_id Telegram после первой отправки, поэтому повторные фразы разных пользователей
+не доходят до API и не загружаются в Telegram повторно. При промахе Redis запись
+ищется в tts_store, прежде чем обращаться к API.
+"""
+
+import asyncio
+import logging
+from typing import Optional
+
+from aiogram.types import BufferedInputFile
+from cachetools import LRUCache
+from redis.asyncio import Redis
+
+from external_services.google_cloud_services import GoogleTextToSpeech, google_tts
+from services.tts_store import tts_store
+
+logger = logging.getLogger('default')
+
+CACHE_TTL = 30 * 24 * 60 * 60
+MAX_LOCAL_ENTRIES = 500
+
+
+class TextToSpeechCache:
+    def __init__(self, client: GoogleTextToSpeech = google_tts, ttl: int = CACHE_TTL):
+        self.client = client
+        self.ttl = ttl
+        self.audio = LRUCache(maxsize=MAX_LOCAL_ENTRIES)
+        self.redis: Optional[Redis] = None
+        self._pending: dict[str, asyncio.Task] = {}
+
+    @staticmethod
+    def _key(digest: str) -> str:
+        return f'tts:{digest}'
+
+    async def _load_or_synthesize(self, digest: str, text: str) -> bytes:
+        if self.redis is not None:
+            try:
+                audio = await self.redis.hget(self._key(digest), 'audio')
+            except Exception as e:
+                logger.error(f"Ошибка чтения озвучки {digest} из Redis: {e}")
+                audio = None
+            if audio is not None:
+                return audio
+
+        audio = await tts_store.get_audio(digest)
+        if audio is None:
+            audio = await self.client.synthesize(text)
+        if self.redis is not None:
+            try:
+                await self.redis.hset(self._key(digest), 'audio', audio)
+                await self.redis.expire(self._key(digest), self.ttl)
+            except Exception as e:
+                logger.error(f"Ошибка записи озвучки {digest} в Redis: {e}")
+        return audio
+
+    async def synthesize(self, text: str) -> bytes:
+        """
+        Возвращает OGG с озвучкой текста, обращаясь к API только при промахе кэша.
+        """
+        digest = self.client.cache_key(text)
+        audio = self.audio.get(digest)
+        if audio is None:
+            # Одновременные запросы одной фразы синтезируются один раз
+            task = self._pending.get(digest)
+            if task is None:
+                task = self._pending[digest] = asyncio.create_task(self._load_or_synthesize(digest, text))
+                task.add_done_callback(lambda _: self._pending.pop(digest, None))
+            audio = await asyncio.shield(task)
+            self.audio[digest] = audio
+        return audio
+
+    async def get_file_id(self, text: str) -> Optional[str]:
+        if self.redis is None:
+            return None
+        try:
+            file_id = await self.redis.hget(self._key(self.client.cache_key(text)), 'file_id')
+        except Exception as e:
+            logger.error(f"Ошибка чтения file_id озвучки из Redis: {e}")
+            return None
+        return file_id.decode() if file_id is not None else None
+
+    async def remember_file_id(self, text: str, file_id: str) -> None:
+        """
+        Запоминает file_id отправленной озвучки; вызывается после answer_voice с BufferedInputFile.
+        """
+        if self.redis is None:
+            return
+        key = self._key(self.client.cache_key(text))
+        try:
+            await self.redis.hset(key, 'file_id', file_id)
+            await self.redis.expire(key, self.ttl)
+        except Exception as e:
+            logger.error(f"Ошибка записи file_id озвучки в Redis: {e}")
+
+    async def voice(self, text: str, filename: str = 'voice_tts.ogg') -> str | BufferedInputFile:
+        """
+        Озвучка для answer_voice: file_id, если она уже отправлялась, иначе файл.
+        """
+        file_id = await self.get_file_id(text)
+        if file_id:
+            return file_id
+        return BufferedInputFile(await self.synthesize(text), filename=filename)
+
+
+tts_cache = TextToSpeechCache()
@@ -0,0 +1,72 @@
+"""
+Постоянное хранилище озвучки для тренажера аудирования.
+
+Поиск идет по индексу digest и читает только voice_id, запись загружается из blob_store
+лишь по запросу. Записи давно не использованных фраз удаляются, file_id при этом остается.
+"""
+
+import logging
+from datetime import datetime
+from typing import Optional
+
+import pytz
+from tortoise import Tortoise
+from tortoise.transactions import in_transaction
+
+from models import TextToSpeech, TextToSpeechAudio
+from services.blob_store import blob_store, release
+
+logger = logging.getLogger('default')
+
+# Сколько записей озвучки держим в базе
+MAX_STORED_AUDIO = 10000
+
+
+class TextToSpeechStore:
+    async def get_file_id(self, digest: str) -> Optional[str]:
+        """
+        Возвращает file_id озвучки и отмечает ее использование.
+        """
+        _, rows = await Tortoise.get_connection('default').execute_query(
+            'UPDATE texttospeech SET last_used_at = $1 WHERE digest = $2 RETURNING voice_id',
+            [datetime.now(pytz.UTC), digest],
+        )
+        return rows[0]['voice_id'] if rows else None
+
+    async def get_audio(self, digest: str) -> Optional[bytes]:
+        voice_digest = await TextToSpeechAudio.filter(tts__digest=digest).first().values_list(
+            'voice_digest', flat=True)
+        return await blob_store.get(voice_digest) if voice_digest else None
+
+    async def save(self, digest: str, text: str, user_id: int, file_id: str, audio: Optional[bytes] = None) -> None:
+        voice_digest = await blob_store.put(audio) if audio else None
+        async with in_transaction():
+            tts, created = await TextToSpeech.get_or_create(
+                digest=digest, defaults={'voice_id': file_id, 'user_id': user_id, 'text': text})
+            if not created:
+                return
+            if voice_digest:
+                await TextToSpeechAudio.create(tts=tts, voice_digest=voice_digest)
+
+    async def evict(self, keep: int = MAX_STORED_AUDIO) -> int:
+        """
+        Удаляет записи озвучки сверх keep, начиная с давно не использованных.
+
+        :return: Количество удаленных записей.
+        """
+        stale_ids = await TextToSpeech.filter(audio__id__isnull=False).order_by('-last_used_at').offset(
+            keep).values_list('id', flat=True)
+        if not stale_ids:
+            return 0
+        voice_digests = await TextToSpeechAudio.filter(tts_id__in=stale_ids).values_list('voice_digest', flat=True)
+        deleted = await TextToSpeechAudio.filter(tts_id__in=stale_ids).delete()
+        released = await release(voice_digests)
+        logger.debug(f'TTS audio evicted: {deleted}, blobs released: {released}')
+        return deleted
+
+
+tts_store = TextToSpeechStore()
+
+
+async def evict_tts_audio() -> int:
+    return await tts_store.evict()
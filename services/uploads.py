@@ -0,0 +1,110 @@
+"""
+Загрузка записей фраз, присланных пользователем.
+
+Файл скачивается из Telegram в память, при необходимости перекодируется в OGG OPUS через
+канал ffmpeg (без временных файлов) и кладется во временное хранилище upload_store.
+В состоянии диалога остаются только digest записи и file_id голосового сообщения.
+При сохранении фразы запись переносится в blob_store (в одной транзакции с фразой), а загрузка
+удаляется только после фиксации транзакции. Брошенные загрузки удаляются по расписанию
+(purge_stale_uploads).
+"""
+
+import asyncio
+import logging
+import os
+import time
+from pathlib import Path
+from typing import Optional
+
+from aiogram.types import BufferedInputFile, Message
+from dotenv import load_dotenv
+
+from models import AudioFile
+from services.blob_store import LocalBlobStore, blob_store
+from services.media import media_fetcher
+
+load_dotenv()
+logger = logging.getLogger('default')
+
+UPLOADS_DIR = Path(os.getenv('UPLOADS_DIR', 'temp/uploads'))
+UPLOAD_TTL = 24 * 60 * 60
+
+upload_store = LocalBlobStore(UPLOADS_DIR)
+
+
+class AudioConversionError(Exception):
+    pass
+
+
+async def convert_to_ogg_opus(data: bytes) -> bytes:
+    """
+    Перекодирует запись в OGG OPUS через stdin/stdout ffmpeg.
+    """
+    process = await asyncio.create_subprocess_exec(
+        'ffmpeg', '-hide_banner', '-loglevel', 'error', '-i', 'pipe:0',
+        '-vn', '-c:a', 'libopus', '-f', 'ogg', 'pipe:1',
+        stdin=asyncio.subprocess.PIPE,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    output, error = await process.communicate(data)
+    if process.returncode != 0 or not output:
+        raise AudioConversionError(error.decode(errors='replace').strip())
+    return output
+
+
+async def receive_audio(message: Message, caption: str) -> tuple[str, str]:
+    """
+    Принимает голосовое сообщение или аудиофайл.
+    Аудиофайл перекодируется и отправляется обратно голосовым, чтобы получить его file_id.
+
+    :return: digest записи в upload_store и file_id голосового сообщения
+    """
+    if message.voice:
+        # Голосовые сообщения Telegram уже в OGG OPUS
+        audio = await media_fetcher.fetch(message.voice.file_id)
+        file_id = message.voice.file_id
+    else:
+        audio = await convert_to_ogg_opus(await media_fetcher.fetch(message.audio.file_id))
+        msg = await message.answer_voice(voice=BufferedInputFile(audio, filename='voice.ogg'), caption=caption)
+        file_id = msg.voice.file_id
+    return await upload_store.put(audio), file_id
+
+
+async def persist_upload(digest: str, tg_id: str) -> Optional[AudioFile]:
+    """
+    Переносит запись из временного хранилища в blob_store. Загрузка остается в upload_store,
+    пока вызывающий не удалит ее через discard_upload, например после фиксации транзакции.
+    """
+    audio = await upload_store.get(digest)
+    if audio is None:
+        logger.warning(f'Загрузка {digest} уже удалена')
+        return None
+    return await AudioFile.create(tg_id=tg_id, audio_digest=await blob_store.put(audio))
+
+
+async def discard_upload(digest: str) -> None:
+    await upload_store.delete(digest)
+
+
+def _purge(root: Path, max_age: float) -> int:
+    if not root.exists():
+        return 0
+    deadline = time.time() - max_age
+    removed = 0
+    for path in root.rglob('*'):
+        if path.is_file() and path.stat().st_mtime < deadline:
+            path.unlink(missing_ok=True)
+            removed += 1
+    return removed
+
+
+async def purge_stale_uploads(max_age: float = UPLOAD_TTL) -> int:
+    """
+    Удаляет загрузки, которые так и не были сохранены.
+
+    :return: Количество удаленных файлов.
+    """
+    removed = await asyncio.to_thread(_purge, upload_store.root, max_age)
+    logger.debug(f'Stale uploads removed: {removed}')
+    return removed
@@ -1,4 +1,4 @@
-import json
+import ipaddress
 import logging
 import os
 from typing import Optional
@@ -6,25 +6,21 @@ from typing import Optional
 from aiogram import Router
 from aiogram.types import CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
 from aiohttp import web
-from dateutil.relativedelta import relativedelta
 from dotenv import load_dotenv
-from yookassa import Configuration, Payment
 
-from bot_init import bot, bg_factory
+from external_services.yookassa_gateway import yookassa_gateway
 from models import Payment as PaymentModel, Subscription
 from models import TypeSubscription, User
-from states import SubscribeSG
+from services.payment_events import REQUIRED_FIELDS, payment_events
 
 load_dotenv()
 router = Router()
 logger = logging.getLogger('default')
 
-account_id = os.getenv('YOOKASSA_ACCOUNT_ID')
-secret_key = os.getenv('YOOKASSA_SECRET_KEY')
 redirect_uri = os.getenv('RETURN_URL')
-
-Configuration.account_id = account_id
-Configuration.secret_key = secret_key
+# Адреса, с которых принимаются уведомления о платежах, через запятую (пусто - любые)
+webhook_networks = [ipaddress.ip_network(network.strip())
+                    for network in os.getenv('YOOKASSA_WEBHOOK_IPS', '').split(',') if network.strip()]
 
 
 def get_client_ip(request: web.Request) -> Optional[str]:
@@ -56,6 +52,16 @@ def get_client_ip(request: web.Request) -> Optional[str]:
     return ip
 
 
+def is_allowed_ip(ip: Optional[str]) -> bool:
+    if not ip:
+        return False
+    try:
+        address = ipaddress.ip_address(ip)
+    except ValueError:
+        return False
+    return any(address in network for network in webhook_networks)
+
+
 async def subscribe_command(callback: CallbackQuery, description: str):
     try:
         type_subscription = await TypeSubscription.get(payload=callback.data)
@@ -64,9 +70,11 @@ async def subscribe_command(callback: CallbackQuery, description: str):
         payload = callback.data
         amount_value = type_subscription.price
 
-        order = Payment.create({
+        # Ключ привязан к нажатию: повтор запроса после сетевой ошибки не создает второй платеж,
+        # а новое нажатие кнопки создает новый
+        order_data = await yookassa_gateway.create_payment({
             "amount": {
-                "value": amount_value,
+                "value": str(amount_value),
                 "currency": "RUB"
             },
             "confirmation": {
@@ -80,8 +88,7 @@ async def subscribe_command(callback: CallbackQuery, description: str):
                 'userId': callback.from_user.id,
                 'payload': payload,
             },
-        })
-        order_data = json.loads(order.json())
+        }, idempotency_key=f'subscribe-{callback.id}')
 
         await PaymentModel.create(
             user_id=callback.from_user.id,
@@ -98,7 +105,7 @@ async def subscribe_command(callback: CallbackQuery, description: str):
         user.payment_method = order_data.get('id')
         await user.save()
 
-        button = InlineKeyboardButton(text="Оплатить подписку", url=order.confirmation.confirmation_url)
+        button = InlineKeyboardButton(text="Оплатить подписку", url=order_data['confirmation']['confirmation_url'])
         keyboard = InlineKeyboardMarkup(inline_keyboard=[[button]])
 
         await callback.message.answer('<a href="https://www.google.com">договор оферты</a>\nДля оплаты подписки перейдите по ссылке:', reply_markup=keyboard)
@@ -115,9 +122,10 @@ async def auto_renewal_subscription_command(subscription_id):
         payment_method_id = subscription.payment_token
         user_id = subscription.user_id
 
-        order = Payment.create({
+        # Ключ привязан к сроку подписки: повторный запуск продления в тот же период не спишет деньги дважды
+        order_data = await yookassa_gateway.create_payment({
             "amount": {
-                "value": amount_value,
+                "value": str(amount_value),
                 "currency": "RUB"
             },
             "capture": True,
@@ -127,8 +135,7 @@ async def auto_renewal_subscription_command(subscription_id):
                 'userId': user_id,
                 'payload': payload,
             },
-        })
-        order_data = json.loads(order.json())
+        }, idempotency_key=f'renewal-{subscription.id}-{subscription.date_end}')
 
         await PaymentModel.create(
             user_id=user_id,
@@ -146,49 +153,29 @@ async def auto_renewal_subscription_command(subscription_id):
 
 
 async def process_yookassa_webhook(request: web.Request):
+    """
+    Принимает уведомление о платеже: проверяет запрос, сохраняет событие и сразу отвечает.
+    Подписку продлевает фоновый обработчик payment_events.
+    """
+    client_ip = get_client_ip(request)
+    if webhook_networks and not is_allowed_ip(client_ip):
+        logger.warning(f"Уведомление о платеже с недоверенного адреса {client_ip}")
+        return web.Response(status=403)
+
     try:
-        print(f"Получен запрос {request.method} {request.url}")
         event_json = await request.json()
-        print(event_json)
-
-        payment_id = event_json.get('paymentId')
-        user_id = event_json.get('userId')
-        payload = event_json.get('payload')
-        is_auto = event_json.get('is_auto')
-        amount = event_json.get('amount')
-        currency = event_json.get('currency')
-
-        type_subscription = await TypeSubscription.get(payload=payload)
-
-        subscription = await Subscription.get(user_id=user_id)
-        subscription.payment_token = payment_id
-        subscription.type_subscription = type_subscription
-        subscription.date_end = subscription.date_end + relativedelta(months=type_subscription.months)
-        await subscription.save()
-
-        user = await User.get(id=user_id)
-        # Получаем менеджер диалога для конкретного пользователя и чата
-        dialog_manager = bg_factory.bg(
-            bot=bot,
-            user_id=user_id,
-            chat_id=user_id
-        )
-        await dialog_manager.switch_to(state=SubscribeSG.payment_result)
+    except ValueError:
+        return web.Response(status=400)
+    if not isinstance(event_json, dict) or any(not event_json.get(key) for key in REQUIRED_FIELDS):
+        logger.error(f"Некорректное уведомление о платеже: {event_json}")
+        return web.Response(status=400)
 
-        if is_auto:
-            msg_to_admin = (
-                f"Пользователь {user_id} {user.username} {user.first_name} успешно подписался на бота. "
-                f"Платеж на сумму {amount} {currency} прошел успешно.")
-            await bot.send_message(chat_id=693131974, text=msg_to_admin)
-        else:
-            msg = f"Поздравляем! Вы оформили подписку. Приятного обучения!"
-            msg_to_admin = (
-                f"Пользователь {user_id} {user.username} {user.first_name} успешно подписался на бота. "
-                f"Платеж на сумму {amount} {currency} прошел успешно.")
-            await bot.send_message(chat_id=693131974, text=msg_to_admin)
-            await bot.send_message(chat_id=user_id, text=msg)
+    try:
+        created = await payment_events.ingest(event_json)
     except Exception as e:
-        logger.error(f"Ошибка при обработке платежа: {e}")
-        return web.Response(status=400)  # Сообщаем, что что-то пошло не так
-
+        logger.error(f"Ошибка при сохранении уведомления о платеже: {e}")
+        # YooKassa повторит уведомление
+        return web.Response(status=500)
+    if not created:
+        logger.info(f"Повторное уведомление о платеже {event_json['paymentId']}")
     return web.Response(status=200)  # Сообщаем, что все хорошо
@@ -129,3 +129,8 @@ class SelectLanguageSG(StatesGroup):
 class SmartPhraseAdditionSG(StatesGroup):
     start = State()
     save = State()
+
+
+class BulkImportSG(StatesGroup):
+    start = State()
+    result = State()
@@ -78,6 +78,8 @@ generated-image = Here is your image!
 
 failed-generate-image = I'm sorry, I couldn't generate this image. This function is running in test mode. Please try again later.
 
+image-still-generating = The image is still being generated. Save the phrase once it arrives.
+
 add-main-image = Add main image
 
 managing-your-own-phrases-only-available-subscription = Managing phrases is available in Pro-version.
@@ -416,4 +418,17 @@ subscription = Поздравляем!!!
 
 daily-limit = Дневной лимит на бесплатном тарифе 50 упражнений. Для продолжения возвращайся завтра.
 
-my-progress-history-button = 📈 My progress
\ No newline at end of file
+my-progress-history-button = 📈 My progress
+
+bulk-import-button = 📋 Add a list
+
+bulk-import-input = 📋 Send a list of phrases, one per line, or a text file. The phrases will be translated and voiced.
+
+bulk-import-file-too-large = The file is too large. Maximum file size is 64 KB.
+
+bulk-import-wrong-file = Could not read the file. Send a UTF-8 text file.
+
+bulk-import-result = Phrases added: { $saved }
+ Already added: { $duplicates }
+ Too long: { $too_long }
+ Did not fit into the category: { $over_limit }
@@ -78,6 +78,8 @@ generated-image = Вот сгенерированное изображение!
 
 failed-generate-image = Извините, не удалось сгенерировать изображение. Функция в тестовом режиме. Повторите генерацию или попробуйте немного позже.
 
+image-still-generating = Изображение еще генерируется. Сохраните фразу, когда оно придет.
+
 add-main-image = Добавить главное изображение
 
 managing-your-own-phrases-only-available-subscription = Управление своими фразами доступно только по подписке.
@@ -410,4 +412,17 @@ subscription = Поздравляем!!!
 
 daily-limit = Дневной лимит на бесплатном тарифе 50 упражнений. Для продолжения возвращайся завтра.
 
-my-progress-history-button = 📈 Мой прогресс
\ No newline at end of file
+my-progress-history-button = 📈 Мой прогресс
+
+bulk-import-button = 📋 Добавить списком
+
+bulk-import-input = 📋 Пришли список фраз, по одной в строке, или текстовый файл. Фразы будут переведены и озвучены.
+
+bulk-import-file-too-large = Файл слишком большой. Максимальный размер файла 64 КБ.
+
+bulk-import-wrong-file = Не получилось прочитать файл. Пришли текстовый файл в кодировке UTF-8.
+
+bulk-import-result = Добавлено фраз: { $saved }
+ Уже были добавлены: { $duplicates }
+ Слишком длинные: { $too_long }
+ Не поместились в категорию: { $over_limit }